@@ -1,24 +1,57 @@
 # Authors: Basundhara Chakrabarty, Shruti Jasoria
 
+import contextlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
-from scipy.stats import expon
-from .config import Config
+from .config import Settings
 from .milp_scheduler import MilpScheduler
 from .request import RequestBatch
 from .server import ServerManager
+from .simulator import Simulator
+from .telemetry import SolverTelemetry
 from .util import Util
+from .workload_generator import WorkloadGenerator
+
+
+# CAP object of a provision_range() worker process
+_worker_cap = None
+
+
+def _init_worker(config):
+	"""Sets up a provision_range() worker with the settings of the parent CAP"""
+	global _worker_cap
+	_worker_cap = CAP(config.TIMESTEPS, config.LOAD_BALANCER_REGION, config.START_DATE, config.EXPONENTIAL_WORKLOAD, config=config)
+
+
+def _provision_hours(hours):
+	"""Provisions a chunk of consecutive hours in a worker process"""
+	with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+		return [_worker_cap.provision_hour(hour) for hour in hours]
 
 
 class CAP:
     
-	def __init__(self, hours, load_balancer_region="ap-southeast-2",start_date="2022-08-13",exponential_workload=False) -> None:
-		Config.TIMESTEPS=hours
-		Config.START_DATE = start_date
-		Config.LOAD_BALANCER_REGION=load_balancer_region
-		Config.EXPONENTIAL_WORKLOAD=exponential_workload
-		self.server_manager = ServerManager()
-		# if Config.EXPONENTIAL_WORKLOAD and Config.SCHEDULER!="replay":
+	def __init__(self, hours, load_balancer_region="ap-southeast-2",start_date="2022-08-13",exponential_workload=False,seed=None,config=None) -> None:
+		# Settings of this instance, Config is only read for the defaults and never changed
+		self.config = (config or Settings()).replace(
+			TIMESTEPS=hours,
+			START_DATE=start_date,
+			LOAD_BALANCER_REGION=load_balancer_region,
+			EXPONENTIAL_WORKLOAD=exponential_workload,
+		)
+		self.server_manager = ServerManager(config=self.config)
+		# Instrumentation of the scheduling calls, kept across scheduler changes
+		self.telemetry = SolverTelemetry(self.config.TELEMETRY_SIZE)
+		if self.config.TELEMETRY_PORT is not None:
+			self.telemetry.serve(self.config.TELEMETRY_PORT)
+		self.scheduler = MilpScheduler(self.config, self.telemetry)
+		# Synthetic workloads are drawn from their own seeded generator
+		start_hour = (Util.start_timestamp(self.config) // 3600) % 24
+		self.workload_generator = WorkloadGenerator(self.server_manager.table.offsets, seed, start_hour)
+		# if self.config.EXPONENTIAL_WORKLOAD and self.config.SCHEDULER!="replay":
 			# self.generate_exponential_batches(self.server_manager)
 		self.request_workload = None			
 
@@ -29,28 +62,113 @@ class CAP:
 		requests=None
 		carbon_intensities=None
 		latencies=None
-		if Config.SCHEDULER == "replay":
+		if self.config.SCHEDULER == "replay":
 			print("Provisioning for replay")
 			servers_per_region, requests = self.servers_per_region_predetermined(hour)
-			carbon_intensities = [region.carbon_intensity[hour] for region in self.server_manager.regions]
-			latencies = np.array(
-				[[region.latency(batch.region) for region in self.server_manager.regions] for batch in batches]
-			)
+			carbon_intensities = self.server_manager.table.carbon[hour]
+			latencies = self.server_manager.table.latency[[batch.region.index for batch in batches]]
 
 		else:
-			print("Provisioning for ", Config.SCHEDULER)
-			servers_per_region,requests,carbon_intensities,latencies = MilpScheduler.schedule_servers( 
+			print("Provisioning for ", self.config.SCHEDULER)
+			servers_per_region,requests,carbon_intensities,latencies = self.scheduler.schedule_servers( 
 				batches, 
 				self.server_manager, 
 				hour
 			)
 		# move servers to regions according to scheduling estimation the next hour
+		self.server_manager.move(servers_per_region)
 		print("servers_per_region",servers_per_region)
 		print("Requests Redirected:",requests)
 		return servers_per_region,requests,carbon_intensities,latencies
 		
 
-	def build_batches(self, hour, request_update_interval=None):
+	def schedule_requests(self, hour, batches, fraction=0.0):
+		"""Re-routes the requests of a sub-hour step through the running servers
+
+		The servers provisioned for the hour stay as they are, only the routing is solved again,
+		see MilpScheduler.schedule_requests().
+
+		Args:
+			hour: Current hour
+			batches: Batches of requests of the step, one per region
+			fraction: Part of the hour that has passed
+
+		Returns:
+			requests[i][j] is the number of requests from region i that should be sent to region j
+		"""
+		if self.config.SCHEDULER == "replay":
+			# Replayed requests stay in their own region
+			return np.diag([batch.load for batch in batches])
+		requests, _, _ = self.scheduler.schedule_requests(batches, self.server_manager, hour, fraction)
+		return requests
+
+	def provision_hour(self, hour):
+		"""Provisions an hour
+
+		Returns:
+			Servers per region, requests matrix and objective value of the hour
+		"""
+		servers_per_region, requests, _, _ = self.provision(hour)
+		objective = np.nan if self.config.SCHEDULER == "replay" else self.scheduler.last_solve["objective"]
+		return np.asarray(servers_per_region), np.asarray(requests), objective
+
+	def provision_range(self, start, end, processes=None):
+		"""Provisions the hours [start, end) and stacks the results
+
+		Hours are independent unless the rolling-horizon scheduler is used, so they can be split
+		into chunks of consecutive hours that run concurrently in a process pool. Every worker
+		loads the dataset once and warm starts its solver across its chunk. After the range the
+		servers of the last hour are running.
+
+		Args:
+			start: First hour
+			end: Hour after the last one
+			processes: Number of worker processes. None or 1 provisions the hours in this process
+
+		Returns:
+			servers[t][j] is the number of servers in region j in hour start + t,
+			requests[t][i][j] is the number of requests from region i sent to region j in hour start + t,
+			objectives[t] is the objective value of hour start + t
+		"""
+		assert 0 <= start < end <= self.server_manager.table.demand.shape[0], (start, end)
+		hours = np.arange(start, end)
+		if processes is None or processes <= 1 or self.config.HORIZON > 1:
+			results = [self.provision_hour(hour) for hour in hours]
+		else:
+			chunks = [chunk for chunk in np.array_split(hours, processes) if len(chunk)]
+			with ProcessPoolExecutor(len(chunks), initializer=_init_worker, initargs=(self.config,)) as pool:
+				results = [result for chunk in pool.map(_provision_hours, chunks) for result in chunk]
+			self.server_manager.move(results[-1][0])
+
+		servers = np.stack([result[0] for result in results])
+		requests = np.stack([result[1] for result in results])
+		objectives = np.array([result[2] for result in results], dtype=np.float64)
+		return servers, requests, objectives
+
+	def simulate(self, hours, simulator=None):
+		"""Provisions every hour and evaluates the decisions with the offline request simulator
+
+		The schedulers size servers by comparing the requests of a region with the number of
+		servers times SERVER_CAPACITY, which the simulator takes as a service rate in req/s. The
+		request matrix of an hour is therefore a per-second arrival rate in the same unit, and is
+		passed to the simulator as is rather than spread over the 3600 seconds of the hour.
+
+		Args:
+			hours: Number of hours to provision
+			simulator: Simulator to use. Defaults to one over the latency matrix of the regions
+
+		Returns:
+			DataFrame with the throughput, drops and latency percentiles of every hour
+		"""
+		if simulator is None:
+			simulator = Simulator(self.server_manager.table.latency, config=self.config)
+		results = []
+		for hour in range(hours):
+			servers_per_region, requests, _, _ = self.provision(hour)
+			results.append(simulator.simulate_hour(servers_per_region, requests))
+		return pd.DataFrame(results)
+
+	def build_batches(self, hour, request_update_interval=None, fraction=0.0):
 		"""Adds creates batch of work to inject called by main()
 
 		Args:
@@ -58,18 +176,21 @@ class CAP:
 			server_manager: Central server manager object that i.e. holds regions
 			t: current timestep
 			request_update_interval: Frequency at which tasks are built. Defaults to None.
+			fraction: Part of the hour that has passed, e.g. 0.5 for the sub-hour step in the
+			middle of the hour. The demand is then resampled at that time, see RegionTable.demand_at()
 			
 		Returns:
 			Batch of requests
 		"""
 		request_batches = []
+		demand = self.server_manager.table.demand_at(hour + fraction) if fraction else None
 		#print("Regions:",server_manager.regions)
 		for region in self.server_manager.regions:
 			# Gets per hour
-			this_hour_requests = region.get_requests_per_interval(hour)
+			this_hour_requests = region.get_requests_per_interval(hour) if demand is None else demand[region.index]
 			#print("Region: ", region, "Rate (obtained from data file, not from conf): ", this_hour_requests)
-			if Config.REQUEST_RATE:
-				this_hour_requests = Config.REQUEST_RATE
+			if self.config.REQUEST_RATE:
+				this_hour_requests = self.config.REQUEST_RATE
 			# if request_update_interval:
 			# 	this_hour_requests //= request_update_interval
 			new_batch = RequestBatch(region.name, this_hour_requests, region)
@@ -87,8 +208,8 @@ class CAP:
 		for region in self.server_manager.regions:
 			# Gets per hour
 			this_hour_requests = region.get_expo_requests_per_interval(hour)
-			if Config.REQUEST_RATE:
-				this_hour_requests = Config.REQUEST_RATE
+			if self.config.REQUEST_RATE:
+				this_hour_requests = self.config.REQUEST_RATE
 			if request_update_interval:
 				this_hour_requests //= request_update_interval
 			new_batch = RequestBatch(region.name, this_hour_requests, region)
@@ -104,20 +225,13 @@ class CAP:
 		used for provisioning
 		"""
 		print("Generating exponential workload...")
-		expo_df = pd.DataFrame()
-		timesteps = Config.TIMESTEPS
-		for region in self.server_manager.regions:
-			total_requests_region = 0
-			for hour in range(timesteps + 1):
-				total_requests_region += region.get_requests_per_interval(hour)
-			expon_distribution = expon.rvs(size=(timesteps+1))
-			expon_distribution = expon_distribution*total_requests_region/np.sum(expon_distribution)
-			expon_distribution = np.round(expon_distribution)
-			expo_df[region.name] = expon_distribution
-		
+		timesteps = self.config.TIMESTEPS
+		totals = self.server_manager.table.demand[:timesteps + 1].sum(axis=0)
+		trace = self.workload_generator.exponential_trace(totals, timesteps + 1)
+		expo_df = pd.DataFrame(trace, columns=self.server_manager.region_names)
 		for region in self.server_manager.regions:
 			region.exponential_df = expo_df
-		print(region.exponential_df)
+		print(expo_df)
 		return
 
 	def servers_per_region_predetermined(self, hour):
@@ -129,7 +243,7 @@ class CAP:
 			# The data is already at an hourly
 			break 
 		print("rates: ", rates)
-		servers_per_region = np.ceil(rates / Config.SERVER_CAPACITY).astype(np.int64)
+		servers_per_region = np.ceil(rates / self.config.SERVER_CAPACITY).astype(np.int64)
 		print("servers_per_region_predetermined: ",servers_per_region)
 		return servers_per_region, np.diag(rates)
 
@@ -144,43 +258,39 @@ class CAP:
 		print(requests_per_region)
 		return latency, carbon_intensity, requests_per_region		
 
+	def configure(self, **settings):
+		"""Changes settings of this instance
+
+		The scheduler is rebuilt with the new settings, so its persistent models and solution
+		cache start over. The data of the regions is kept, settings that change which data is
+		loaded (dataset, start date, hours) need a new CAP. A new RESAMPLE_METHOD applies to the
+		signals read between two hours, the hourly rows keep the method they were loaded with.
+
+		Args:
+			settings: Config names and their new values
+		"""
+		self.config = self.config.replace(**settings)
+		self.server_manager.config = self.config
+		self.server_manager.table.config = self.config
+		if self.scheduler.cache is not None:
+			self.scheduler.cache.close()
+		self.scheduler = MilpScheduler(self.config, self.telemetry)
+
 	def set_scheduler(self, scheduler):
-		Config.SCHEDULER = scheduler
+		self.configure(SCHEDULER=scheduler)
 
 	def generate_request_workload(self, requests, timesteps, distribution_type):
-		requests_from_region = [sum(l) for l in requests]
-		region_names = Util.region_names()
-		distribution = None
-		self.request_workload = pd.DataFrame()
-		for request, region_name in zip(requests_from_region, region_names):
-			print("Request: ", request)
-			print("region_name: ", region_name)
-			distribution = None
-			if distribution_type == 'EXPONENTIAL':
-				# f(x) = e^(-x)
-				# expon.pdf(x, loc, scale) is identically equivalent to 
-				# expon.pdf(y) / scale with y = (x - loc) / scale. 
-				# Scale is chosen such that the values don't go to far from 1
-				# Otherwise it'll create situation where the pods can't handle the 
-				# traffic
-				distribution = expon.rvs(size=(timesteps), scale=0.5)
-			elif distribution_type == 'BIMODAL':
-				d1 = np.random.normal(loc=1,scale=0.12,size=int(np.floor(timesteps/2)))
-				d2 = np.random.normal(loc=1.1,scale=0.06,size=int(np.ceil(timesteps/2)))
-				distribution = np.concatenate([d1,d2])
-			elif distribution_type == 'TRIMODAL':
-				d1 = np.random.normal(loc=0.9,scale=0.07,size=int(np.floor(timesteps/3)))
-				d2 = np.random.normal(loc=1,scale=0.07,size=int((timesteps-2*np.floor(timesteps/3))))
-				d3 = np.random.normal(loc=1.1,scale=0.07,size=int(np.floor(timesteps/3)))
-				distribution = np.concatenate([d1,d2,d3])
-			else:
-				raise Exception("distribution_type can take one of the values - EXPONENTIAL, BIMODAL, TRIMODAL")
-
-			print("Distribution: ", distribution)
-			distribution = np.ceil(distribution).astype(int)
-			distribution = [x * request for x in distribution]
-			self.request_workload[region_name] = distribution
-			print(f"After exponential: Region: {region_name}, Distribution: {distribution}")
+		"""Builds a synthetic workload around the requests each region sends, see WorkloadGenerator
+
+		Args:
+			requests: requests[i][j] is the number of requests from region i sent to region j
+			timesteps: Number of timesteps
+			distribution_type: One of EXPONENTIAL, BIMODAL, TRIMODAL, DIURNAL
+		"""
+		requests_from_region = np.asarray(requests, dtype=np.float64).sum(axis=1)
+		workload = self.workload_generator.generate(requests_from_region, timesteps, distribution_type)
+		self.request_workload = pd.DataFrame(workload, columns=Util.region_names(self.config))
+		print("Workload: ", self.request_workload)
 
 
 	def build_workload_batches(self, timestep):
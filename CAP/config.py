@@ -11,8 +11,11 @@ class Config:
 	REQUEST_RATE=0
 	# Save file to /saved with the following format YYYY-MM-DD_hh:mm:ss
 	SAVE=True
-	# Start date in ISO format (YYYY-MM-DD)
+	# Start date in ISO format (YYYY-MM-DD), or start time (YYYY-MM-DDTHH:MM) in UTC
 	START_DATE="2022-08-13"
+	# How carbon intensities and demand are read between two rows of the data files, at a start time
+	# or a sub-hour step that is not on the hour: hold (last row) or linear (interpolated)
+	RESAMPLE_METHOD="hold"
 	# Maximum latency allowed
 	MAX_LATENCY=500
 	# Maximum pool of servers
@@ -21,10 +24,21 @@ class Config:
 	MAX_SERVERS_PER_REGION=100
 	# The capacity of each server
 	SERVER_CAPACITY=10 #TODO
+	# Capacity per server used by the provisioner: constant (SERVER_CAPACITY) or erlang (the highest load at
+	# which an M/M/c queue of ERLANG_SERVERS servers serving SERVER_CAPACITY req/s each keeps the mean
+	# response time plus the network latency of a region under TARGET_RESPONSE_TIME, see queueing.py)
+	CAPACITY_MODEL="constant"
+	# Target mean end-to-end response time in ms for the erlang capacity model
+	TARGET_RESPONSE_TIME=400
+	# Number of servers per region the erlang capacity model assumes
+	ERLANG_SERVERS=10
 	# Load Balancer Region
 	LOAD_BALANCER_REGION="ap-southeast-2"
 	# The dataset we want to load our data from - [wiki, akamai]
 	DATASET="wiki"
+	# The format the dataset is loaded from: csv, or npy for the memory-mapped binary files written
+	# by `python -m CAP.dataset_store <dataset>`
+	DATASET_FORMAT="csv"
 	# The file name from where we want to load carbon intensities data
 	CARBON_INTENSITY_FILENAME="carbon_intensities.csv"
 	# The file name from where we want to load requests data
@@ -33,6 +47,8 @@ class Config:
 	LATENCY_FILENAME ="latency.csv"
 	# The file name from where we want to load time offset data for the regions
 	TIME_OFFSET_FILENAME="offset.csv"
+	# The file name from where we want to load the coordinates of the regions, optional
+	LOCATION_FILENAME="locations.csv"
 	# Define the scheduler you wish to use: carbon/latency/replay
 	# replay has no optimizations
 	SCHEDULER="carbon"
@@ -42,3 +58,106 @@ class Config:
 	VERBOSE=True
 	# Print output of MILP scheduler
 	VERBOSE_MILP=True
+	# Have CBC write a log file to read its solve time and node count from, for the telemetry and the estimates of
+	# the time budget. Without it, or with VERBOSE_MILP, the whole CBC call counts as solve time
+	SOLVER_LOG_STATS=False
+	# Weight of the carbon (carbon scheduler) or latency (latency scheduler) term against the number of
+	# servers in the objective
+	CARBON_ALPHA=0.9
+	LATENCY_ALPHA=0.5
+	# Keep the MILP alive across hours and warm start it from the previous hour's solution
+	PERSISTENT_MILP=True
+	# The MILP backend: cbc (PuLP + CBC subprocess), highs (sparse matrix model solved in-process by scipy)
+	# or flow (transportation problems with a search over server counts, see flow_model.py)
+	MILP_BACKEND="cbc"
+	# With the flow backend, schedules further than this relative gap from the LP bound are re-solved by CBC
+	FLOW_MAX_GAP=0.05
+	# Most server removals the flow backend tries per solve, each one is an LP. None means no limit
+	FLOW_MAX_ITERATIONS=200
+	# Seconds of the time budget that must be left for the flow backend to hand its schedule to CBC
+	FLOW_ESCALATION_MIN_TIME=1.0
+	# Number of hours provisioned at once by the rolling-horizon scheduler, only the first one is committed.
+	# 1 provisions every hour on its own
+	HORIZON=1
+	# Penalty for starting or stopping a server between two hours, as a multiple of the cost of running one
+	SERVER_CHURN_PENALTY=1.0
+	# Route requests in whole numbers. If False only the servers are integer, the request flows are
+	# continuous and rounded afterwards, which makes branch and bound much cheaper
+	INTEGER_ROUTING=True
+	# Time budget in seconds of a scheduling call, from computing the inputs to the last solve. The best
+	# solution found so far is used when it runs out. None means no limit
+	SOLVER_TIME_LIMIT=None
+	# Estimated seconds per route of building a CBC model, and of writing it out to CBC, until a solve has been
+	# measured. If the time left cannot cover both, CBC is not run and the servers are placed greedily
+	MILP_BUILD_SECONDS_PER_ROUTE=2e-5
+	# Relative MIP gap at which the solver stops. None uses the solver's default
+	SOLVER_GAP=None
+	# Place servers greedily if the solver does not find a solution instead of failing
+	GREEDY_FALLBACK=True
+	# Time budget in seconds of the request scheduler, which re-routes the requests of every sub-hour step
+	# through the running servers. None means no limit
+	REQUEST_TIME_LIMIT=0.05
+	# Number of solutions kept in the solution cache, 0 disables it
+	SOLUTION_CACHE_SIZE=0
+	# File the solution cache is persisted to, None keeps it in memory only
+	SOLUTION_CACHE_PATH=None
+	# Carbon intensities and request rates are rounded to multiples of these steps to build the cache key
+	CACHE_CARBON_STEP=1
+	CACHE_REQUEST_STEP=1
+	# Seconds of each hour simulated by the offline request simulator, see simulator.py
+	SIMULATION_SECONDS=60
+	# Number of scheduling calls kept by the solver telemetry, see telemetry.py
+	TELEMETRY_SIZE=168
+	# Port the solver telemetry is served on (/metrics and /json), None does not serve it
+	TELEMETRY_PORT=None
+
+
+class Settings:
+	"""
+	Immutable settings of one CAP instance.
+
+	A Settings object starts from the class attributes of Config, which stay the defaults,
+	and overrides them by name. It is read like Config (settings.SCHEDULER) but cannot be
+	changed, so schedulers with different settings can run side by side in one process.
+	Use replace() to derive changed settings.
+	"""
+
+	def __init__(self, **settings):
+		"""
+
+		Args:
+			settings: Config names and the values that replace their defaults
+		"""
+		values = {name: value for name, value in vars(Config).items() if name.isupper()}
+		for name in settings:
+			if name not in values:
+				raise AttributeError(f"Unknown setting: {name}")
+		values.update(settings)
+		self.__dict__.update(values)
+
+	def __setattr__(self, name, value):
+		raise AttributeError("Settings are immutable, use replace()")
+
+	def __delattr__(self, name):
+		raise AttributeError("Settings are immutable, use replace()")
+
+	def __eq__(self, other):
+		return isinstance(other, Settings) and vars(self) == vars(other)
+
+	def __hash__(self):
+		return hash(tuple(sorted(vars(self).items())))
+
+	def __repr__(self):
+		defaults = vars(Config)
+		changed = {name: value for name, value in vars(self).items() if defaults.get(name) != value}
+		return f"Settings({changed})"
+
+	def replace(self, **settings):
+		"""
+		Returns:
+			New Settings with these settings changed
+		"""
+		return Settings(**{**vars(self), **settings})
+
+	def as_dict(self):
+		return dict(vars(self))
@@ -0,0 +1,108 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from .config import Config
+
+# Columns of the csv files that are not region data
+INDEX_COLUMNS = ["Unnamed: 0", "timestamp", "datetime"]
+
+
+def binary_prefix(dataset_dir, file_name):
+    """Path prefix of the binary files of a csv data file, e.g. dataset/wiki/requests"""
+    return os.path.join(dataset_dir, os.path.splitext(file_name)[0])
+
+
+def convert_dataset(dataset_dir, config=None):
+    """Converts the csv files of a dataset to memory-mappable NumPy files.
+
+    Every table is written as <name>.values.npy (float64, one row per csv row), <name>.columns.npy
+    (the column names) and, for time-indexed tables, <name>.timestamps.npy (int64, sorted).
+    The region columns are written first, in the order of the offset file, so the region data
+    of a window of rows can be read as a plain slice of the memory map.
+
+    Args:
+        dataset_dir: Directory holding the csv files, e.g. CAP/dataset/wiki
+        config: Settings naming the data files, defaults to Config
+    """
+    config = config or Config
+    region_names = list(pd.read_csv(os.path.join(dataset_dir, config.TIME_OFFSET_FILENAME)).columns)
+    file_names = [
+        config.CARBON_INTENSITY_FILENAME,
+        config.REQUEST_DATA_FILENAME,
+        config.LATENCY_FILENAME,
+        config.TIME_OFFSET_FILENAME,
+    ]
+    if os.path.exists(os.path.join(dataset_dir, config.LOCATION_FILENAME)):
+        file_names.append(config.LOCATION_FILENAME)
+    for file_name in file_names:
+        df = pd.read_csv(os.path.join(dataset_dir, file_name))
+        others = [col for col in df.columns if col not in region_names and col not in INDEX_COLUMNS]
+        columns = [col for col in region_names if col in df.columns] + others
+        prefix = binary_prefix(dataset_dir, file_name)
+        if "timestamp" in df.columns:
+            df = df.sort_values("timestamp")
+            np.save(f"{prefix}.timestamps.npy", df["timestamp"].to_numpy(dtype=np.int64))
+        np.save(f"{prefix}.values.npy", df[columns].to_numpy(dtype=np.float64))
+        np.save(f"{prefix}.columns.npy", np.array(columns, dtype=str))
+        print(f"Converted {file_name}: {len(df)} rows, {len(columns)} columns")
+
+
+class BinaryTable:
+    """
+    A data table converted by convert_dataset(), memory-mapped so only the rows that are
+    actually read are paged in.
+    """
+
+    def __init__(self, prefix):
+        """
+
+        Args:
+            prefix: Path prefix of the binary files, see binary_prefix()
+        """
+        self.prefix = prefix
+        self.values = np.load(f"{prefix}.values.npy", mmap_mode="r")
+        self.columns = [str(col) for col in np.load(f"{prefix}.columns.npy")]
+        timestamps = f"{prefix}.timestamps.npy"
+        self.timestamps = np.load(timestamps, mmap_mode="r") if os.path.exists(timestamps) else None
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def __repr__(self):
+        return f"BinaryTable({self.prefix}, rows={len(self)}, columns={len(self.columns)})"
+
+    def index_of(self, timestamp):
+        """Row of a timestamp, found by binary search
+
+        Returns:
+            Index of the row, or None if the timestamp is not in the table
+        """
+        index = int(np.searchsorted(self.timestamps, timestamp))
+        if index < len(self.timestamps) and self.timestamps[index] == timestamp:
+            return index
+        return None
+
+    def select(self, start, end, names):
+        """Values of the given columns in rows [start, end)
+
+        Args:
+            start: First row
+            end: Row after the last one
+            names: Names of the columns, in the order they are wanted
+        Returns:
+            A view of the memory map if the columns are the leading columns of the table,
+            which is the case for the region columns, otherwise a copy of the window
+        """
+        names = list(names)
+        if self.columns[:len(names)] == names:
+            return self.values[start:end, :len(names)]
+        return self.values[start:end][:, [self.columns.index(name) for name in names]]
+
+
+if __name__ == "__main__":
+    dataset = sys.argv[1] if len(sys.argv) > 1 else Config.DATASET
+    convert_dataset(os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset", dataset))
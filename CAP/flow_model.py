@@ -0,0 +1,242 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import time
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+from .config import Config
+from .matrix_model import MatrixModel, deadline_after, time_left
+
+
+class FlowModel:
+    """
+    Network-flow fast path for the Carbon and Latency schedulers.
+
+    With the server counts s_j fixed, routing is a transportation problem: region i supplies
+    request_rates[i], region j can absorb s_j * capacities[j], a request on route (i, j) costs
+    its objective coefficient and latency-infeasible routes do not exist. The constraint matrix
+    of a transportation problem is totally unimodular, so its LP, solved in-process by HiGHS,
+    has integral optimal flows and no branch and bound is needed.
+
+    The server counts are found by an outer search: the LP relaxation of the MILP is itself a
+    transportation problem where every request also pays its share of a server, which gives a
+    lower bound and a first set of server counts. Servers are then removed one at a time while
+    the re-routed flow gets cheaper, until the time budget or FLOW_MAX_ITERATIONS removals run
+    out. The gap between the result and the LP bound is reported in self.gap.
+
+    The same transportation problem, with the server counts taken as given, is the request
+    scheduler (CAS) that re-routes the requests within an hour, see schedule_requests().
+    """
+
+    def __init__(self, scheduler, n_regions, routes, config=None):
+        """
+
+        Args:
+            scheduler: The scheduler the model is built for: carbon/latency
+            n_regions: Number of regions in the region set
+            routes: Sparse adjacency of the routes that get a variable, see feasible_routes()
+            config: Settings of the scheduler, defaults to Config
+        """
+        self.config = config or Config
+        # The objective coefficients are the same as in the matrix model
+        self.hour_model = MatrixModel(scheduler, n_regions, routes, self.config)
+        self.n_regions = n_regions
+        R = n_regions
+        self.x_i, self.x_j = self.hour_model.x_i, self.hour_model.x_j
+        self.n_x = len(self.x_i)
+        # Outcome of the last solve: optimal/time_limit/not_solved and the gap to the LP bound
+        self.status = None
+        self.gap = None
+        self.lower_bound = None
+        # Size of the transportation problem and wall times of the last call, the solve time adds up every LP
+        self.stats = {}
+
+        columns = np.arange(self.n_x)
+        # Rows 0..R-1: sum_j x_ij == request_rates[i]
+        self.A_eq = sparse.csr_matrix((np.ones(self.n_x), (self.x_i, columns)), shape=(R, self.n_x))
+        # Rows 0..R-1: sum_i x_ij <= capacity of region j
+        self.A_ub = sparse.csr_matrix((np.ones(self.n_x), (self.x_j, columns)), shape=(R, self.n_x))
+        # With a drop variable d_i per origin: sum_j x_ij + d_i == request_rates[i]
+        self.A_eq_drop = sparse.hstack([self.A_eq, sparse.identity(R)], format="csr")
+        self.A_ub_drop = sparse.hstack([self.A_ub, sparse.csr_matrix((R, R))], format="csr")
+
+    def route(self, cost, request_rates, capacity, time_limit=None, drop=False):
+        """Solves the transportation problem for fixed destination capacities
+
+        Args:
+            cost: cost[k] is the cost of one request on the k-th route
+            request_rates: request_rates[i] is the number of requests from region i
+            capacity: capacity[j] is the number of requests region j can absorb
+            time_limit: Time budget in seconds, None means no limit
+            drop: If set, cost also holds the cost of dropping a request of each origin after
+                the routes and the flow ends with the dropped requests of each origin
+        Returns:
+            Flow on every route and its cost, or (None, None) if the requests do not fit or
+            there is no time left
+        """
+        if time_limit is not None and time_limit <= 0:
+            return None, None
+        options = {} if time_limit is None else {"time_limit": time_limit}
+        started = time.perf_counter()
+        res = linprog(
+            cost,
+            A_ub=self.A_ub_drop if drop else self.A_ub,
+            b_ub=capacity,
+            A_eq=self.A_eq_drop if drop else self.A_eq,
+            b_eq=request_rates,
+            bounds=(0, None),
+            method="highs",
+            options=options,
+        )
+        self.stats["solve"] = self.stats.get("solve", 0.0) + time.perf_counter() - started
+        self.stats["lp_solves"] = self.stats.get("lp_solves", 0) + 1
+        if res.status != 0:
+            return None, None
+        return res.x, res.fun
+
+    def schedule_servers(self, carbon_intensities, latencies, capacities, request_rates, time_limit=None):
+        """
+        Places servers and routes requests by solving transportation problems only.
+
+        If problem was not solved, a negative objective value is returned
+
+        Args:
+            request_rates: request_rates[i] is the number of requests from region i
+            capacities: capacities[i] is the average capacity per server in region i
+            latencies: latencies[i][j] is the latency from region i to j
+            carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+            time_limit: Time budget in seconds of the whole search, defaults to the SOLVER_TIME_LIMIT
+                setting. Every LP gets the time left, the best schedule found is returned when it runs out
+        Returns:
+            return1: n_servers[i] is the number of servers that should be started
+            in region i.
+            return2: x[i][j] is the number of requests from region i that should
+            be sent to region j.
+            return3: objective value.
+        """
+        R = self.n_regions
+        started = time.perf_counter()
+        deadline = deadline_after(self.config.SOLVER_TIME_LIMIT if time_limit is None else time_limit)
+        capacities = np.asarray(capacities, dtype=np.float64)
+        request_rates = np.asarray(request_rates, dtype=np.float64)
+        c = self.hour_model.objective(carbon_intensities, latencies, request_rates)
+        route_cost = c[:self.n_x]
+        server_cost = c[self.n_x]
+        self.stats = {"variables": self.n_x, "constraints": 2 * R, "nodes": 0, "build": time.perf_counter() - started}
+
+        # LP relaxation: every request pays 1/capacities[j] of a server
+        relaxed_cost = route_cost + server_cost / capacities[self.x_j]
+        flow, self.lower_bound = self.route(relaxed_cost, request_rates, capacities * self.config.MAX_SERVERS_PER_REGION, time_left(deadline))
+        if flow is None:
+            self.status, self.gap = "not_solved", None
+            return np.zeros(R), np.zeros((R, R), dtype=int), -10000
+
+        def servers_for(flow):
+            load = np.bincount(self.x_j, weights=flow, minlength=R)
+            return np.ceil(load / capacities - 1e-9).astype(int)
+
+        def total(flow):
+            return route_cost @ flow + server_cost * servers_for(flow).sum()
+
+        # Round up the relaxed servers and route optimally through them
+        servers = np.minimum(servers_for(flow), self.config.MAX_SERVERS_PER_REGION)
+        flow, _ = self.route(route_cost, request_rates, np.floor(servers * capacities), time_left(deadline))
+        if flow is None:
+            self.status, self.gap = "not_solved", None
+            return np.zeros(R), np.zeros((R, R), dtype=int), -10000
+        flow = np.rint(flow)
+        servers = servers_for(flow)
+        best = total(flow)
+
+        # Outer search: drop the server with the most slack while that makes the schedule cheaper.
+        # Rounding up leaves less than a server of slack per region, so servers go one at a time
+        max_iterations = self.config.FLOW_MAX_ITERATIONS
+        iterations = 0
+        improved = True
+        timed_out = False
+        while improved and not timed_out and (max_iterations is None or iterations < max_iterations):
+            improved = False
+            slack = servers * capacities - np.bincount(self.x_j, weights=flow, minlength=R)
+            for j in np.argsort(-slack, kind="stable"):
+                if servers[j] == 0:
+                    continue
+                if time_left(deadline) == 0:
+                    timed_out = True
+                    break
+                if max_iterations is not None and iterations >= max_iterations:
+                    break
+                iterations += 1
+                candidate = servers.copy()
+                candidate[j] -= 1
+                candidate_flow, _ = self.route(route_cost, request_rates, np.floor(candidate * capacities), time_left(deadline))
+                if candidate_flow is None:
+                    continue
+                candidate_flow = np.rint(candidate_flow)
+                if total(candidate_flow) < best - 1e-12:
+                    flow, servers, best = candidate_flow, servers_for(candidate_flow), total(candidate_flow)
+                    improved = True
+                    break
+
+        # The bound can come out a rounding error above the schedule
+        self.gap = max(0.0, (best - self.lower_bound) / best) if best > 0 else 0.0
+        if self.gap <= 1e-9:
+            self.status = "optimal"
+        else:
+            self.status = "time_limit" if timed_out else "feasible"
+        started = time.perf_counter()
+        requests = np.zeros((R, R), dtype=int)
+        requests[self.x_i, self.x_j] = flow.astype(int)
+        self.stats["extract"] = time.perf_counter() - started
+        print(requests, servers)
+        return servers, requests, best
+
+    def schedule_requests(self, carbon_intensities, latencies, capacities, request_rates, servers, time_limit=None):
+        """
+        Routes the requests through the running servers without placing any, which is a single
+        transportation problem. Requests that do not fit are dropped at their origin. Dropping
+        a request costs more than any chain of re-routings, so as many requests as possible are
+        served and only the rest is dropped.
+
+        If problem was not solved, a negative objective value is returned
+
+        Args:
+            request_rates: request_rates[i] is the number of requests from region i
+            capacities: capacities[i] is the average capacity per server in region i
+            latencies: latencies[i][j] is the latency from region i to j
+            carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+            servers: servers[j] is the number of servers running in region j
+            time_limit: Time budget in seconds, defaults to the REQUEST_TIME_LIMIT setting
+        Returns:
+            return1: x[i][j] is the number of requests from region i that should
+            be sent to region j.
+            return2: dropped[i] is the number of requests from region i that are dropped.
+            return3: objective value.
+        """
+        R = self.n_regions
+        started = time.perf_counter()
+        time_limit = self.config.REQUEST_TIME_LIMIT if time_limit is None else time_limit
+        request_rates = np.asarray(request_rates, dtype=np.float64)
+        capacity = np.floor(np.asarray(servers, dtype=np.float64) * np.asarray(capacities, dtype=np.float64))
+        requests = np.zeros((R, R), dtype=int)
+        self.stats = {"variables": self.n_x + R, "constraints": 2 * R, "nodes": 0}
+        if request_rates.sum() == 0:
+            self.status, self.gap = "optimal", 0.0
+            return requests, np.zeros(R, dtype=int), 0.0
+
+        route_cost = self.hour_model.objective(carbon_intensities, latencies, request_rates)[:self.n_x]
+        drop_cost = 1 + 2 * R * np.abs(route_cost).max(initial=0)
+        cost = np.concatenate([route_cost, np.full(R, drop_cost)])
+        self.stats["build"] = time.perf_counter() - started
+        flow, objective = self.route(cost, request_rates, capacity, time_limit, drop=True)
+        if flow is None:
+            self.status, self.gap = "not_solved", None
+            return requests, np.zeros(R, dtype=int), -10000
+
+        # The constraint matrix is totally unimodular, the optimal flow is integral
+        started = time.perf_counter()
+        flow = np.rint(flow).astype(int)
+        self.status, self.gap = "optimal", 0.0
+        requests[self.x_i, self.x_j] = flow[:self.n_x]
+        self.stats["extract"] = time.perf_counter() - started
+        return requests, flow[self.n_x:], objective
@@ -0,0 +1,383 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import time
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
+from .config import Config
+
+
+def deadline_after(time_limit):
+    """Deadline of a time budget that starts now, None if there is no budget"""
+    return None if time_limit is None else time.perf_counter() + time_limit
+
+
+def time_left(deadline):
+    """Seconds left until a deadline, never negative. None if there is no deadline"""
+    return None if deadline is None else max(0.0, deadline - time.perf_counter())
+
+
+def objective_value(scheduler, servers, requests, carbon_intensities, latencies, request_rates, config=None):
+    """Objective value of a schedule, the same objective the models minimize
+
+    Args:
+        scheduler: carbon/latency
+        servers: servers[i] is the number of servers in region i
+        requests: requests[i][j] is the number of requests from region i sent to region j
+        carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+        latencies: latencies[i][j] is the latency from region i to j
+        request_rates: request_rates[i] is the number of requests from region i
+        config: Settings of the scheduler, defaults to Config
+    """
+    config = config or Config
+    requests = np.asarray(requests, dtype=np.float64)
+    carbon_intensities = np.asarray(carbon_intensities, dtype=np.float64)
+    latencies = np.asarray(latencies, dtype=np.float64)
+    request_rates = np.asarray(request_rates, dtype=np.float64)
+    if scheduler == "carbon":
+        alpha = config.CARBON_ALPHA
+        routed = np.sum(requests.sum(axis=0) * carbon_intensities) / np.sum(np.max(carbon_intensities) * request_rates)
+    else:
+        alpha = config.LATENCY_ALPHA
+        routed = np.sum(requests * latencies) / np.sum(request_rates * np.max(latencies, axis=1))
+    return alpha * routed + (1 - alpha) * np.sum(servers) / (config.MAX_SERVERS_PER_REGION * len(request_rates))
+
+
+def solve_milp(model, c, constraints, bounds, integrality, time_limit=None):
+    """Solves a MILP with HiGHS within the time budget and gap target set in the model's settings
+
+    The outcome is stored on the model: model.status is optimal, time_limit (best incumbent
+    found within the budget) or not_solved, and model.gap is the relative MIP gap. The size
+    of the problem, the solve time and the number of branch and bound nodes go to model.stats.
+
+    Args:
+        model: The model the solve is for, receives status and gap
+        c, constraints, bounds, integrality: As accepted by scipy.optimize.milp
+        time_limit: Time left of the budget in seconds, None means no limit
+    Returns:
+        The result of scipy.optimize.milp, res.x is None if no solution was found
+    """
+    config = model.config
+    options = {"disp": config.VERBOSE_MILP}
+    if time_limit is not None:
+        options["time_limit"] = time_limit
+    if config.SOLVER_GAP is not None:
+        options["mip_rel_gap"] = config.SOLVER_GAP
+    started = time.perf_counter()
+    res = milp(c, constraints=constraints, bounds=bounds, integrality=integrality, options=options)
+    model.stats.update(
+        variables=len(c),
+        constraints=constraints.A.shape[0],
+        solve=time.perf_counter() - started,
+        nodes=getattr(res, "mip_node_count", None),
+    )
+
+    if res.x is None:
+        model.status, model.gap = "not_solved", None
+    else:
+        model.status = "optimal" if res.status == 0 else "time_limit"
+        model.gap = getattr(res, "mip_gap", None)
+    return res
+
+
+class MatrixModel:
+    """
+    Matrix-form builder for the Carbon and Latency MILPs, solved in-process by HiGHS.
+
+    The variables are laid out as [x_0, ..., x_(K-1), s_0, ..., s_(R-1)], with one x variable
+    per feasible route in the row-major order of the routes adjacency matrix. The capacity,
+    demand and max-server constraints are emitted as one sparse constraint matrix built from
+    index arithmetic instead of per-variable Python objects. Latency-infeasible routes have
+    no variable at all. The sparsity pattern only depends on the region set and the routes,
+    so it is built once and only the data vectors are refreshed every hour.
+    """
+
+    def __init__(self, scheduler, n_regions, routes, config=None):
+        """
+
+        Args:
+            scheduler: The scheduler the model is built for: carbon/latency
+            n_regions: Number of regions in the region set
+            routes: Sparse adjacency of the routes that get a variable, see feasible_routes()
+            config: Settings of the scheduler, defaults to Config
+        """
+        self.config = config or Config
+        self.scheduler = scheduler
+        self.n_regions = n_regions
+        self.routes = routes
+        R = n_regions
+
+        # Origin and destination of each x variable
+        self.x_i, self.x_j = routes.nonzero()
+        self.n_x = len(self.x_i)
+        self.n_vars = self.n_x + R
+        # Outcome of the last solve, see solve_milp()
+        self.status = None
+        self.gap = None
+        self.stats = {}
+        s_idx = self.n_x + np.arange(R)
+
+        # Row 0: sum_i s_i <= max_servers
+        rows = [np.zeros(R, dtype=np.int64)]
+        cols = [s_idx]
+        # Rows 1..R: sum_i x_ij - capacities[j] * s_j <= 0
+        rows += [1 + self.x_j, 1 + np.arange(R)]
+        cols += [np.arange(self.n_x), s_idx]
+        # Rows R+1..2R: sum_j x_ij == request_rates[i]
+        rows.append(1 + R + self.x_i)
+        cols.append(np.arange(self.n_x))
+        n_rows = 1 + 2 * R
+        self.rows = np.concatenate(rows)
+        self.cols = np.concatenate(cols)
+        self.n_rows = n_rows
+
+        # Positions of the capacity coefficients of s_j in the data vector
+        self.capacity_pos = R + self.n_x + np.arange(R)
+
+        self.data = np.ones(len(self.rows))
+        self.lower = np.full(n_rows, -np.inf)
+        self.upper = np.zeros(n_rows)
+        # The x variables are continuous unless INTEGER_ROUTING is set, servers are always integer
+        self.integrality = np.ones(self.n_vars)
+        self.integrality[:self.n_x] = self.config.INTEGER_ROUTING
+
+    def objective(self, carbon_intensities, latencies, request_rates):
+        """Objective coefficients of the x and s variables for an hour
+
+        Args:
+            request_rates: request_rates[i] is the number of requests from region i
+            latencies: latencies[i][j] is the latency from region i to j
+            carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+        Returns:
+            Vector c of length n_vars
+        """
+        carbon_intensities = np.asarray(carbon_intensities, dtype=np.float64)
+        latencies = np.asarray(latencies, dtype=np.float64)
+        request_rates = np.asarray(request_rates, dtype=np.float64)
+        alpha = self.alpha()
+
+        c = np.empty(self.n_vars)
+        if self.scheduler == "carbon":
+            max_obj_1 = 1 / np.sum(np.max(carbon_intensities) * request_rates)
+            c[:self.n_x] = alpha * max_obj_1 * carbon_intensities[self.x_j]
+        else:
+            max_obj_1 = 1 / np.sum(request_rates * np.max(latencies, axis=1))
+            c[:self.n_x] = alpha * max_obj_1 * latencies[self.x_i, self.x_j]
+        c[self.n_x:] = self.server_cost()
+        return c
+
+    def alpha(self):
+        """Weight of the carbon/latency term against the number of servers in the objective"""
+        return self.config.CARBON_ALPHA if self.scheduler == "carbon" else self.config.LATENCY_ALPHA
+
+    def server_cost(self):
+        """Objective weight of a single server"""
+        return (1 - self.alpha()) / (self.config.MAX_SERVERS_PER_REGION * self.n_regions)
+
+    def matrix(self, capacities):
+        """Sparse constraint matrix for an hour
+
+        Args:
+            capacities: capacities[i] is the average capacity per server in region i
+        """
+        self.data[self.capacity_pos] = -np.asarray(capacities, dtype=np.float64)
+        return sparse.csr_matrix((self.data, (self.rows, self.cols)), shape=(self.n_rows, self.n_vars))
+
+    def row_bounds(self, request_rates):
+        """Lower and upper bounds of the constraint rows for an hour
+
+        Args:
+            request_rates: request_rates[i] is the number of requests from region i
+        """
+        R = self.n_regions
+        self.upper[0] = self.config.MAX_SERVERS_PER_REGION * R
+        self.lower[1 + R:1 + 2 * R] = request_rates
+        self.upper[1 + R:1 + 2 * R] = request_rates
+        return self.lower.copy(), self.upper.copy()
+
+    def variable_bounds(self):
+        """Upper bounds of the x and s variables, the lower bounds are all 0"""
+        ub = np.full(self.n_vars, np.inf)
+        ub[self.n_x:] = self.config.MAX_SERVERS_PER_REGION
+        return ub
+
+    def build(self, carbon_intensities, latencies, capacities, request_rates):
+        """Builds the objective, constraint matrix and bounds for an hour
+
+        Args:
+            request_rates: request_rates[i] is the number of requests from region i
+            capacities: capacities[i] is the average capacity per server in region i
+            latencies: latencies[i][j] is the latency from region i to j
+            carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+        Returns:
+            c, constraints, bounds as accepted by scipy.optimize.milp
+        """
+        c = self.objective(carbon_intensities, latencies, request_rates)
+        A = self.matrix(capacities)
+        lower, upper = self.row_bounds(request_rates)
+        return c, LinearConstraint(A, lower, upper), Bounds(0, self.variable_bounds())
+
+    def schedule_servers(self, carbon_intensities, latencies, capacities, request_rates, time_limit=None):
+        """
+        Builds the model for the given hour and solves it with HiGHS.
+
+        If problem was not solved, a negative objective value is returned
+
+        Args:
+            request_rates: request_rates[i] is the number of requests from region i
+            capacities: capacities[i] is the average capacity per server in region i
+            latencies: latencies[i][j] is the latency from region i to j
+            carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+            time_limit: Time budget in seconds, building the model included. Defaults to the
+                SOLVER_TIME_LIMIT setting
+        Returns:
+            return1: n_servers[i] is the number of servers that should be started
+            in region i.
+            return2: x[i][j] is the number of requests from region i that should
+            be sent to region j.
+            return3: objective value.
+        """
+        R = self.n_regions
+        started = time.perf_counter()
+        deadline = deadline_after(self.config.SOLVER_TIME_LIMIT if time_limit is None else time_limit)
+        c, constraints, bounds = self.build(carbon_intensities, latencies, capacities, request_rates)
+        self.stats = {"build": time.perf_counter() - started}
+        if time_left(deadline) == 0:
+            self.status, self.gap = "not_solved", None
+            return np.zeros(R), np.zeros((R, R), dtype=int), -10000
+        res = solve_milp(self, c, constraints, bounds, self.integrality, time_left(deadline))
+        if res.x is None:
+            return np.zeros(R), np.zeros((R, R), dtype=int), -10000
+
+        started = time.perf_counter()
+        requests = np.zeros((R, R))
+        requests[self.x_i, self.x_j] = res.x[:self.n_x]
+        if self.config.INTEGER_ROUTING:
+            requests = np.rint(requests).astype(int)
+        servers = np.rint(res.x[self.n_x:]).astype(int)
+        self.stats["extract"] = time.perf_counter() - started
+        print(requests, servers)
+        return servers, requests, res.fun
+
+
+class HorizonModel:
+    """
+    Rolling-horizon version of the matrix model that provisions the next H hours at once.
+
+    Every hour of the horizon gets its own block of x and s variables with the same constraints
+    as MatrixModel. Changes of s_i between consecutive hours, starting from the currently
+    deployed servers, are penalized through auxiliary variables u_ti >= |s_ti - s_(t-1)i| so
+    servers do not flap between regions. Only the first hour of the solution is meant to be
+    committed, the rest of the horizon is re-planned at the next hour.
+    """
+
+    def __init__(self, scheduler, n_regions, routes, horizon, config=None):
+        """
+
+        Args:
+            scheduler: The scheduler the model is built for: carbon/latency
+            n_regions: Number of regions in the region set
+            routes: Sparse adjacency of the routes that get a variable, see feasible_routes()
+            horizon: Number of hours H in the horizon
+            config: Settings of the scheduler, defaults to Config
+        """
+        self.config = config or Config
+        self.hour_model = MatrixModel(scheduler, n_regions, routes, self.config)
+        self.n_regions = n_regions
+        self.horizon = horizon
+        R, H = n_regions, horizon
+        nb = self.hour_model.n_vars
+        self.n_vars = H * nb + H * R
+        # Outcome of the last solve, see solve_milp()
+        self.status = None
+        self.gap = None
+        self.stats = {}
+
+        # Rows s_ti - s_(t-1)i - u_ti <= 0 and -s_ti + s_(t-1)i - u_ti <= 0, s_(-1)i moves to the RHS
+        t, i = np.divmod(np.arange(H * R), R)
+        s_now = t * nb + self.hour_model.n_x + i
+        s_prev = s_now - nb
+        u = H * nb + t * R + i
+        has_prev = t > 0
+        rows, cols, data = [], [], []
+        for sign, offset in ((1, 0), (-1, H * R)):
+            row = offset + np.arange(H * R)
+            rows += [row, row[has_prev], row]
+            cols += [s_now, s_prev[has_prev], u]
+            data += [np.full(H * R, sign), np.full(has_prev.sum(), -sign), np.full(H * R, -1)]
+        self.churn = sparse.csr_matrix(
+            (np.concatenate(data).astype(np.float64), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(2 * H * R, self.n_vars),
+        )
+        self.integrality = np.concatenate([np.tile(self.hour_model.integrality, H), np.zeros(H * R)])
+
+    def schedule_servers(self, carbon_intensities, latencies, capacities, request_rates, previous_servers, time_limit=None):
+        """
+        Builds the horizon model and solves it with HiGHS.
+
+        If problem was not solved, a negative objective value is returned
+
+        Args:
+            request_rates: request_rates[t][i] is the number of requests from region i in hour t
+            capacities: capacities[t][i] is the average capacity per server in region i in hour t,
+                a single row is used for every hour
+            latencies: latencies[i][j] is the latency from region i to j
+            carbon_intensities: carbon_intensities[t][i] is the carbon intensity in region i in hour t
+            previous_servers: previous_servers[i] is the number of servers currently running in region i
+            time_limit: Time budget in seconds, building the model included. Defaults to the
+                SOLVER_TIME_LIMIT setting
+        Returns:
+            return1: n_servers[i] is the number of servers that should be started
+            in region i in the first hour.
+            return2: x[i][j] is the number of requests from region i that should
+            be sent to region j in the first hour.
+            return3: objective value over the whole horizon.
+        """
+        R, H = self.n_regions, self.horizon
+        model = self.hour_model
+        started = time.perf_counter()
+        deadline = deadline_after(self.config.SOLVER_TIME_LIMIT if time_limit is None else time_limit)
+        capacities = np.broadcast_to(np.asarray(capacities, dtype=np.float64), (H, R))
+        blocks, c, lower, upper = [], [], [], []
+        for t in range(H):
+            blocks.append(model.matrix(capacities[t]))
+            c.append(model.objective(carbon_intensities[t], latencies, request_rates[t]))
+            row_lower, row_upper = model.row_bounds(request_rates[t])
+            lower.append(row_lower)
+            upper.append(row_upper)
+        c.append(np.full(H * R, self.config.SERVER_CHURN_PENALTY * model.server_cost()))
+
+        churn_upper = np.zeros(2 * H * R)
+        previous_servers = np.asarray(previous_servers, dtype=np.float64)
+        churn_upper[:R] = previous_servers
+        churn_upper[H * R:H * R + R] = -previous_servers
+        A = sparse.vstack([
+            sparse.hstack([sparse.block_diag(blocks), sparse.csr_matrix((H * model.n_rows, H * R))]),
+            self.churn,
+        ]).tocsr()
+        constraints = LinearConstraint(
+            A,
+            np.concatenate(lower + [np.full(2 * H * R, -np.inf)]),
+            np.concatenate(upper + [churn_upper]),
+        )
+        ub = np.concatenate([np.tile(model.variable_bounds(), H), np.full(H * R, np.inf)])
+
+        self.stats = {"build": time.perf_counter() - started}
+        if time_left(deadline) == 0:
+            self.status, self.gap = "not_solved", None
+            return np.zeros(R), np.zeros((R, R), dtype=int), -10000
+        res = solve_milp(self, np.concatenate(c), constraints, Bounds(0, ub), self.integrality, time_left(deadline))
+        if res.x is None:
+            return np.zeros(R), np.zeros((R, R), dtype=int), -10000
+
+        # Commit only the first hour
+        started = time.perf_counter()
+        requests = np.zeros((R, R))
+        requests[model.x_i, model.x_j] = res.x[:model.n_x]
+        if self.config.INTEGER_ROUTING:
+            requests = np.rint(requests).astype(int)
+        servers = np.rint(res.x[model.n_x:model.n_vars]).astype(int)
+        self.stats["extract"] = time.perf_counter() - started
+        print(requests, servers)
+        return servers, requests, res.fun
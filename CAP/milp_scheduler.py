@@ -1,11 +1,131 @@
 # Authors: Basundhara Chakrabarty, Shruti Jasoria
 
 import logging
+import os
+import re
+import tempfile
+import time
 
 import numpy as np
 import pulp as plp
+from scipy import sparse
 from .config import Config
-from .util import Util
+from .flow_model import FlowModel
+from .matrix_model import HorizonModel, MatrixModel, deadline_after, time_left
+from .queueing import capacity_table
+from .rounding import round_requests
+from .solution_cache import SolutionCache
+from .telemetry import PHASES, SolverTelemetry
+
+
+def feasible_routes(latencies, max_latency=None):
+    """Presolve step that keeps only the (i, j) routes a request may take.
+
+    Instead of creating every x_ij and forcing the infeasible ones to zero with a latency
+    constraint, the schedulers only create variables for the routes returned here.
+
+    Args:
+        latencies: latencies[i][j] is the latency from region i to j
+        max_latency: Maximum latency allowed. If None, every route is kept.
+    Returns:
+        Sparse R x R adjacency matrix (CSR) where routes[i, j] is set if requests from
+        region i may be sent to region j
+    """
+    latencies = np.asarray(latencies)
+    if max_latency is None:
+        return sparse.csr_matrix(np.ones(latencies.shape, dtype=bool))
+    return sparse.csr_matrix(latencies <= max_latency)
+
+
+def cbc_solver(warm_start=False, time_limit=None, config=None, log_path=None):
+    """CBC command that honours the solver time budget and gap target of the settings
+
+    Args:
+        warm_start: Pass the current variable values to CBC as a MIP start
+        time_limit: Time budget in seconds, defaults to the SOLVER_TIME_LIMIT setting
+        config: Settings of the scheduler, defaults to Config
+        log_path: File CBC writes its log to instead of stdout, if any
+    """
+    config = config or Config
+    return plp.PULP_CBC_CMD(
+        msg=config.VERBOSE_MILP and log_path is None,
+        timeLimit=config.SOLVER_TIME_LIMIT if time_limit is None else time_limit,
+        gapRel=config.SOLVER_GAP,
+        warmStart=warm_start,
+        logPath=log_path,
+    )
+
+
+def solve_cbc(opt_model, stats, warm_start=False, time_limit=None, config=None):
+    """Solves a PuLP model with CBC and measures the solve
+
+    CBC runs as a subprocess that reads the model from a file. With SOLVER_LOG_STATS set, and
+    VERBOSE_MILP not streaming the log to stdout, CBC writes its log to a file. The wall time
+    of the call is then split into the time CBC reports for solving and the rest: process
+    startup and model and solution file I/O, and the node count is read from the log.
+    Otherwise the whole call counts as solving and the node count is unknown.
+
+    Args:
+        opt_model: The plp.LpProblem to solve
+        stats: Dictionary that receives the variables, constraints, solve, status and, if known,
+            startup and nodes
+        warm_start, time_limit, config: See cbc_solver()
+    """
+    config = config or Config
+    stats.update(variables=opt_model.numVariables(), constraints=opt_model.numConstraints(), nodes=None)
+    if config.VERBOSE_MILP or not config.SOLVER_LOG_STATS:
+        started = time.perf_counter()
+        opt_model.solve(cbc_solver(warm_start, time_limit, config))
+        stats.update(solve=time.perf_counter() - started, status=CBC_STATUSES.get(opt_model.sol_status, "not_solved"))
+        return
+
+    fd, log_path = tempfile.mkstemp(suffix=".log")
+    os.close(fd)
+    try:
+        started = time.perf_counter()
+        opt_model.solve(cbc_solver(warm_start, time_limit, config, log_path))
+        elapsed = time.perf_counter() - started
+        with open(log_path) as f:
+            log = f.read()
+    finally:
+        os.remove(log_path)
+
+    wallclock = re.search(r"Total time \(CPU seconds\):\s+\S+\s+\(Wallclock seconds\):\s+(\S+)", log)
+    nodes = re.search(r"Enumerated nodes:\s+(\d+)", log)
+    solve = min(float(wallclock.group(1)), elapsed) if wallclock else elapsed
+    stats.update(
+        startup=elapsed - solve,
+        solve=solve,
+        nodes=int(nodes.group(1)) if nodes else None,
+        status=CBC_STATUSES.get(opt_model.sol_status, "not_solved"),
+    )
+
+
+def routing_category(config=None):
+    """Category of the x_ij variables: integer, or continuous if INTEGER_ROUTING is off"""
+    return plp.LpInteger if (config or Config).INTEGER_ROUTING else plp.LpContinuous
+
+
+def routing_value(x_var, config=None):
+    """Value of an x_ij variable, rounded if the routing is integer"""
+    return round(x_var.varValue) if (config or Config).INTEGER_ROUTING else x_var.varValue
+
+
+def merge_stats(total, stats):
+    """Adds the phase wall times of a solve to total, the size and node count of the later solve win
+
+    Returns:
+        total
+    """
+    for name, value in stats.items():
+        total[name] = total.get(name, 0.0) + value if name in PHASES else value
+    return total
+
+
+# CBC statuses with a usable solution: proven optimal, or the best incumbent when the time budget ran out
+SOLVED = (plp.LpSolutionOptimal, plp.LpSolutionIntegerFeasible)
+# Outcome of a CBC solve by its status, see PersistentModel.status
+CBC_STATUSES = {plp.LpSolutionOptimal: "optimal", plp.LpSolutionIntegerFeasible: "time_limit"}
 
 
 class Latency:
@@ -14,7 +134,10 @@ class Latency:
         carbon_intensities,
         latencies,
         capacities,
-        request_rates
+        request_rates,
+        config=None,
+        stats=None,
+        time_limit=None
     ):
         """
         This is the latency greedy scheduler to compare with the Carbon Aware Scheduler. The placement
@@ -27,8 +150,10 @@ class Latency:
             capacities: capacities[i] is the average capacity per server in region i
             latencies: latencies[i][j] is the latency from region i to j
             carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
-            max_servers: max_servers is the maximum number of servers
-            max_latency: max_latency is the maximum latency allowed
+            config: Settings of the scheduler, defaults to Config
+            stats: Dictionary that receives the size of the model and the wall time of each phase
+            time_limit: Time budget in seconds, building the model included. Defaults to the
+                SOLVER_TIME_LIMIT setting
         Returns:
             return1: x[i][j] is the number of requests from region i that should
             be sent to region j.
@@ -37,28 +162,26 @@ class Latency:
             return3: objective value.
         """
         opt_model = plp.LpProblem("model",plp.LpMinimize)
+        config = config or Config
+        stats = {} if stats is None else stats
+        started = time.perf_counter()
+        deadline = deadline_after(config.SOLVER_TIME_LIMIT if time_limit is None else time_limit)
         n_regions = len(carbon_intensities)
         max_latency_per_region=[max(row)for row in latencies]
-        max_servers=Config.MAX_SERVERS_PER_REGION*n_regions
-        alpha=0.5
+        max_servers=config.MAX_SERVERS_PER_REGION*n_regions
+        alpha=config.LATENCY_ALPHA
         #print("sum_request_rate",sum_request_rate,"max_carbon_intensities",max_carbon_intensities,"max_servers",max_servers)
 
         max_obj_1=1/sum([i*j for i,j in zip(request_rates,max_latency_per_region)])
-        print(max_obj_1)
 
         set_R = range(n_regions)  # Region set
         x_vars = {
-            (i, j): plp.LpVariable(cat=plp.LpInteger, lowBound=0, name=f"x_{i}_{j}") for i in set_R for j in set_R
+            (i, j): plp.LpVariable(cat=routing_category(config), lowBound=0, name=f"x_{i}_{j}") for i in set_R for j in set_R
         }
 
         max_obj_2=1/max_servers
         #max_obj_2=plp.LpVariable(cat=plp.LpInteger, lowBound=max_servers,upBound=max_servers, name="max_servers")
-        s_vars = {i: plp.LpVariable(cat=plp.LpInteger, lowBound=0, upBound=Config.MAX_SERVERS_PER_REGION, name=f"s_{i}") for i in set_R}
-
-        # Identify idx of load balancer
-        region_names = Util.region_names()
-        lb_idx = region_names.to_list().index(Config.LOAD_BALANCER_REGION)
-
+        s_vars = {i: plp.LpVariable(cat=plp.LpInteger, lowBound=0, upBound=config.MAX_SERVERS_PER_REGION, name=f"s_{i}") for i in set_R}
 
         # Cap the number of servers
         opt_model.addConstraint(
@@ -95,16 +218,22 @@ class Latency:
         objective = alpha*max_obj_1*plp.lpSum((latencies[i][j]) * x_vars[i, j] for i in set_R for j in set_R)+(1-alpha)*max_obj_2*plp.lpSum(s_vars[i] for i in set_R)
 
         opt_model.setObjective(objective)
-        opt_model.solve(plp.PULP_CBC_CMD(msg=Config.VERBOSE_MILP))
+        stats["build"] = time.perf_counter() - started
+        requests = np.zeros((len(set_R), len(set_R)), dtype=int if config.INTEGER_ROUTING else float)
+        # Building the model used up the budget
+        if time_left(deadline) == 0:
+            return np.zeros(n_regions), requests, -10000
+        solve_cbc(opt_model, stats, time_limit=time_left(deadline), config=config)
+        started = time.perf_counter()
 
-        requests = np.zeros((len(set_R), len(set_R)), dtype=int)
+        if opt_model.sol_status not in SOLVED:
+            return np.zeros(n_regions), requests, -10000
         for i, j in x_vars.keys():
-            requests[i, j] = int(x_vars[i, j].varValue)
+            requests[i, j] = routing_value(x_vars[i, j], config)
 
-        servers=np.array([int(s.varValue) for s in s_vars.values()])
+        servers=np.array([round(s.varValue) for s in s_vars.values()])
+        stats["extract"] = time.perf_counter() - started
         print(requests,servers,objective.value())
-        if opt_model.sol_status != 1:
-            return np.zeros(n_regions), requests, -10000
 
         return (
             servers,
@@ -118,7 +247,10 @@ class Carbon:
         carbon_intensities,
         latencies,
         capacities,
-        request_rates
+        request_rates,
+        config=None,
+        stats=None,
+        time_limit=None
     ):
         """
         This is the Carbon Aware Provisioner (CAP) where the placement of servers are determined.
@@ -132,6 +264,10 @@ class Carbon:
             capacities: capacities[i] is the average capacity per server in region i
             latencies: latencies[i][j] is the latency from region i to j
             carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+            config: Settings of the scheduler, defaults to Config
+            stats: Dictionary that receives the size of the model and the wall time of each phase
+            time_limit: Time budget in seconds, building the model included. Defaults to the
+                SOLVER_TIME_LIMIT setting
         Returns:
             return1: x[i][j] is the number of requests from region i that should
             be sent to region j.
@@ -140,22 +276,25 @@ class Carbon:
             return3: objective value.
         """
         opt_model = plp.LpProblem(name="model")
+        config = config or Config
+        stats = {} if stats is None else stats
+        started = time.perf_counter()
+        deadline = deadline_after(config.SOLVER_TIME_LIMIT if time_limit is None else time_limit)
         n_regions = len(carbon_intensities)
         max_carbon_intensities=max(carbon_intensities)
-        max_servers=Config.MAX_SERVERS_PER_REGION*n_regions
+        max_servers=config.MAX_SERVERS_PER_REGION*n_regions
         max_obj_1=1/sum([max_carbon_intensities*j for j in request_rates])
         max_obj_2=1/max_servers
-        alpha=0.9
-
-        # Identify idx of load balancer
-        region_names = Util.region_names()
-        lb_idx = region_names.to_list().index(Config.LOAD_BALANCER_REGION)
+        alpha=config.CARBON_ALPHA
 
         set_R = range(n_regions)  # Region set
+        # Only routes within the latency SLO get a variable
+        routes = feasible_routes(latencies, config.MAX_LATENCY)
         x_vars = {
-            (i, j): plp.LpVariable(cat=plp.LpInteger, lowBound=0, name=f"x_{i}_{j}") for i in set_R for j in set_R
+            (i, j): plp.LpVariable(cat=routing_category(config), lowBound=0, name=f"x_{i}_{j}") for i, j in zip(*routes.nonzero())
         }
-        s_vars = {i: plp.LpVariable(cat=plp.LpInteger, lowBound=0, upBound=Config.MAX_SERVERS_PER_REGION, name=f"s_{i}") for i in set_R}
+        routes_to = routes.tocsc()
+        s_vars = {i: plp.LpVariable(cat=plp.LpInteger, lowBound=0, upBound=config.MAX_SERVERS_PER_REGION, name=f"s_{i}") for i in set_R}
 
         # Cap the number of servers
         opt_model.addConstraint(
@@ -171,7 +310,7 @@ class Carbon:
         for j in set_R:
             opt_model.addConstraint(
                 plp.LpConstraint(
-                    e=plp.lpSum(x_vars[i, j] for i in set_R) - s_vars[j] * capacities[j],
+                    e=plp.lpSum(x_vars[i, j] for i in routes_to[:, j].indices) - s_vars[j] * capacities[j],
                     sense=plp.LpConstraintLE,
                     rhs=0,
                     name=f"capacity_const{j}",
@@ -182,37 +321,31 @@ class Carbon:
         for i in set_R:
             opt_model.addConstraint(
                 plp.LpConstraint(
-                    e=plp.lpSum(x_vars[i, j] for j in set_R),
+                    e=plp.lpSum(x_vars[i, j] for j in routes[i].indices),
                     sense=plp.LpConstraintEQ,
                     rhs=request_rates[i],
                     name=f"sched_all_reqs_const{i}",
                 )
             )
 
-        # Latency constraint
-        for i in set_R:
-            for j in set_R:
-                opt_model.addConstraint(
-                    plp.LpConstraint(
-                        e=x_vars[i, j] * (latencies[i][j] - Config.MAX_LATENCY),
-                        sense=plp.LpConstraintLE,
-                        rhs=0,
-                        name=f"latency_const{i}_{j}",
-                    )
-                )
-
         #objective = plp.lpSum(carbon_intensities[j] * plp.lpSum(x_vars[i, j] for i in set_R) for j in set_R)
-        objective = alpha*max_obj_1*plp.lpSum(x_vars[i, j] * carbon_intensities[j] for i in set_R for j in set_R)+(1-alpha)*max_obj_2*plp.lpSum(s_vars[i] for i in set_R)
+        objective = alpha*max_obj_1*plp.lpSum(x_vars[i, j] * carbon_intensities[j] for i, j in x_vars)+(1-alpha)*max_obj_2*plp.lpSum(s_vars[i] for i in set_R)
 
         opt_model.setObjective(objective)
-        opt_model.solve(plp.PULP_CBC_CMD(msg=Config.VERBOSE_MILP))
-        requests = np.zeros((len(set_R), len(set_R)), dtype=int)
+        stats["build"] = time.perf_counter() - started
+        requests = np.zeros((len(set_R), len(set_R)), dtype=int if config.INTEGER_ROUTING else float)
+        # Building the model used up the budget
+        if time_left(deadline) == 0:
+            return np.zeros(n_regions), requests, -10000
+        solve_cbc(opt_model, stats, time_limit=time_left(deadline), config=config)
+        started = time.perf_counter()
+        if opt_model.sol_status not in SOLVED:
+            return np.zeros(n_regions), requests, -10000
         for i, j in x_vars.keys():
-            requests[i, j] = int(x_vars[i, j].varValue)
-        servers=np.array([int(s.varValue) for s in s_vars.values()])
+            requests[i, j] = routing_value(x_vars[i, j], config)
+        servers=np.array([round(s.varValue) for s in s_vars.values()])
+        stats["extract"] = time.perf_counter() - started
         print(requests,servers)
-        if opt_model.sol_status != 1:
-            return np.zeros(n_regions), requests, -10000
 
         return (
             servers,
@@ -220,32 +353,470 @@ class Carbon:
             objective.value(),
         )
 
+class Greedy:
+    @staticmethod
+    def schedule_servers(
+        carbon_intensities,
+        latencies,
+        capacities,
+        request_rates,
+        scheduler="carbon",
+        config=None
+    ):
+        """
+        Fast greedy placement used when the MILP could not be solved within its time budget.
+        Each region's requests are sent to the cheapest destinations first, lowest carbon
+        intensity within the latency SLO for the carbon scheduler and lowest latency for the
+        latency scheduler, until the destination runs out of servers. Regions with the most
+        requests are placed first.
+
+        Args:
+            request_rates: request_rates[i] is the number of requests from region i
+            capacities: capacities[i] is the average capacity per server in region i
+            latencies: latencies[i][j] is the latency from region i to j
+            carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+            scheduler: The scheduler being replaced: carbon/latency
+            config: Settings of the scheduler, defaults to Config
+        Returns:
+            return1: n_servers[i] is the number of servers that should be started
+            in region i.
+            return2: x[i][j] is the number of requests from region i that should
+            be sent to region j.
+            return3: objective value.
+        """
+        config = config or Config
+        n_regions = len(carbon_intensities)
+        carbon_intensities = np.asarray(carbon_intensities, dtype=np.float64)
+        latencies = np.asarray(latencies, dtype=np.float64)
+        capacities = np.asarray(capacities, dtype=np.float64)
+        request_rates = np.asarray(request_rates, dtype=np.int64)
+
+        capacity_left = np.floor(capacities * config.MAX_SERVERS_PER_REGION).astype(np.int64)
+        requests, dropped = Greedy.route(carbon_intensities, latencies, capacity_left, request_rates, scheduler, config)
+        if dropped.sum() > 0:
+            logging.warning(f"Greedy placement is dropping requests: {dropped.sum()}, initially: {request_rates.sum()}")
+
+        servers = np.ceil(requests.sum(axis=0) / capacities).astype(int)
+        max_servers = config.MAX_SERVERS_PER_REGION * n_regions
+        if scheduler == "carbon":
+            alpha = config.CARBON_ALPHA
+            max_obj_1 = 1 / np.sum(np.max(carbon_intensities) * request_rates)
+            cost = np.sum(requests * carbon_intensities[np.newaxis, :])
+        else:
+            alpha = config.LATENCY_ALPHA
+            max_obj_1 = 1 / np.sum(request_rates * np.max(latencies, axis=1))
+            cost = np.sum(requests * latencies)
+        objective = alpha * max_obj_1 * cost + (1 - alpha) / max_servers * servers.sum()
+        print(requests, servers)
+        return servers, requests, objective
+
+    @staticmethod
+    def route(carbon_intensities, latencies, capacity_left, request_rates, scheduler="carbon", config=None):
+        """Sends each region's requests to the cheapest destinations with capacity left
+
+        Args:
+            carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+            latencies: latencies[i][j] is the latency from region i to j
+            capacity_left: capacity_left[j] is the number of requests region j can absorb, updated in place
+            request_rates: request_rates[i] is the number of requests from region i
+            scheduler: carbon/latency
+            config: Settings of the scheduler, defaults to Config
+        Returns:
+            requests[i][j] sent from region i to region j and dropped[i], the requests of region i
+            that did not fit
+        """
+        config = config or Config
+        n_regions = len(request_rates)
+        requests = np.zeros((n_regions, n_regions), dtype=int)
+        dropped = np.zeros(n_regions, dtype=int)
+        for i in np.argsort(-request_rates, kind="stable"):
+            if scheduler == "carbon":
+                order = [j for j in np.argsort(carbon_intensities, kind="stable") if latencies[i][j] <= config.MAX_LATENCY]
+            else:
+                order = np.argsort(latencies[i], kind="stable")
+            left = request_rates[i]
+            for j in order:
+                load = min(left, capacity_left[j])
+                requests[i, j] += load
+                capacity_left[j] -= load
+                left -= load
+                if left == 0:
+                    break
+            dropped[i] = left
+        return requests, dropped
+
+    @staticmethod
+    def schedule_requests(carbon_intensities, latencies, capacities, request_rates, servers, scheduler="carbon", config=None):
+        """
+        Greedy routing through the running servers, used when the request scheduler does not
+        solve within its time budget.
+
+        Returns:
+            return1: x[i][j] is the number of requests from region i that should
+            be sent to region j.
+            return2: dropped[i] is the number of requests from region i that are dropped.
+        """
+        capacities = np.asarray(capacities, dtype=np.float64)
+        capacity_left = np.floor(np.asarray(servers) * capacities).astype(np.int64)
+        return Greedy.route(
+            np.asarray(carbon_intensities, dtype=np.float64),
+            np.asarray(latencies, dtype=np.float64),
+            capacity_left,
+            np.asarray(request_rates, dtype=np.int64),
+            scheduler,
+            config,
+        )
+
+class PersistentModel:
+    """
+    A Carbon or Latency MILP that is built once for a set of regions and re-used across hours.
+
+    Only request_rates and carbon_intensities change from one hour to the next, so instead of
+    building a fresh plp.LpProblem every hour the variables and constraints are kept alive and
+    only the RHS of the demand constraints and the coefficients are updated in place. The
+    previous hour's x_ij/s_i values are left on the variables and passed to CBC as a warm start.
+    Variables only exist for the feasible routes, so no latency constraints are needed.
+    """
+
+    def __init__(self, scheduler, n_regions, routes, config=None):
+        """
+
+        Args:
+            scheduler: The scheduler the model is built for: carbon/latency
+            n_regions: Number of regions in the region set
+            routes: Sparse adjacency of the routes that get a variable, see feasible_routes()
+            config: Settings of the scheduler, defaults to Config
+        """
+        self.config = config or Config
+        self.scheduler = scheduler
+        self.n_regions = n_regions
+        self.routes = routes
+        self.opt_model = plp.LpProblem(name="model", sense=plp.LpMinimize)
+        self.has_solution = False
+        # Outcome of the last solve: optimal/time_limit/not_solved and the relative MIP gap, if known
+        self.status = None
+        self.gap = None
+        # Size of the model and wall times of the phases of the last solve, see solve_cbc()
+        self.stats = {}
+        # Time CBC spent outside of solving in the last solve, model and solution file I/O, which
+        # its own time limit does not cover
+        self.startup = 0.0
+
+        set_R = range(n_regions)  # Region set
+        self.x_vars = {
+            (i, j): plp.LpVariable(cat=routing_category(self.config), lowBound=0, name=f"x_{i}_{j}") for i, j in zip(*routes.nonzero())
+        }
+        routes_to = routes.tocsc()
+        self.s_vars = {i: plp.LpVariable(cat=plp.LpInteger, lowBound=0, upBound=self.config.MAX_SERVERS_PER_REGION, name=f"s_{i}") for i in set_R}
+
+        # Cap the number of servers
+        self.max_server_const = plp.LpConstraint(
+            e=plp.lpSum(self.s_vars[i] for i in set_R),
+            sense=plp.LpConstraintLE,
+            rhs=0,
+            name="max_server",
+        )
+        self.opt_model.addConstraint(self.max_server_const)
+
+        # Per server max capacity, the coefficient of s_j is set in update()
+        self.capacity_consts = {}
+        for j in set_R:
+            self.capacity_consts[j] = plp.LpConstraint(
+                e=plp.lpSum(self.x_vars[i, j] for i in routes_to[:, j].indices) - self.s_vars[j],
+                sense=plp.LpConstraintLE,
+                rhs=0,
+                name=f"capacity_const{j}",
+            )
+            self.opt_model.addConstraint(self.capacity_consts[j])
+
+        # All requests from a region must go somewhere, the RHS is set in update()
+        self.demand_consts = {}
+        for i in set_R:
+            self.demand_consts[i] = plp.LpConstraint(
+                e=plp.lpSum(self.x_vars[i, j] for j in routes[i].indices),
+                sense=plp.LpConstraintEQ,
+                rhs=0,
+                name=f"sched_all_reqs_const{i}",
+            )
+            self.opt_model.addConstraint(self.demand_consts[i])
+
+        # Objective coefficients are set in update()
+        self.objective = plp.lpSum(list(self.x_vars.values()) + list(self.s_vars.values()))
+        self.opt_model.setObjective(self.objective)
+
+    def update(self, carbon_intensities, latencies, capacities, request_rates):
+        """Updates the coefficients and RHS of the model in place for a new hour
+
+        Args:
+            request_rates: request_rates[i] is the number of requests from region i
+            capacities: capacities[i] is the average capacity per server in region i
+            latencies: latencies[i][j] is the latency from region i to j
+            carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+        """
+        set_R = range(self.n_regions)
+        max_servers = self.config.MAX_SERVERS_PER_REGION * self.n_regions
+        self.max_server_const.constant = -max_servers
+        for i in set_R:
+            self.s_vars[i].upBound = self.config.MAX_SERVERS_PER_REGION
+            self.capacity_consts[i][self.s_vars[i]] = -capacities[i]
+            self.demand_consts[i].constant = -request_rates[i]
+
+        if self.scheduler == "carbon":
+            alpha = self.config.CARBON_ALPHA
+            max_obj_1 = 1 / sum([max(carbon_intensities) * j for j in request_rates])
+            for i, j in self.x_vars:
+                self.objective[self.x_vars[i, j]] = alpha * max_obj_1 * carbon_intensities[j]
+        else:
+            alpha = self.config.LATENCY_ALPHA
+            max_latency_per_region = [max(row) for row in latencies]
+            max_obj_1 = 1 / sum([i * j for i, j in zip(request_rates, max_latency_per_region)])
+            for i, j in self.x_vars:
+                self.objective[self.x_vars[i, j]] = alpha * max_obj_1 * latencies[i][j]
+        max_obj_2 = 1 / max_servers
+        for i in set_R:
+            self.objective[self.s_vars[i]] = (1 - alpha) * max_obj_2
+
+    def seed(self, servers, requests):
+        """Uses a known schedule as the warm start of the next solve
+
+        Args:
+            servers: servers[i] is the number of servers in region i
+            requests: requests[i][j] is the number of requests from region i sent to region j
+        """
+        for (i, j), x_var in self.x_vars.items():
+            x_var.setInitialValue(requests[i][j])
+        for i, s_var in self.s_vars.items():
+            s_var.setInitialValue(servers[i])
+        self.has_solution = True
+
+    def schedule_servers(self, carbon_intensities, latencies, capacities, request_rates, time_limit=None):
+        """
+        Updates the model for the given hour and solves it, warm-started from the previous solution.
+
+        If problem was not solved, a negative objective value is returned
+
+        Args:
+            request_rates: request_rates[i] is the number of requests from region i
+            capacities: capacities[i] is the average capacity per server in region i
+            latencies: latencies[i][j] is the latency from region i to j
+            carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+            time_limit: Time budget in seconds, updating the model included. Defaults to the
+                SOLVER_TIME_LIMIT setting
+        Returns:
+            return1: n_servers[i] is the number of servers that should be started
+            in region i.
+            return2: x[i][j] is the number of requests from region i that should
+            be sent to region j.
+            return3: objective value.
+        """
+        started = time.perf_counter()
+        deadline = deadline_after(self.config.SOLVER_TIME_LIMIT if time_limit is None else time_limit)
+        self.update(carbon_intensities, latencies, capacities, request_rates)
+        self.stats = {"build": time.perf_counter() - started}
+        set_R = range(self.n_regions)
+        requests = np.zeros((len(set_R), len(set_R)), dtype=int if self.config.INTEGER_ROUTING else float)
+        # Keep the file I/O of the last solve out of the time given to CBC
+        time_limit = time_left(deadline)
+        if time_limit is not None:
+            time_limit -= self.startup
+            if time_limit <= 0:
+                self.status, self.gap = "not_solved", None
+                return np.zeros(self.n_regions), requests, -10000
+        solve_cbc(self.opt_model, self.stats, warm_start=self.has_solution, time_limit=time_limit, config=self.config)
+        self.startup = self.stats.get("startup", self.startup)
+        started = time.perf_counter()
+
+        if self.opt_model.sol_status not in SOLVED:
+            # Do not warm start the next hour from a solution that was never found
+            self.has_solution = False
+            self.status, self.gap = "not_solved", None
+            return np.zeros(self.n_regions), requests, -10000
+
+        # CBC does not report the gap of an incumbent found within the time budget
+        if self.opt_model.sol_status == plp.LpSolutionOptimal:
+            self.status, self.gap = "optimal", self.config.SOLVER_GAP or 0.0
+        else:
+            self.status, self.gap = "time_limit", None
+        self.has_solution = True
+        for i, j in self.x_vars.keys():
+            requests[i, j] = routing_value(self.x_vars[i, j], self.config)
+        servers = np.array([round(s.varValue) for s in self.s_vars.values()])
+        self.stats["extract"] = time.perf_counter() - started
+        print(requests, servers)
+        return (
+            servers,
+            requests,
+            plp.value(self.objective),
+        )
+
 class MilpScheduler:
+    backends = {"cbc": PersistentModel, "highs": MatrixModel, "flow": FlowModel}
+
+    def __init__(self, config=None, telemetry=None):
+        """
+
+        Args:
+            config: Settings of the scheduler, defaults to Config. Every scheduler keeps its own
+                models, cache and last solve, so schedulers with different settings do not mix
+            telemetry: SolverTelemetry the scheduling calls are recorded in, defaults to a new one
+                of TELEMETRY_SIZE calls
+        """
+        self.config = config or Config
+        self.telemetry = SolverTelemetry(self.config.TELEMETRY_SIZE) if telemetry is None else telemetry
+        # Size of the model and wall times of the phases of the last scheduling call, see PHASES
+        self.last_stats = {}
+        # Models kept alive across hours, keyed by backend, scheduler, region set and routes
+        self.models = {}
+        # Outcome of the last schedule_servers() call: solver status, relative MIP gap, whether the greedy fallback was used
+        # and the objective value
+        self.last_solve = {"status": None, "gap": None, "fallback": False, "objective": None}
+        # Solutions of previous hours, see get_cache()
+        self.cache = None
+        # Outcome of the last schedule_requests() call: solver status, whether the greedy fallback was used,
+        # the objective value and the dropped requests per region
+        self.last_route = {"status": None, "fallback": False, "objective": None, "dropped": None}
+        # Seconds per route of building a CBC model and of writing it out to CBC, measured on the last
+        # build and solve, see setup_time()
+        self.build_rate = self.config.MILP_BUILD_SECONDS_PER_ROUTE
+        self.startup_rate = self.config.MILP_BUILD_SECONDS_PER_ROUTE
+
+    def __repr__(self):
+        return f"MilpScheduler({self.config.SCHEDULER}, backend={self.config.MILP_BACKEND})"
+
+    def get_model(self, scheduler, region_names, routes, horizon=1, backend=None):
+        """Returns the persistent model for a scheduler and region set, building it on first use
+
+        The model is rebuilt whenever the feasible routes change, e.g. if MAX_LATENCY is changed.
+        Rolling-horizon models (horizon > 1) are always solved with the HiGHS matrix backend.
+
+        Args:
+            scheduler: The scheduler the model is built for: carbon/latency
+            region_names: Names of the regions in the region set, in-place order
+            routes: Sparse adjacency of the feasible routes, see feasible_routes()
+            horizon: Number of hours the model provisions at once
+            backend: The backend to use, defaults to the MILP_BACKEND setting
+        """
+        key = self.model_key(scheduler, region_names, routes, horizon, backend)
+        if key not in self.models:
+            started = time.perf_counter()
+            if horizon == 1:
+                self.models[key] = self.backends[key[0]](scheduler, len(region_names), routes, self.config)
+            else:
+                self.models[key] = HorizonModel(scheduler, len(region_names), routes, horizon, self.config)
+            if key[0] == "cbc":
+                self.build_rate = (time.perf_counter() - started) / max(routes.nnz, 1)
+                # Until its first solve is measured, the model keeps the estimated file I/O out of the time given to CBC
+                self.models[key].startup = self.startup_rate * routes.nnz
+        return self.models[key]
+
+    def model_key(self, scheduler, region_names, routes, horizon=1, backend=None):
+        """Key of a model in self.models, see get_model()"""
+        backend = backend or self.config.MILP_BACKEND
+        if backend not in self.backends:
+            raise Exception(f"Invalid MILP backend: {backend}")
+        if horizon > 1:
+            backend = "horizon"
+        return (backend, horizon, self.config.INTEGER_ROUTING, scheduler, tuple(region_names), routes.indptr.tobytes(), routes.indices.tobytes())
+
+    def setup_time(self, scheduler, region_names, routes, backend=None):
+        """Estimated seconds before CBC starts solving: building the model, unless it is built
+        already, and writing it out to CBC
+
+        Only CBC models are built with PuLP one variable at a time and written to a file, which
+        takes time in the number of routes. The other backends build sparse matrices and solve
+        them in-process, which is comparatively free.
+
+        Args:
+            See get_model(). backend None is a CBC model built for a single solve, which is
+            never kept
+        """
+        if backend not in (None, "cbc"):
+            return 0.0
+        built = backend is not None and self.model_key(scheduler, region_names, routes, backend=backend) in self.models
+        return ((0.0 if built else self.build_rate) + self.startup_rate) * routes.nnz
+
+    def measure_setup(self, routes, stats):
+        """Updates the estimates of setup_time() with the phases of a CBC solve"""
+        if "startup" in stats:
+            self.startup_rate = stats["startup"] / max(routes.nnz, 1)
+
+    @staticmethod
     def compute_carbon_intensities(server_manager, hour):
-        carbon_intensities = [region.carbon_intensity[hour] for region in server_manager.regions]
+        carbon_intensities = server_manager.table.carbon[hour]
         return carbon_intensities
     
+    @staticmethod
     def compute_latencies(server_manager, request_batches):
-        latencies = np.array(
-            [[region.latency(batch.region) for region in server_manager.regions] for batch in request_batches]
-        )
+        # Rows are the origins of the batches, columns the regions requests can be sent to
+        latencies = server_manager.table.latency[[batch.region.index for batch in request_batches]]
         print("compute_args: Latencies:\n",latencies)
         if np.isnan(latencies).any():
             latencies[np.isnan(latencies)] = 10**6
             logging.warning(f"Detected NaN value in latency adjacency matrix. Converted to 10^6 as penalty.")
         return latencies
 
-    def compute_capacities(server_manager):
-        capacities = [Config.SERVER_CAPACITY] * len(server_manager.regions)
+    def compute_routes(self, latencies):
+        # Only the carbon scheduler bounds the latency, the latency scheduler may use every route
+        if self.config.SCHEDULER == "carbon":
+            return feasible_routes(latencies, self.config.MAX_LATENCY)
+        return feasible_routes(latencies)
+
+    def compute_capacities(self, server_manager, hour=None, horizon=None, request_rates=None):
+        # capacities[i] for the hour, or capacities[t][i] for each hour of the horizon if one is given.
+        # With the erlang model the capacities depend on the requests that are scheduled, request_rates[i]
+        # (or request_rates[t][i]). Without them the capacities of all hours are computed once per region
+        # table from its demand
+        if self.config.CAPACITY_MODEL == "erlang" and request_rates is not None:
+            max_latency = self.config.MAX_LATENCY if self.config.SCHEDULER == "carbon" else None
+            capacities = capacity_table(server_manager.table, max_latency, self.config, np.atleast_2d(request_rates))
+            if horizon is None:
+                capacities = capacities[0]
+        elif self.config.CAPACITY_MODEL == "erlang" and hour is not None:
+            max_latency = self.config.MAX_LATENCY if self.config.SCHEDULER == "carbon" else None
+            key = ("erlang", self.config.TARGET_RESPONSE_TIME, self.config.ERLANG_SERVERS, self.config.SERVER_CAPACITY, max_latency)
+            table = server_manager.table
+            if key not in table.derived:
+                table.derived[key] = capacity_table(table, max_latency, self.config)
+            capacities = table.derived[key][hour] if horizon is None else table.derived[key][hour:hour + horizon]
+        elif self.config.CAPACITY_MODEL in ("constant", "erlang"):
+            if horizon is None:
+                capacities = [self.config.SERVER_CAPACITY] * len(server_manager.regions)
+            else:
+                capacities = np.full((horizon, len(server_manager.regions)), self.config.SERVER_CAPACITY, dtype=np.float64)
+        else:
+            raise Exception("Invalid capacity model")
         print("compute_args: capacities:\n",capacities)
         return capacities
 
+    @staticmethod
     def compute_request_rates(request_batches):
         # Hourly request rate taken from the batches
         request_rates = np.array([batch.load for batch in request_batches], dtype=np.int64)
         print("compute_args: request_rates:\n",request_rates)
         return request_rates
 
+    def compute_horizon(self, server_manager, hour):
+        # The data loader reserves TIMESTEPS + 24 rows, the horizon is clipped to the rows left
+        hours_left = server_manager.table.carbon.shape[0] - hour
+        return max(1, min(self.config.HORIZON, hours_left))
+
+    @staticmethod
+    def compute_future_carbon_intensities(server_manager, hour, horizon):
+        carbon_intensities = server_manager.table.carbon[hour:hour + horizon]
+        print("compute_args: Future carbon intensities:\n",carbon_intensities)
+        return carbon_intensities
+
+    def compute_future_request_rates(self, server_manager, request_batches, hour, horizon):
+        # The first hour uses the batches, later hours are forecast from the request data
+        request_rates = [self.compute_request_rates(request_batches)]
+        future = server_manager.table.demand[hour + 1:hour + horizon].astype(np.int64)
+        if self.config.REQUEST_RATE:
+            future[:] = self.config.REQUEST_RATE
+        request_rates = np.concatenate([request_rates, future])
+        print("compute_args: Future request_rates:\n",request_rates)
+        return request_rates
+
+    @staticmethod
     def validate_objective_value(obj_val, hour, carbon_intensities, latencies, capacities, request_rates):
         if obj_val < 0:
             logging.warning(
@@ -259,61 +830,293 @@ class MilpScheduler:
             )
             raise Exception("Infeasible problem, look above for more info")
 
-    @classmethod
-    def schedule_servers(cls,
+    def record(self, call, hour, outcome):
+        """Records the last scheduling call and its stats in the telemetry
+
+        Args:
+            call: servers or requests
+            hour: Hour of the call
+            outcome: last_solve or last_route of the call
+        """
+        stats = self.last_stats
+        backend = "greedy" if outcome["fallback"] else stats.get("backend", self.config.MILP_BACKEND)
+        self.telemetry.record(
+            call,
+            hour,
+            self.config.SCHEDULER,
+            backend,
+            outcome["status"],
+            stats,
+            variables=stats.get("variables"),
+            constraints=stats.get("constraints"),
+            gap=outcome.get("gap"),
+            nodes=stats.get("nodes"),
+            objective=outcome["objective"],
+            fallback=outcome["fallback"],
+        )
+
+    def get_cache(self):
+        """Returns the solution cache, creating it on first use. None if SOLUTION_CACHE_SIZE is 0"""
+        if self.config.SOLUTION_CACHE_SIZE <= 0:
+            return None
+        if self.cache is None or self.cache.max_size != self.config.SOLUTION_CACHE_SIZE or self.cache.path != self.config.SOLUTION_CACHE_PATH:
+            if self.cache is not None:
+                self.cache.close()
+            self.cache = SolutionCache(self.config.SOLUTION_CACHE_SIZE, self.config.SOLUTION_CACHE_PATH, self.config)
+        return self.cache
+
+    def solve_servers(self,
+        request_batches,
+        server_manager,
+        hour,
+        carbon_intensities,
+        latencies,
+        capacities,
+        request_rates,
+        horizon,
+        deadline=None
+    ):
+        """
+        Runs the configured solver for an hour, falling back to greedy placement if it fails.
+        The size of the model and the wall time of each phase are collected in self.last_stats.
+
+        Every solve gets the time left until the deadline, which also covers building the
+        models. CBC is not run if the time left cannot cover building the model and writing it
+        out, see setup_time(), and the servers are placed greedily instead, as they are if the
+        build used up the budget. The flow
+        backend only hands its schedule to CBC if FLOW_ESCALATION_MIN_TIME seconds and the time
+        to build the CBC model are left.
+
+        Args:
+            deadline: time.perf_counter() value by which the schedule is due, None means no limit
+        Returns:
+            servers, requests and objective value
+        """
+        uses_model = self.config.PERSISTENT_MILP or self.config.MILP_BACKEND != "cbc"
+        model = None
+        stats = self.last_stats
+        n_regions = len(request_rates)
+        not_solved = np.zeros(n_regions), np.zeros((n_regions, n_regions), dtype=int), -10000
+
+        def covers(seconds):
+            remaining = time_left(deadline)
+            return remaining is None or remaining > seconds
+
+        if horizon > 1 and self.config.SCHEDULER in ("carbon", "latency"):
+            stats["backend"] = "horizon"
+            started = time.perf_counter()
+            routes = self.compute_routes(latencies)
+            model = self.get_model(self.config.SCHEDULER, server_manager.region_names, routes, horizon)
+            stats["build"] = time.perf_counter() - started
+            future_request_rates = self.compute_future_request_rates(server_manager, request_batches, hour, horizon)
+            servers, requests, obj_val = model.schedule_servers(
+                self.compute_future_carbon_intensities(server_manager, hour, horizon),
+                latencies,
+                self.compute_capacities(server_manager, hour, horizon, future_request_rates),
+                future_request_rates,
+                server_manager.servers_per_region(),
+                time_limit=time_left(deadline),
+            )
+            merge_stats(stats, model.stats)
+        elif uses_model and self.config.SCHEDULER in ("carbon", "latency"):
+            stats["backend"] = self.config.MILP_BACKEND
+            started = time.perf_counter()
+            routes = self.compute_routes(latencies)
+            if covers(self.setup_time(self.config.SCHEDULER, server_manager.region_names, routes, self.config.MILP_BACKEND)):
+                model = self.get_model(self.config.SCHEDULER, server_manager.region_names, routes)
+            stats["build"] = time.perf_counter() - started
+            # The build may have used up the budget
+            if model is not None and covers(0):
+                servers, requests, obj_val = model.schedule_servers(carbon_intensities, latencies, capacities,request_rates, time_limit=time_left(deadline))
+                merge_stats(stats, model.stats)
+                if self.config.MILP_BACKEND == "cbc":
+                    self.measure_setup(routes, model.stats)
+            else:
+                model = None
+                servers, requests, obj_val = not_solved
+            # Hand schedules the flow search could not prove close enough to optimal to CBC, seeded with them,
+            # if enough of the budget is left to build the CBC model and for CBC to improve on them
+            if self.config.MILP_BACKEND == "flow" and obj_val >= 0 and model.gap > self.config.FLOW_MAX_GAP and covers(
+                self.config.FLOW_ESCALATION_MIN_TIME + self.setup_time(self.config.SCHEDULER, server_manager.region_names, routes, "cbc")
+            ):
+                flow_solution = servers, requests, obj_val
+                stats["backend"] = "flow+cbc"
+                started = time.perf_counter()
+                model = self.get_model(self.config.SCHEDULER, server_manager.region_names, routes, backend="cbc")
+                model.seed(servers, requests)
+                merge_stats(stats, {"build": time.perf_counter() - started})
+                servers, requests, obj_val = model.schedule_servers(carbon_intensities, latencies, capacities,request_rates, time_limit=time_left(deadline))
+                merge_stats(stats, model.stats)
+                self.measure_setup(routes, model.stats)
+                if obj_val < 0:
+                    servers, requests, obj_val = flow_solution
+        elif self.config.SCHEDULER in ("carbon", "latency"):
+            stats["backend"] = "cbc"
+            routes = self.compute_routes(latencies)
+            if covers(self.setup_time(self.config.SCHEDULER, server_manager.region_names, routes)):
+                scheduler = Carbon if self.config.SCHEDULER == "carbon" else Latency
+                # Keep the estimated file I/O out of the time given to CBC
+                time_limit = time_left(deadline)
+                if time_limit is not None:
+                    time_limit -= self.startup_rate * routes.nnz
+                servers, requests, obj_val = scheduler.schedule_servers(carbon_intensities, latencies, capacities,request_rates, self.config, stats, time_limit)
+                self.build_rate = stats["build"] / max(routes.nnz, 1)
+                self.measure_setup(routes, stats)
+            else:
+                servers, requests, obj_val = not_solved
+        else:
+            raise Exception("Invalid scheduler")
+
+        if model is not None:
+            self.last_solve = {"status": model.status, "gap": model.gap, "fallback": False}
+        else:
+            # A model built for a single solve leaves the CBC status in the stats
+            status = stats.get("status", "not_solved") if obj_val >= 0 else "not_solved"
+            gap = (self.config.SOLVER_GAP or 0.0) if status == "optimal" else None
+            self.last_solve = {"status": status, "gap": gap, "fallback": False}
+        if obj_val < 0 and self.config.GREEDY_FALLBACK:
+            logging.warning(f"No solution found for t={hour} within the time budget, falling back to greedy placement")
+            started = time.perf_counter()
+            servers, requests, obj_val = Greedy.schedule_servers(carbon_intensities, latencies, capacities, request_rates, self.config.SCHEDULER, self.config)
+            merge_stats(stats, {"solve": time.perf_counter() - started})
+            self.last_solve = {"status": "greedy", "gap": None, "fallback": True}
+
+        if not self.config.INTEGER_ROUTING:
+            started = time.perf_counter()
+            servers, requests = round_requests(requests, request_rates, servers, capacities, self.compute_routes(latencies), self.config)
+            merge_stats(stats, {"extract": time.perf_counter() - started})
+        return servers, requests, obj_val
+
+    def schedule_servers(self,
         request_batches,
         server_manager,
-        hour
+        hour,
+        time_limit=None
     ):
         """
         Wrapper around the CAP
+
+        The time budget starts when the call does: computing the inputs, building the models and
+        every solve come out of it. The solver returns the best solution it finds within the
+        budget. If it does not find any and GREEDY_FALLBACK is set, the servers are placed
+        greedily instead, so the control loop always gets a schedule in time. The outcome is
+        recorded in self.last_solve. Solutions of hours with the same quantized inputs are
+        served from the solution cache.
+
+        Args:
+            request_batches: Batches of requests for the hour, one per region
+            server_manager: Central server manager object that holds the regions
+            hour: current timestep
+            time_limit: Time budget of the call in seconds, defaults to the SOLVER_TIME_LIMIT setting
         """
         print("**************CAP RUNNING**************")
-        carbon_intensities = cls.compute_carbon_intensities(server_manager, hour)
-        latencies = cls.compute_latencies(server_manager, request_batches)
-        capacities = cls.compute_capacities(server_manager)
-        request_rates = cls.compute_request_rates(request_batches)
-        if Config.SCHEDULER == "carbon":
-            servers, requests, obj_val = Carbon.schedule_servers(carbon_intensities, latencies, capacities,request_rates)
-        elif Config.SCHEDULER == "latency":
-            servers, requests, obj_val = Latency.schedule_servers(carbon_intensities, latencies, capacities,request_rates)
+        started = time.perf_counter()
+        deadline = deadline_after(self.config.SOLVER_TIME_LIMIT if time_limit is None else time_limit)
+        carbon_intensities = self.compute_carbon_intensities(server_manager, hour)
+        latencies = self.compute_latencies(server_manager, request_batches)
+        request_rates = self.compute_request_rates(request_batches)
+        capacities = self.compute_capacities(server_manager, hour, request_rates=request_rates)
+        horizon = self.compute_horizon(server_manager, hour) if self.config.HORIZON > 1 else 1
+
+        # A rolling-horizon solution also depends on the future and the running servers, it is not cached
+        cache = self.get_cache() if horizon == 1 else None
+        cached = None
+        if cache is not None:
+            key = cache.key(carbon_intensities, latencies, capacities, request_rates)
+            cached = cache.get(key, request_rates, capacities, carbon_intensities, latencies)
+        self.last_stats = {"inputs": time.perf_counter() - started}
+        if cached is not None:
+            servers, requests, obj_val = cached
+            self.last_solve = {"status": "cached", "gap": None, "fallback": False}
+            self.last_stats["backend"] = "cache"
         else:
-            raise Exception("Invalid scheduler")
+            servers, requests, obj_val = self.solve_servers(
+                request_batches, server_manager, hour, carbon_intensities, latencies, capacities, request_rates, horizon, deadline
+            )
+            # Only schedules proven within SOLVER_GAP of the optimum are reused, not the incumbents of
+            # a solver that ran out of time, flow schedules further from the bound or greedy placements
+            gap = self.last_solve["gap"]
+            exact = self.last_solve["status"] == "optimal" or (gap is not None and gap <= (self.config.SOLVER_GAP or 0.0))
+            if cache is not None and obj_val >= 0 and exact:
+                cache.put(key, servers, requests, obj_val)
 
+        self.last_solve["objective"] = obj_val
+        self.record("servers", hour, self.last_solve)
         print("CAP output: Requests redirected:\n ",requests)
         print("CAP output: Servers:\n ",servers)
-        cls.validate_objective_value(obj_val, hour, carbon_intensities, latencies, capacities, request_rates)
+        print("CAP output: Solve:\n ",self.last_solve)
+        self.validate_objective_value(obj_val, hour, carbon_intensities, latencies, capacities, request_rates)
         # If we never plan to schedule at a region, we set the servers in that region to 0.
-        mask = np.sum(requests, axis=0) == 0
-        servers[mask] = 0
+        # The rolling-horizon scheduler may deliberately keep idle servers to avoid churn.
+        if horizon == 1:
+            mask = np.sum(requests, axis=0) == 0
+            servers[mask] = 0
 
         return servers,requests,carbon_intensities,latencies
 
-    def schedule_requests(
-        conf,
+    def schedule_requests(self,
         request_batches,
         server_manager,
-        t,
-        request_update_interval,
-        max_latency,
+        hour,
+        fraction=0.0,
+        servers=None,
+        time_limit=None
     ):
         """
         Wrapper around the CAS
+
+        Re-routes the requests of a sub-hour step through the servers that are already running,
+        without provisioning any. The routing is a transportation problem solved by the flow
+        model within a budget of milliseconds; requests the servers cannot absorb are dropped.
+        If it is not solved in time and GREEDY_FALLBACK is set, the requests are routed
+        greedily. The outcome is recorded in self.last_route.
+
+        Args:
+            request_batches: Batches of requests for the step, one per region
+            server_manager: Central server manager object that holds the regions
+            hour: current timestep
+            fraction: Part of the hour that has passed, the carbon intensities are resampled at that time
+            servers: servers[j] is the number of servers in region j, defaults to the running servers
+            time_limit: Time budget of the solver in seconds, defaults to the REQUEST_TIME_LIMIT setting
+        Returns:
+            requests[i][j] is the number of requests from region i that should be sent to region j,
+            the carbon intensities and the latencies of the step
         """
         print("**************CAS RUNNING**************")
-        carbon_intensities = cls.compute_carbon_intensities(server_manager, hour)
-        latencies = cls.compute_latencies(server_manager, request_batches)
-        capacities = cls.compute_capacities(server_manager)
-        request_rates = cls.compute_request_rates(request_batches)
-        if conf.scheduler == "carbon":
-            requests, obj_val = Carbon.schedule_requests(*schedule_args)
-        elif conf.scheduler == "latency":
-            requests, obj_val = Latency.schedule_requests(*schedule_args)
+        started = time.perf_counter()
+        if fraction:
+            carbon_intensities = server_manager.table.carbon_at(hour + fraction)
         else:
+            carbon_intensities = self.compute_carbon_intensities(server_manager, hour)
+        latencies = self.compute_latencies(server_manager, request_batches)
+        request_rates = self.compute_request_rates(request_batches)
+        capacities = self.compute_capacities(server_manager, hour, request_rates=request_rates)
+        if servers is None:
+            servers = server_manager.servers_per_region()
+        if self.config.SCHEDULER not in ("carbon", "latency"):
             raise Exception("Invalid scheduler")
-        print("CAS output: Requests redirected:\n ",requests)
-        validate_objective_value(obj_val, t, *args)
 
-        carbon_intensities, _, latencies, *_ = args
-        print("Cas output: Latencies: ", latencies)
-        return latencies, carbon_intensities, requests
+        routes = self.compute_routes(latencies)
+        model = self.get_model(self.config.SCHEDULER, server_manager.region_names, routes, backend="flow")
+        self.last_stats = {"inputs": time.perf_counter() - started, "backend": "flow"}
+        requests, dropped, obj_val = model.schedule_requests(carbon_intensities, latencies, capacities, request_rates, servers, time_limit=time_limit)
+        merge_stats(self.last_stats, model.stats)
+        self.last_route = {"status": model.status, "fallback": False, "objective": obj_val}
+        if obj_val < 0:
+            if not self.config.GREEDY_FALLBACK:
+                raise Exception(f"Requests could not be routed within the time budget, t={hour}")
+            logging.warning(f"Requests not routed for t={hour} within the time budget, falling back to greedy routing")
+            started = time.perf_counter()
+            requests, dropped = Greedy.schedule_requests(
+                carbon_intensities, latencies, capacities, request_rates, servers, self.config.SCHEDULER, self.config
+            )
+            merge_stats(self.last_stats, {"solve": time.perf_counter() - started})
+            self.last_route = {"status": "greedy", "fallback": True, "objective": None}
+        self.last_route["dropped"] = dropped
+        self.record("requests", hour + fraction, self.last_route)
+        if dropped.sum() > 0:
+            logging.warning(f"Running servers cannot absorb all requests of t={hour}, dropping: {dropped}")
+
+        print("CAS output: Requests redirected:\n ",requests)
+        print("CAS output: Dropped:\n ",dropped)
+        return requests, carbon_intensities, latencies
@@ -0,0 +1,110 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import numpy as np
+from .config import Config
+
+
+def erlang_c(servers, load):
+    """Probability that a request has to wait in an M/M/c queue
+
+    Computed with the Erlang B recursion B(k) = a * B(k - 1) / (k + a * B(k - 1)), which is
+    numerically stable for large c.
+
+    Args:
+        servers: Number of servers c
+        load: Offered load a = arrival rate / service rate, a scalar or an array. Must be < c
+    Returns:
+        Erlang C probability, same shape as load
+    """
+    load = np.asarray(load, dtype=np.float64)
+    blocking = np.ones_like(load)
+    for k in range(1, servers + 1):
+        blocking = load * blocking / (k + load * blocking)
+    utilization = load / servers
+    return blocking / (1 - utilization * (1 - blocking))
+
+
+def response_time(servers, service_rate, utilization):
+    """Mean response time of an M/M/c queue, waiting plus service
+
+    Args:
+        servers: Number of servers c
+        service_rate: Requests per second one server completes
+        utilization: Load per server as a fraction of its service rate, a scalar or an array < 1
+    Returns:
+        Mean response time in seconds, same shape as utilization
+    """
+    utilization = np.asarray(utilization, dtype=np.float64)
+    wait = erlang_c(servers, servers * utilization) / (servers * service_rate * (1 - utilization))
+    return wait + 1 / service_rate
+
+
+def max_utilization(servers, service_rate, budget, iterations=40, min_utilization=0.01):
+    """Highest load per server at which an M/M/c queue meets a response time budget
+
+    The response time grows with the utilization, so the answer is found by a bisection run on
+    all budgets at once.
+
+    Args:
+        servers: Number of servers c
+        service_rate: Requests per second one server completes
+        budget: Response time budget in seconds, a scalar or an array
+        iterations: Number of bisection steps
+        min_utilization: Utilization returned where even an idle server misses the budget, so
+            that every region keeps some capacity and the schedule stays feasible
+    Returns:
+        Utilization in [min_utilization, 1), same shape as budget
+    """
+    budget = np.asarray(budget, dtype=np.float64)
+    low = np.zeros_like(budget)
+    high = np.ones_like(budget)
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        meets = response_time(servers, service_rate, middle) <= budget
+        low = np.where(meets, middle, low)
+        high = np.where(meets, high, middle)
+    return np.maximum(low, min_utilization)
+
+
+def network_latencies(demand, latency, max_latency=None):
+    """Demand-weighted mean network latency of the requests each region may serve
+
+    Args:
+        demand: demand[t][i] is the number of requests from region i in hour t
+        latency: latency[i][j] is the latency from region i to j in ms
+        max_latency: Routes above this latency are not taken. If None, every route is taken
+    Returns:
+        latencies[t][j] is the mean latency in ms of the requests region j may receive in hour t
+    """
+    latency = np.asarray(latency, dtype=np.float64)
+    routes = ~np.isnan(latency)
+    if max_latency is not None:
+        routes &= latency <= max_latency
+    weights = np.asarray(demand, dtype=np.float64) @ routes
+    total = np.asarray(demand, dtype=np.float64) @ np.where(routes, latency, 0)
+    own = np.nan_to_num(np.diag(latency))
+    return np.where(weights > 0, total / np.where(weights > 0, weights, 1), own)
+
+
+def capacity_table(table, max_latency=None, config=None, demand=None):
+    """Capacity per server of every region in every hour under the Erlang C model
+
+    The response time budget of region j in hour t is TARGET_RESPONSE_TIME minus the network
+    latency of its requests, and the capacity is the highest load per server at which an M/M/c
+    queue of ERLANG_SERVERS servers with service rate SERVER_CAPACITY meets it. All hours are
+    computed in one vectorized pass.
+
+    Args:
+        table: RegionTable holding the data of all regions
+        max_latency: Routes above this latency are not taken, see network_latencies()
+        config: Settings to read, defaults to Config
+        demand: demand[t][i] is the number of requests from region i in hour t that are
+            scheduled, defaults to the demand of the table
+    Returns:
+        capacities[t][j] is the capacity per server of region j in hour t, in requests
+    """
+    config = config or Config
+    latencies = network_latencies(table.demand if demand is None else demand, table.latency, max_latency)
+    budget = (config.TARGET_RESPONSE_TIME - latencies) / 1000
+    utilization = max_utilization(config.ERLANG_SERVERS, config.SERVER_CAPACITY, budget)
+    return utilization * config.SERVER_CAPACITY
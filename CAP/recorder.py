@@ -0,0 +1,128 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+# Metrics recorded every hour, hour x region each
+METRICS = ("requests_to", "requests_from", "carbon_intensities", "latencies")
+
+# csv files written by ResultsRecorder.save(), by the name of the frame they hold
+CSV_FILES = {
+    "requests_from": "global_requests_from_df.csv",
+    "requests_to": "global_requests_to_df.csv",
+    "carbon": "global_carbon_intensities.csv",
+    "latencies": "global_latencies.csv",
+}
+
+
+class ResultsRecorder:
+    """
+    Columnar store of the per-hour results of a simulation.
+
+    Every metric is a preallocated hours x R float64 buffer and recording an hour writes one row
+    of each, so memory does not grow over a run. With a directory the buffers are memory-mapped
+    .npy files in it, flushed after every hour, so the hours recorded survive an interrupted run
+    and can be loaded with load() or np.load() without parsing csv files. Rows of hours that have
+    not been recorded are NaN.
+    """
+
+    def __init__(self, hours, region_names, directory=None):
+        """
+
+        Args:
+            hours: Number of hours of the run
+            region_names: Names of the regions, in the order of the recorded values
+            directory: Directory of the memory-mapped buffers, the buffers are kept in memory if None
+        """
+        self.hours = hours
+        self.region_names = pd.Index(region_names)
+        self.directory = directory
+        shape = (hours, len(self.region_names))
+        if directory is None:
+            self.buffers = {name: np.full(shape, np.nan) for name in METRICS}
+        else:
+            os.makedirs(directory, exist_ok=True)
+            np.save(os.path.join(directory, "columns.npy"), np.array(self.region_names, dtype=str))
+            self.buffers = {}
+            for name in METRICS:
+                self.buffers[name] = open_memmap(os.path.join(directory, f"{name}.npy"), mode="w+", dtype=np.float64, shape=shape)
+                self.buffers[name][:] = np.nan
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return f"ResultsRecorder(hours={self.count}/{self.hours}, regions={len(self.region_names)})"
+
+    def _row(self, values):
+        """Values of the regions in the recorder order, Series are aligned by region name"""
+        if isinstance(values, pd.Series):
+            values = values.reindex(self.region_names)
+        return np.asarray(values, dtype=np.float64)
+
+    def record(self, hour, requests_to, requests_from, carbon_intensities, latencies):
+        """Writes the results of an hour
+
+        Args:
+            hour: Hour of the run
+            requests_to: requests_to[i] is the mean number of requests served by region i
+            requests_from: requests_from[i] is the mean number of requests sent from region i
+            carbon_intensities: carbon_intensities[i] is the carbon intensity of region i
+            latencies: latencies[i] is the request weighted latency of region i
+        """
+        for name, values in zip(METRICS, (requests_to, requests_from, carbon_intensities, latencies)):
+            self.buffers[name][hour] = self._row(values)
+        self.count = max(self.count, hour + 1)
+        if self.directory is not None:
+            for buffer in self.buffers.values():
+                buffer.flush()
+
+    def frame(self, name):
+        """
+        Args:
+            name: One of METRICS, or carbon for the carbon intensity times the requests served
+        Returns:
+            DataFrame with one row per hour recorded and one column per region
+        """
+        if name == "carbon":
+            values = self.buffers["carbon_intensities"][:self.count] * self.buffers["requests_to"][:self.count]
+        else:
+            values = self.buffers[name][:self.count]
+        return pd.DataFrame(np.array(values), columns=self.region_names)
+
+    def save(self, directory):
+        """Writes the frames of CSV_FILES as csv files, and the buffers as .npy files if they are
+        not memory-mapped in that directory already
+
+        Args:
+            directory: Directory the files are written to
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, file_name in CSV_FILES.items():
+            self.frame(name).to_csv(os.path.join(directory, file_name), index=False)
+        if self.directory is None or os.path.abspath(directory) != os.path.abspath(self.directory):
+            np.save(os.path.join(directory, "columns.npy"), np.array(self.region_names, dtype=str))
+            for name, buffer in self.buffers.items():
+                np.save(os.path.join(directory, f"{name}.npy"), buffer)
+
+    @classmethod
+    def load(cls, directory):
+        """Opens the buffers of a recorded run read-only
+
+        Args:
+            directory: Directory of the .npy files, see save()
+        Returns:
+            ResultsRecorder over the memory-mapped buffers
+        """
+        recorder = cls.__new__(cls)
+        recorder.region_names = pd.Index([str(name) for name in np.load(os.path.join(directory, "columns.npy"))])
+        recorder.directory = None
+        recorder.buffers = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in METRICS}
+        recorder.hours = recorder.buffers["requests_to"].shape[0]
+        recorded = np.flatnonzero(~np.isnan(recorder.buffers["requests_to"]).all(axis=1))
+        recorder.count = int(recorded[-1]) + 1 if len(recorded) else 0
+        return recorder
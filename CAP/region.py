@@ -1,24 +1,192 @@
 # Authors: Basundhara Chakrabarty, Shruti Jasoria
 
-import math
-
 import numpy as np
+from .config import Config
+from .timeseries import TimeSeries
+from .topology import haversine_distances, haversine_latency
 from .util import Util
 
 
+class RegionTable:
+    """
+    Columnar store of the data of all regions.
+
+    Holds the T x R demand matrix, the T x R carbon intensity matrix and the R x R latency matrix
+    as contiguous NumPy arrays, with regions in the in-place order of Util.region_names(). Row t
+    of the demand and carbon matrices is hour t after START_DATE and latency[i][j] is the
+    latency from region i to j, so the scheduler inputs for an hour are plain slices.
+    """
+
+    def __init__(self, region_names, demand, carbon, latency, offsets, timestamps=None, config=None, locations=None) -> None:
+        """
+
+        Args:
+            region_names: Names of the regions, in-place order
+            demand: demand[t][i] is the number of requests from region i in hour t
+            carbon: carbon[t][i] is the carbon intensity of region i in hour t
+            latency: latency[i][j] is the latency from region i to j
+            offsets: offsets[i] is the time offset of region i from UTC in hours
+            timestamps: timestamps[t] is the UNIX timestamp of hour t
+            config: Settings the table was loaded with, defaults to Config
+            locations: locations[i] is the (latitude, longitude) of region i in degrees, if known
+        """
+        self.config = config or Config
+        self.region_names = region_names
+        self.demand = np.ascontiguousarray(demand)
+        self.carbon = np.ascontiguousarray(carbon, dtype=np.float64)
+        self.latency = np.ascontiguousarray(latency, dtype=np.float64)
+        self.offsets = np.asarray(offsets)
+        self.timestamps = None if timestamps is None else np.asarray(timestamps)
+        self.locations = None if locations is None else np.asarray(locations, dtype=np.float64)
+        # The rows indexed by hours since the start, to read the signals between two hours
+        hours = np.arange(self.demand.shape[0])
+        self.demand_series = TimeSeries(hours, self.demand)
+        self.carbon_series = TimeSeries(hours, self.carbon)
+        # Arrays computed from the table by other modules, e.g. the queueing capacities, by key
+        self.derived = {}
+
+    def __len__(self):
+        return len(self.region_names)
+
+    def __repr__(self):
+        return f"RegionTable(regions={len(self)}, hours={self.demand.shape[0]})"
+
+    def demand_at(self, hours, method=None):
+        """Demand of all regions at arbitrary times, e.g. at the sub-hour steps of the request scheduler
+
+        Args:
+            hours: A time or an array of times in hours since the start, e.g. 2.5
+            method: hold or linear, defaults to the RESAMPLE_METHOD setting
+        Returns:
+            demand[i] (or demand[k][i] for an array of times) is the number of requests from region i
+        """
+        demand = self.demand_series.at(hours, method or self.config.RESAMPLE_METHOD)
+        return np.rint(demand).astype(self.demand.dtype)
+
+    def carbon_at(self, hours, method=None):
+        """Carbon intensities of all regions at arbitrary times, see demand_at()"""
+        return self.carbon_series.at(hours, method or self.config.RESAMPLE_METHOD)
+
+    @staticmethod
+    def resample_window(timestamps, values, start_timestamp, n_hours, method="hold"):
+        """Values of a window of rows at every hour from start_timestamp on
+
+        Args:
+            timestamps: timestamps[t] is the UNIX timestamp of row t of the window
+            values: values[t][i] is the value of region i in row t
+            start_timestamp: UNIX timestamp of the first hour
+            n_hours: Number of hours
+            method: hold or linear, see TimeSeries.at()
+        Returns:
+            The values unchanged if the window starts at start_timestamp, otherwise the values
+            resampled with the given method
+        """
+        if timestamps[0] == start_timestamp:
+            return values[:n_hours]
+        return TimeSeries(timestamps, values).resample(start_timestamp, 3600, n_hours, method)
+
+    def regions(self):
+        """
+        Returns:
+            One Region view per region, in-place order
+        """
+        return [Region(name, self, index) for index, name in enumerate(self.region_names)]
+
+    @staticmethod
+    def load(config=None):
+        """Loads the data of all regions from csv files, or from the binary files if
+        DATASET_FORMAT is npy
+
+        Args:
+            config: Settings to load the data with, defaults to Config
+
+        Returns:
+            RegionTable holding the data of all regions
+        """
+        config = config or Config
+        if config.DATASET_FORMAT == "npy":
+            return RegionTable.load_binary(config)
+        region_names = Util.region_names(config)
+        offset_df = Util.load_offset_from_file(config)
+        latency_df = Util.load_latency_from_file(config)
+        request_df = Util.load_request_from_file(config)
+        carbon_intensity_df = Util.load_carbon_intensity_from_file(config)
+        start_timestamp = Util.start_timestamp(config)
+        n_hours = config.TIMESTEPS + 24
+        method = config.RESAMPLE_METHOD
+        demand = RegionTable.resample_window(request_df["timestamp"].to_numpy(), request_df[region_names].to_numpy(), start_timestamp, n_hours, method)
+        return RegionTable(
+            region_names,
+            np.rint(demand).astype(np.int64),
+            RegionTable.resample_window(carbon_intensity_df["timestamp"].to_numpy(), carbon_intensity_df[region_names].to_numpy(dtype=np.float64), start_timestamp, n_hours, method),
+            latency_df.loc[region_names, region_names].to_numpy(dtype=np.float64),
+            offset_df[region_names].to_numpy()[0],
+            start_timestamp + 3600 * np.arange(n_hours),
+            config,
+            Util.load_location_from_file(config),
+        )
+
+    def haversine_latency(self):
+        """
+        Returns:
+            latency[i][j] is the haversine latency from region i to j, see topology.haversine_latency()
+        """
+        if self.locations is None:
+            raise Exception(f"The {self.config.DATASET} dataset has no {self.config.LOCATION_FILENAME} file with the coordinates of its regions")
+        return haversine_latency(haversine_distances(self.locations[:, 0], self.locations[:, 1]))
+
+    @staticmethod
+    def load_binary(config=None):
+        """Loads the data of all regions from the memory-mapped binary files
+
+        Only the rows of the selected window are read from the memory maps, so startup time and
+        memory do not grow with the size of the files.
+
+        Args:
+            config: Settings to load the data with, defaults to Config
+
+        Returns:
+            RegionTable holding the data of all regions
+        """
+        config = config or Config
+        region_names = Util.region_names(config)
+        requests, start, end = Util.validate_date_and_load_binary(config.REQUEST_DATA_FILENAME, config)
+        carbon, carbon_start, carbon_end = Util.validate_date_and_load_binary(config.CARBON_INTENSITY_FILENAME, config)
+        latency = Util.load_binary_table(config.LATENCY_FILENAME, config)
+        offset = Util.load_binary_table(config.TIME_OFFSET_FILENAME, config)
+        start_timestamp = Util.start_timestamp(config)
+        n_hours = config.TIMESTEPS + 24
+        method = config.RESAMPLE_METHOD
+        demand = RegionTable.resample_window(requests.timestamps[start:end], requests.select(start, end, region_names), start_timestamp, n_hours, method)
+        return RegionTable(
+            region_names,
+            np.rint(demand).astype(np.int64),
+            RegionTable.resample_window(carbon.timestamps[carbon_start:carbon_end], carbon.select(carbon_start, carbon_end, region_names), start_timestamp, n_hours, method),
+            latency.select(0, len(region_names), region_names),
+            offset.select(0, 1, region_names)[0],
+            start_timestamp + 3600 * np.arange(n_hours),
+            config,
+            Util.load_location_from_file(config),
+        )
+
+
 class Region:
     """
-    Region object to hold and get region-specific data.
+    Region object to get region-specific data. It is a view over column `index` of a RegionTable.
     """
 
-    def __init__(self, name, carbon_intensity,carbon_cost_estimate_per_srv, request, latency, offset) -> None:
+    def __init__(self, name, table, index) -> None:
+        """
+
+        Args:
+            name: Name of the region
+            table: RegionTable holding the data of all regions
+            index: Index of the region in the table
+        """
         self.name = name
-        self.request = request
-        self.carbon_intensity = carbon_intensity
-        self.carbon_cost_estimate_per_srv=carbon_cost_estimate_per_srv
-        self._latency = latency
-        self.offset = offset
-        self.region_names = Util.region_names()
+        self.table = table
+        self.index = index
+        self.region_names = table.region_names
         self.exponential_df = None
 
     def __repr__(self):
@@ -27,21 +195,42 @@ class Region:
     def __format__(self, __format_spec: str) -> str:
         return format(self.name, __format_spec)
 
+    @property
+    def carbon_intensity(self):
+        """carbon_intensity[t] is the carbon intensity of the region in hour t"""
+        return self.table.carbon[:, self.index]
+
+    @property
+    def carbon_cost_estimate_per_srv(self):
+        return self.carbon_intensity.mean(axis=0)
+
+    @property
+    def location(self):
+        """(latitude, longitude) of the region in degrees"""
+        if self.table.locations is None:
+            raise Exception(f"No coordinates for region {self.name}, the dataset has no location file")
+        return self.table.locations[self.index]
+
+    @property
+    def offset(self):
+        return self.table.offsets[self.index]
+
     def get_requests_per_interval(self, hour):
-        # print("self.request.iloc[hour][self.region_names].sum()",self.request.iloc[hour][self.region_names].sum())
-        #print("self.request.iloc[hour][self.name]",self.name,self.request.iloc[hour][self.name])
-        return self.request.iloc[hour][self.name]
+        return self.table.demand[hour, self.index]
 
     def get_expo_requests_per_interval(self, t):
         return self.exponential_df.iloc[t][self.name]
     
     def get_requests_per_interval_per_region(self, t):
-        return self.request.iloc[t][self.region_names].to_numpy(dtype=np.float64)
+        return self.table.demand[t].astype(np.float64)
 
     def latency(self, region):
+        """
+        Returns:
+            Latency from the given region to this region
+        """
         assert isinstance(region, Region)
-        #print(self._latency.head)
-        return self._latency[region.name]
+        return self.table.latency[region.index, self.index]
 
     def haversine_latency(self, other):
         """
@@ -53,41 +242,17 @@ class Region:
             other: The other region we want to calculate distance to
         """
         assert isinstance(other, Region)
-
-        lat1 = self.location[0] * math.pi / 180
-        lat2 = other.location[0] * math.pi / 180
-        dlat = lat2 - lat1
-        dlon = (other.location[1] - self.location[1]) * math.pi / 180
-
-        a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        d = 6371 * c
-
-        return 0.022 * 0.62 * d + 4.862
+        locations = np.array([self.location, other.location])
+        return float(haversine_latency(haversine_distances(locations[:, 0], locations[:, 1])[0, 1]))
 
     @staticmethod
-    def load_regions():
+    def load_regions(config=None):
         """Loads data for all regions from csv files and returns all regions
 
+        Args:
+            config: Settings to load the data with, defaults to Config
+
         Returns:
             List of all region objects containing their specific data
         """
-        regions = []
-
-        offset_df = Util.load_offset_from_file()
-        # TODO - make changes to this method
-        latency_df = Util.load_latency_from_file()
-        request_df = Util.load_request_from_file()
-        carbon_intensity_df = Util.load_carbon_intensity_from_file()
-        #print("Latency:",latency_df.head)
-
-        for region in Util.region_names():
-            latency = latency_df[region]
-            carbon_intensity = carbon_intensity_df[region]
-            carbon_cost_estimate_per_srv=carbon_intensity.mean(axis=0)
-            #print("carbon_cost_estimate_per_srv: {0} ;  region:{1} ".format(region,carbon_cost_estimate_per_srv))
-            offset = offset_df[region].values[0]
-            region = Region(region, carbon_intensity, carbon_cost_estimate_per_srv, request_df, latency, offset)
-            #print("Built region: ",region)
-            regions.append(region)
-        return regions
+        return RegionTable.load(config).regions()
@@ -0,0 +1,91 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import numpy as np
+from .config import Config
+
+
+def round_preserving_sums(values, totals):
+    """Rounds every row of values to integers that add up to the row's total.
+
+    Each value is rounded down and the missing units are handed to the values with the
+    largest remainders (largest remainder method), so the rounded rows keep their sums.
+
+    Args:
+        values: Matrix (or vector, treated as one row) of non-negative values
+        totals: totals[i] is the integer sum row i should add up to
+    Returns:
+        Integer matrix (or vector) of the same shape as values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rows = np.atleast_2d(values)
+    totals = np.rint(np.asarray(totals, dtype=np.float64).reshape(-1))
+    floor = np.floor(rows + 1e-9)
+    missing = np.clip(totals - floor.sum(axis=1), 0, rows.shape[1]).astype(int)
+
+    # ranks[i][j] is the position of value j of row i when ordered by decreasing remainder
+    order = np.argsort(-(rows - floor), axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(rows.shape[1])[np.newaxis, :].repeat(rows.shape[0], axis=0), axis=1)
+    rounded = (floor + (ranks < missing[:, np.newaxis])).astype(int)
+    return rounded.reshape(values.shape)
+
+
+def round_requests(requests, request_rates, servers, capacities, routes=None, config=None):
+    """Turns fractional request flows into integer ones that still serve every request.
+
+    Rounding a flow up can overflow its destination. Servers are added there first, as long as
+    the region stays within MAX_SERVERS_PER_REGION and the fleet within the MAX_SERVERS pool.
+    Requests that still do not fit are moved to another destination of their origin with spare
+    capacity, or with room for one more server. Requests are only left overflowing a region if
+    no destination their origin may use has room for them.
+
+    Args:
+        requests: requests[i][j] is the (fractional) number of requests from region i sent to region j
+        request_rates: request_rates[i] is the number of requests from region i
+        servers: servers[i] is the number of servers in region i
+        capacities: capacities[i] is the average capacity per server in region i
+        routes: Sparse adjacency of the routes requests may take, see feasible_routes(). Every
+            route if None
+        config: Settings of the scheduler, defaults to Config
+    Returns:
+        Integer servers and requests
+    """
+    config = config or Config
+    requests = round_preserving_sums(requests, request_rates)
+    capacities = np.asarray(capacities, dtype=np.float64)
+    allowed = np.ones(requests.shape, dtype=bool) if routes is None else routes.toarray().astype(bool)
+    servers = np.clip(np.rint(servers), 0, config.MAX_SERVERS_PER_REGION).astype(int)
+    pool_left = config.MAX_SERVERS - servers.sum()
+
+    # Add the servers the rounded flows need while the region and the pool allow it
+    needed = np.ceil(requests.sum(axis=0) / capacities - 1e-9).astype(int)
+    for j in np.flatnonzero(needed > servers):
+        added = min(min(needed[j], config.MAX_SERVERS_PER_REGION) - servers[j], max(pool_left, 0))
+        servers[j] += added
+        pool_left -= added
+
+    # Move what still overflows to other destinations of the same origins, opening a server
+    # there if none has spare capacity
+    spare = np.floor(servers * capacities - requests.sum(axis=0) + 1e-9).astype(int)
+    for j in np.flatnonzero(spare < 0):
+        for i in np.flatnonzero(requests[:, j]):
+            while spare[j] < 0 and requests[i, j] > 0:
+                destinations = allowed[i].copy()
+                destinations[j] = False
+                if not (destinations & (spare > 0)).any():
+                    destinations &= servers < config.MAX_SERVERS_PER_REGION
+                    if pool_left <= 0 or not destinations.any():
+                        break
+                    k = np.flatnonzero(destinations)[np.argmax(capacities[destinations])]
+                    servers[k] += 1
+                    pool_left -= 1
+                    spare[k] = np.floor(servers[k] * capacities[k] - requests[:, k].sum() + 1e-9)
+                    if spare[k] <= 0:
+                        break
+                k = np.flatnonzero(destinations)[np.argmax(spare[destinations])]
+                moved = min(-spare[j], requests[i, j], spare[k])
+                requests[i, j] -= moved
+                requests[i, k] += moved
+                spare[j] += moved
+                spare[k] -= moved
+    return servers, requests
@@ -3,7 +3,6 @@
 import numpy as np
 from .config import Config
 from .region import Region
-from .util import Util
 
 
 class Server:
@@ -56,21 +55,53 @@ class Server:
 
 
 class ServerManager:
-    """Central manager keeping check of all regions and servers, handles request sourcing to servers etc."""
+    """Central manager keeping check of all regions and servers, handles request sourcing to servers etc.
 
-    def __init__(self, regions=None):
+    The fleet is stored as arrays over regions rather than as Server objects. The servers of a
+    region are filled in order, the fullest first, so a region is fully described by its number
+    of servers, their capacity and its total utilization: the first utilization // capacity
+    servers are full, the next one holds the remainder and the rest are idle. Every fleet
+    operation is O(R), independent of the number of servers.
+    """
+
+    def __init__(self, regions=None, config=None):
         """
 
         Args:
             regions: Only set to not None if running tests. Defaults to None.
-            servers: List of server objects
+            config: Settings of the CAP instance, defaults to Config
+            table: RegionTable holding the data of all regions
+            counts: counts[i] is the number of servers in region i
+            capacities: capacities[i] is the capacity of each server in region i
+            utilization: utilization[i] is the total utilization of the servers in region i
         """
-        self.region_names = Util.region_names()
+        self.config = config or Config
         if regions is None:
-            self.regions = Region.load_regions()
+            self.regions = Region.load_regions(self.config)
         else:
             self.regions = regions
-        self.servers = []
+        # Regions are views over one table, in-place order
+        self.table = self.regions[0].table
+        self.region_names = self.table.region_names
+        n_regions = len(self.regions)
+        self.counts = np.zeros(n_regions, dtype=np.int64)
+        self.capacities = np.full(n_regions, self.config.SERVER_CAPACITY, dtype=np.float64)
+        self.utilization = np.zeros(n_regions, dtype=np.float64)
+
+    @property
+    def servers(self):
+        """
+        Returns:
+            List of Server objects of the fleet, built from the arrays. Changing them does not
+            change the fleet
+        """
+        servers = []
+        region, _ = self.server_regions()
+        for index, load in zip(region, self.server_loads()):
+            server = Server(self.capacities[index], self.regions[index])
+            server.utilization = load
+            servers.append(server)
+        return servers
 
     def get_region_by_name(self, name):
         """
@@ -89,20 +120,15 @@ class ServerManager:
         """
         Reset utilization for every server
         """
-        for server in self.servers:
-            server.reset_utilization()
+        self.utilization[:] = 0
 
     def utilization_left_regions(self):
-        """Iterates servers and utilization of their respective region
+        """Utilization left in each region
 
         Returns:
             List of utilization of all regions, in-place order
         """
-        utilization_left = {region: 0 for region in self.region_names}
-
-        for server in self.servers:
-            utilization_left[server.region.name] += server.utilization_left()
-        return [utilization_left[region] for region in self.region_names]
+        return (self.counts * self.capacities - self.utilization).tolist()
 
     def servers_per_region(self):
         """
@@ -110,105 +136,107 @@ class ServerManager:
         Returns:
             Number of servers in each region, in-place order
         """
-        count = {region: 0 for region in self.region_names}
-
-        for server in self.servers:
-            count[server.region.name] += 1
-        return [count[region] for region in self.region_names]
+        return self.counts.tolist()
 
     def capacity_per_region(self):
-        """Calculates the regional capacity using a static integer set in runtime configurations.
+        """Calculates the regional capacity from the capacity of the servers.
 
         Returns:
             Regional capacity, in-place order
         """
-        servers = np.array(self.servers_per_region())
-        return servers * Config.SERVER_CAPACITY
+        return self.counts * self.capacities
 
     def send(self, requests_per_region):
         """Distributes requests to each server for each region
 
+        Requests are placed on the servers of their destination region in order, requests that
+        do not fit are dropped.
+
         Args:
-            requests_per_region: the n.o. requests to be distributed across servers in a region, in-place.
+            requests_per_region: requests_per_region[i][j] is the n.o. requests from region i sent to region j
+        Returns:
+            return1: served[j] is the number of requests placed in region j, in-place order
+            return2: dropped[j] is the number of requests to region j that did not fit, in-place order
         """
-        utilization_left = self.utilization_left_regions()
-        print("Utilization Left: ", utilization_left)
-        for i in range(len(self.region_names)):
-            region = self.region_names[i]
-            # All requests to a {region}
-            requests = sum(requests_per_region[:, i])
-            # All servers in the {region} we should send our request batches
-            servers = [s for s in self.servers if s.region.name == region]
-            # Craete request batches that are destined to {region}
-            server_loads = self.build_server_loads(servers, requests)
+        utilization_left = self.counts * self.capacities - self.utilization
+        print("Utilization Left: ", utilization_left.tolist())
+        requests = np.asarray(requests_per_region, dtype=np.float64).sum(axis=0)
+        served = np.minimum(requests, utilization_left)
+        self.utilization += served
+        return served, requests - served
 
-            for server, load in server_loads:
-                server.push(load)
+    def server_regions(self):
+        """
+        Returns:
+            return1: region[k] is the index of the region of server k, servers ordered region by region
+            return2: position[k] is the position of server k in its region
+        """
+        region = np.repeat(np.arange(len(self.counts)), self.counts)
+        starts = np.cumsum(self.counts) - self.counts
+        return region, np.arange(len(region)) - starts[region]
 
-    def build_server_loads(self, servers, requests):
-        """Places load from requests at servers. The servers are region-specific.
+    def server_loads(self):
+        """
+        Returns:
+            Utilization of every server, servers ordered region by region, see server_regions()
+        """
+        region, position = self.server_regions()
+        capacity = self.capacities[region]
+        return np.clip(self.utilization[region] - position * capacity, 0, capacity)
+
+    def build_server_loads(self, index, requests):
+        """Places load from requests at the servers of a region, in order.
 
         Args:
-            servers: All servers for a region where load is to be placed
+            index: Index of the region where load is to be placed
             requests: Number of requests sent to a region. NOTE that load of request is 1 unit.
 
         Returns:
-            List of (server, load) for servers in region with their respective load
+            Load placed at each server of the region
         """
-        initial_requests = requests
-        loads = []
-        for server in servers:
-            left = server.utilization_left()
-            load = min(left, requests)
-            requests -= load
-            assert requests >= 0, requests
-            loads.append((server, load))
+        region_requests = np.zeros(len(self.counts))
+        region_requests[index] = requests
+        region, _ = self.server_regions()
+        return self.build_fleet_loads(region_requests)[region == index]
+
+    def build_fleet_loads(self, requests):
+        """Places load from requests at the servers of all regions at once.
+
+        The servers of a region are filled in order, so the room left on the servers before
+        server k of region i is max(k * capacity - utilization[i], 0) and server k takes what is
+        left of requests[i] after them, up to its own room.
 
-        if requests > 0:
-            print(
-                f"Dropping requests: {requests}, initially: {initial_requests}, server_length: {len(servers)}"
-            )
+        Args:
+            requests: requests[i] is the number of requests sent to region i. NOTE that load of request is 1 unit.
 
-        return loads
+        Returns:
+            Load placed at every server, servers ordered region by region, see server_regions()
+        """
+        region, position = self.server_regions()
+        capacity = self.capacities[region]
+        utilization = self.utilization[region]
+        left = np.clip((position + 1) * capacity - utilization, 0, capacity)
+        before = np.maximum(position * capacity - utilization, 0)
+        return np.clip(np.asarray(requests, dtype=np.float64)[region] - before, 0, left)
 
     def move(self, servers_per_region):
         """Moves the minimum amount of servers to satisfy the number of requests per region
 
+        Servers are removed from the front of a region, where they are the fullest, and added at
+        the back, idle. A region that is started from no servers takes SERVER_CAPACITY.
+
         Args:
             servers_per_region: Specifies the number of servers per region
         """
-        count = {region: 0 for region in self.region_names}
-
-        for server in self.servers:
-            count[server.region.name] += 1
-
-        # self.servers = []
-        # for region, requested_count in zip(self.regions, servers_per_region):
-        #     for _ in range(requested_count):
-        #         server = Server(self.conf.server_capacity, region)
-        #         self.servers.append(server)
+        requested = np.asarray(servers_per_region, dtype=np.int64)
+        assert (requested >= 0).all(), requested
 
-        # Remove all abundant servers in each region
-        for region_name, requested_count in zip(self.region_names, servers_per_region):
-            if count[region_name] > requested_count:
-                indices = [i for i, s in enumerate(self.servers) if s.region.name == region_name]
-                n = count[region_name] - requested_count
-                assert n >= 0, n
-                assert n <= len(indices), (n, len(indices))
-                for i in range(n - 1, -1, -1):
-                    index = indices[i]
-                    self.servers.pop(index)
+        # Remove all abundant servers in each region, with their load
+        removed = np.maximum(self.counts - requested, 0)
+        self.utilization = np.maximum(self.utilization - removed * self.capacities, 0)
 
         # Add servers to each region to satisfy the new server per region constraint
-        for region, requested_count in zip(self.regions, servers_per_region):
-            c = count[region.name]
-            while c < requested_count:
-                # TODO: Set server capacity in a more generic way
-                server = Server(Config.SERVER_CAPACITY, region)
-                self.servers.append(server)
-                c += 1
-            count[region.name] = c
-
-        for region, requested_count in zip(self.regions, servers_per_region):
-            s = sum([1 for s in self.servers if s.region.name == region.name])
-            assert s == requested_count, (s, requested_count, region)
+        # TODO: Set server capacity in a more generic way
+        started = (self.counts == 0) & (requested > 0)
+        self.capacities[started] = self.config.SERVER_CAPACITY
+        self.counts = requested.copy()
@@ -0,0 +1,130 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import numpy as np
+import pandas as pd
+from .config import Config
+
+
+class Simulator:
+    """
+    Offline discrete-event simulator of the requests of an hour, to evaluate provisioning
+    decisions without the live Traefik/httpmon/Prometheus setup.
+
+    Requests from region i to region j arrive as a Poisson process with the rate requests[i][j]
+    (req/s), which is the same as Poisson arrivals per origin routed with the shares of the
+    request matrix. Within a region requests are dispatched round robin to its servers. Every
+    server is a FIFO queue whose service times are exponential with mean 1 / capacity, and the
+    latency matrix is added as network delay. Regions without servers drop their requests.
+
+    The rates of an hour are constant, so only the first SIMULATION_SECONDS of each
+    hour are simulated. The queues are solved with the Lindley recursion in closed form over
+    all servers at once, so there is no Python loop over requests or servers.
+    """
+
+    def __init__(self, latencies, capacity=None, duration=None, seed=None, config=None):
+        """
+
+        Args:
+            latencies: latencies[i][j] is the latency from region i to j in ms
+            capacity: Service rate of a server in req/s, defaults to the SERVER_CAPACITY setting
+            duration: Seconds simulated per hour, defaults to the SIMULATION_SECONDS setting
+            seed: Seed of the random arrivals and service times
+            config: Settings to read, defaults to Config
+        """
+        config = config or Config
+        self.latencies = np.nan_to_num(np.asarray(latencies, dtype=np.float64))
+        self.capacity = config.SERVER_CAPACITY if capacity is None else capacity
+        self.duration = config.SIMULATION_SECONDS if duration is None else duration
+        self.rng = np.random.default_rng(seed)
+
+    def __repr__(self):
+        return f"Simulator(regions={len(self.latencies)}, capacity={self.capacity}, duration={self.duration})"
+
+    @staticmethod
+    def waiting_times(server, arrival, service):
+        """Waiting times of FIFO queues, solved with the Lindley recursion in closed form
+
+        With C_n the sum of S_{k-1} - (A_k - A_{k-1}) over the requests k <= n of a server,
+        the waiting time is W_n = C_n - min(0, C_1, ..., C_n). The running minimum of each
+        server is taken in one pass by shifting the servers apart.
+
+        Args:
+            server: server[k] is the server of request k, requests sorted by server then arrival
+            arrival: arrival[k] is the arrival time of request k
+            service: service[k] is the service time of request k
+        Returns:
+            wait[k] is the time request k waits in the queue
+        """
+        if len(server) == 0:
+            return np.zeros(0)
+        first = np.concatenate(([True], server[1:] != server[:-1]))
+        segment = np.cumsum(first) - 1
+        step = np.concatenate(([0.0], service[:-1] - np.diff(arrival)))
+        step[first] = 0
+        total = np.cumsum(step)
+        total -= total[first][segment]
+        shift = total.max() - total.min() + 1
+        shifted = total - segment * shift
+        return shifted - np.minimum.accumulate(shifted)
+
+    def simulate_hour(self, servers, requests):
+        """Simulates the requests of an hour
+
+        Args:
+            servers: servers[j] is the number of servers in region j
+            requests: requests[i][j] is the number of requests per second from region i sent to region j
+        Returns:
+            Dictionary with the arrivals, served, completed and dropped requests, the throughput in
+            req/s, the p50/p95/p99 latency in ms, and the dropped requests per region
+        """
+        servers = np.asarray(servers, dtype=np.int64)
+        rates = np.asarray(requests, dtype=np.float64)
+        R = len(servers)
+
+        counts = self.rng.poisson(rates * self.duration).ravel()
+        origin = np.repeat(np.repeat(np.arange(R), R), counts)
+        destination = np.repeat(np.tile(np.arange(R), R), counts)
+        arrival = self.rng.uniform(0, self.duration, len(origin))
+
+        # Requests to regions without servers are dropped
+        dropped = servers[destination] == 0
+        dropped_per_region = np.bincount(destination[dropped], minlength=R)
+        origin, destination, arrival = origin[~dropped], destination[~dropped], arrival[~dropped]
+
+        # Round robin over the servers of each region, in order of arrival
+        order = np.lexsort((arrival, destination))
+        origin, destination, arrival = origin[order], destination[order], arrival[order]
+        rank = np.arange(len(destination)) - np.searchsorted(destination, np.arange(R))[destination]
+        first_server = np.cumsum(servers) - servers
+        server = first_server[destination] + rank % np.maximum(servers[destination], 1)
+
+        order = np.lexsort((arrival, server))
+        origin, destination, arrival, server = origin[order], destination[order], arrival[order], server[order]
+        service = self.rng.exponential(1 / self.capacity, len(server))
+        response = self.waiting_times(server, arrival, service) + service
+        completed = arrival + response <= self.duration
+        latency = self.latencies[origin, destination] + response * 1000
+
+        p50, p95, p99 = np.percentile(latency, [50, 95, 99]) if len(latency) else (np.nan, np.nan, np.nan)
+        return {
+            "arrivals": int(counts.sum()),
+            "served": len(server),
+            "completed": int(completed.sum()),
+            "dropped": int(dropped_per_region.sum()),
+            "throughput": float(completed.sum() / self.duration),
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "dropped_per_region": dropped_per_region,
+        }
+
+    def run(self, servers, requests):
+        """Simulates a sequence of hours
+
+        Args:
+            servers: servers[t][j] is the number of servers in region j in hour t
+            requests: requests[t][i][j] is the number of requests per second from region i sent to region j in hour t
+        Returns:
+            DataFrame with one row of simulate_hour() results per hour
+        """
+        return pd.DataFrame([self.simulate_hour(s, r) for s, r in zip(servers, requests)])
@@ -0,0 +1,205 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import atexit
+import hashlib
+import logging
+import os
+import pickle
+from collections import OrderedDict
+
+import numpy as np
+from .config import Config
+from .matrix_model import objective_value
+from .rounding import round_preserving_sums
+
+
+class SolutionCache:
+    """
+    Bounded LRU cache of scheduler solutions keyed on quantized scheduler inputs.
+
+    Many hours of a multi-day replay have nearly identical carbon intensities and request
+    rates. Inputs are quantized to the CACHE_CARBON_STEP and CACHE_REQUEST_STEP settings and
+    combined with the settings that change the problem, so such hours hit the cache
+    instead of the solver. With a step of 1 (the default) only identical hours hit. The cache
+    can be persisted to disk so repeated replays and parameter sweeps share it.
+    """
+
+    def __init__(self, max_size=1024, path=None, config=None):
+        """
+
+        Args:
+            max_size: Maximum number of solutions kept, the least recently used are evicted first
+            path: File the cache is loaded from and saved to at exit, or by close(). None keeps it
+                in memory only
+            config: Settings of the scheduler, defaults to Config
+        """
+        self.config = config or Config
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.solutions = OrderedDict()
+        if path is not None:
+            self.load()
+            atexit.register(self.save)
+
+    def __len__(self):
+        return len(self.solutions)
+
+    def __repr__(self):
+        return f"SolutionCache(size={len(self)}/{self.max_size}, hits={self.hits}, misses={self.misses})"
+
+    def key(self, carbon_intensities, latencies, capacities, request_rates):
+        """Builds the cache key of a scheduling problem
+
+        Args:
+            request_rates: request_rates[i] is the number of requests from region i
+            capacities: capacities[i] is the average capacity per server in region i
+            latencies: latencies[i][j] is the latency from region i to j
+            carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+        """
+        carbon = np.rint(np.asarray(carbon_intensities, dtype=np.float64) / self.config.CACHE_CARBON_STEP).astype(np.int64)
+        requests = np.rint(np.asarray(request_rates, dtype=np.float64) / self.config.CACHE_REQUEST_STEP).astype(np.int64)
+        # The latency matrix and the capacities rarely change, a digest keeps the key short
+        digest = hashlib.sha1(np.ascontiguousarray(latencies, dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(capacities, dtype=np.float64).tobytes())
+        return (
+            self.config.SCHEDULER,
+            self.config.MILP_BACKEND,
+            self.config.INTEGER_ROUTING,
+            self.config.SOLVER_GAP,
+            self.config.MAX_LATENCY,
+            self.config.MAX_SERVERS,
+            self.config.MAX_SERVERS_PER_REGION,
+            self.config.SERVER_CAPACITY,
+            self.config.CARBON_ALPHA,
+            self.config.LATENCY_ALPHA,
+            carbon.tobytes(),
+            requests.tobytes(),
+            digest.hexdigest(),
+        )
+
+    def get(self, key, request_rates, capacities, carbon_intensities=None, latencies=None):
+        """Looks up a solution and fits it to the exact request rates
+
+        The cached requests of each region are rescaled to its current request rate, servers
+        are added where the rescaled requests do not fit and the objective value of the rescaled
+        schedule is computed from the carbon intensities and latencies. A solution that cannot
+        be fitted is a miss: one that sends no requests from a region that now has some, one
+        that would need more than MAX_SERVERS_PER_REGION servers in a region, or one that would
+        need rescaling without the carbon intensities and latencies to compute its objective.
+
+        Args:
+            key: Key built by key()
+            request_rates: request_rates[i] is the number of requests from region i
+            capacities: capacities[i] is the average capacity per server in region i
+            carbon_intensities: carbon_intensities[i] is the carbon intensity in region i
+            latencies: latencies[i][j] is the latency from region i to j
+        Returns:
+            servers, requests, objective value, or None on a miss
+        """
+        solution = self.solutions.get(key)
+        if solution is not None:
+            solution = self.fit(*solution, request_rates, capacities, carbon_intensities, latencies)
+        if solution is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.solutions.move_to_end(key)
+        return solution
+
+    def fit(self, servers, requests, obj_val, request_rates, capacities, carbon_intensities=None, latencies=None):
+        """Rescales a cached solution to the exact request rates, see get()
+
+        Returns:
+            servers, requests, objective value, or None if the solution cannot be fitted
+        """
+        request_rates = np.asarray(request_rates, dtype=np.float64)
+        row_sums = requests.sum(axis=1)
+        if np.array_equal(row_sums, request_rates):
+            return servers.copy(), requests.copy(), obj_val
+        if np.any((row_sums == 0) & (request_rates > 0)) or carbon_intensities is None or latencies is None:
+            return None
+        shares = requests / np.where(row_sums > 0, row_sums, 1)[:, np.newaxis]
+        requests = round_preserving_sums(shares * request_rates[:, np.newaxis], request_rates)
+        needed = np.ceil(requests.sum(axis=0) / np.asarray(capacities, dtype=np.float64) - 1e-9)
+        if np.any(needed > self.config.MAX_SERVERS_PER_REGION):
+            return None
+        servers = np.maximum(servers, needed).astype(int)
+        obj_val = objective_value(self.config.SCHEDULER, servers, requests, carbon_intensities, latencies, request_rates, self.config)
+        return servers, requests, obj_val
+
+    def put(self, key, servers, requests, obj_val):
+        """Stores a solution, evicting the least recently used one if the cache is full
+
+        Args:
+            key: Key built by key()
+            servers: servers[i] is the number of servers in region i
+            requests: requests[i][j] is the number of requests from region i sent to region j
+            obj_val: Objective value of the solution
+        """
+        self.solutions[key] = (np.array(servers), np.array(requests), obj_val)
+        self.solutions.move_to_end(key)
+        while len(self.solutions) > self.max_size:
+            self.solutions.popitem(last=False)
+
+    def stats(self):
+        """
+        Returns:
+            Dictionary with the hits, misses, hit rate and size of the cache
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self),
+        }
+
+    def close(self):
+        """Saves the solutions now instead of at exit, for a cache that is replaced"""
+        if self.path is None:
+            return
+        atexit.unregister(self.save)
+        self.save()
+
+    def read(self):
+        """
+        Returns:
+            The solutions saved at self.path, empty if there are none
+        """
+        if not os.path.exists(self.path):
+            return OrderedDict()
+        try:
+            with open(self.path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            logging.warning(f"Failed to load solution cache {self.path}: {e}")
+            return OrderedDict()
+
+    def load(self):
+        """Loads the solutions saved at self.path, if any"""
+        self.solutions = self.read()
+        while len(self.solutions) > self.max_size:
+            self.solutions.popitem(last=False)
+
+    def save(self):
+        """Saves the solutions to self.path
+
+        The solutions already in the file are kept, so caches that share the file, in this
+        process or another, add to it instead of overwriting each other. The solutions of this
+        cache count as the most recently used ones.
+        """
+        if self.path is None:
+            return
+        solutions = self.read()
+        for key, solution in self.solutions.items():
+            solutions[key] = solution
+            solutions.move_to_end(key)
+        while len(solutions) > self.max_size:
+            solutions.popitem(last=False)
+        # Written to a temporary file first, so a reader never sees a partial cache
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            pickle.dump(solutions, f)
+        os.replace(temporary, self.path)
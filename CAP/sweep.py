@@ -0,0 +1,202 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import contextlib
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from .CAP import CAP
+from .config import Config, Settings
+from .util import Util
+
+
+def expand_grid(grid):
+    """Expands a parameter grid into scenarios
+
+    Args:
+        grid: Dictionary from Config setting name to the list of values to try, e.g.
+            {"SCHEDULER": ["carbon", "latency"], "MAX_LATENCY": [100, 250]}
+    Returns:
+        One dictionary of settings per combination of values, in a fixed order
+    """
+    for name in grid:
+        if not name.isupper() or not hasattr(Config, name):
+            raise Exception(f"Unknown setting: {name}")
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def scenario_id(scenario, config=None):
+    """Stable id of a scenario, so a sweep finds the scenarios it already ran
+
+    The id covers every setting the scenario runs with, the base settings included, so a
+    sweep resumed with other base settings runs its scenarios again.
+
+    Args:
+        scenario: Dictionary of Config settings of the scenario
+        config: Settings the scenario changes, defaults to Config
+    """
+    settings = (config or Settings()).replace(**scenario).as_dict()
+    return hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def run_scenario(scenario, hours, config=None):
+    """Runs the scheduling pass of a scenario
+
+    Args:
+        scenario: Dictionary of Config settings of the scenario
+        hours: Number of hours to provision
+        config: Settings the scenario changes, defaults to Config
+    Returns:
+        One dictionary of results per hour, and the wall time of the scenario in seconds
+    """
+    started = time.perf_counter()
+    config = (config or Settings()).replace(**scenario)
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        cap = CAP(hours, config.LOAD_BALANCER_REGION, config.START_DATE, config.EXPONENTIAL_WORKLOAD, config=config)
+        servers, requests, objectives = cap.provision_range(0, hours)
+    table = cap.server_manager.table
+    requests_to = requests.sum(axis=1)
+    carbon = (requests_to * table.carbon[:hours]).sum(axis=1)
+    latency = (requests * np.nan_to_num(table.latency)).sum(axis=(1, 2)) / np.maximum(requests.sum(axis=(1, 2)), 1)
+    rows = [
+        {
+            "hour": hour,
+            "objective": float(objectives[hour]),
+            "servers": int(servers[hour].sum()),
+            "carbon": float(carbon[hour]),
+            "latency": float(latency[hour]),
+            "servers_per_region": json.dumps(servers[hour].tolist()),
+        }
+        for hour in range(hours)
+    ]
+    return rows, time.perf_counter() - started
+
+
+class SweepRunner:
+    """
+    Runs the scheduling pass of every scenario of a parameter grid in a process pool.
+
+    Results are written to one SQLite file as scenarios complete, so an interrupted sweep
+    resumes where it stopped: scenarios already in the file are skipped. The dataset is
+    loaded once by the parent before the pool forks, so workers share its arrays instead
+    of reading the files again.
+    """
+
+    def __init__(self, grid, path="sweep.sqlite", hours=24, processes=None, config=None):
+        """
+
+        Args:
+            grid: Parameter grid, see expand_grid()
+            path: SQLite file the results are written to
+            hours: Number of hours provisioned per scenario
+            processes: Number of worker processes, defaults to the number of CPUs
+            config: Settings the scenarios change, defaults to Config
+        """
+        self.config = config or Settings()
+        self.scenarios = expand_grid(grid)
+        self.path = path
+        self.hours = hours
+        self.processes = processes or os.cpu_count()
+        with self.connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS scenarios (id TEXT PRIMARY KEY, params TEXT, hours INTEGER, elapsed REAL)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS results (id TEXT, hour INTEGER, objective REAL, servers INTEGER, "
+                "carbon REAL, latency REAL, servers_per_region TEXT, PRIMARY KEY (id, hour))"
+            )
+
+    def __repr__(self):
+        return f"SweepRunner({self.path}, scenarios={len(self.scenarios)}, hours={self.hours})"
+
+    def connect(self):
+        return contextlib.closing(sqlite3.connect(self.path))
+
+    def completed(self):
+        """
+        Returns:
+            Ids of the scenarios whose results are in the file
+        """
+        with self.connect() as db:
+            return {row[0] for row in db.execute("SELECT id FROM scenarios WHERE hours = ?", (self.hours,))}
+
+    def pending(self):
+        """
+        Returns:
+            Scenarios of the grid that have not been run yet
+        """
+        completed = self.completed()
+        return [scenario for scenario in self.scenarios if scenario_id(scenario, self.config) not in completed]
+
+    def save(self, scenario, rows, elapsed):
+        """Writes the results of a scenario, the scenario only counts as completed once they all are
+
+        Args:
+            scenario: Dictionary of Config settings of the scenario
+            rows: Results of the scenario, see run_scenario()
+            elapsed: Wall time of the scenario in seconds
+        """
+        sid = scenario_id(scenario, self.config)
+        with self.connect() as db, db:
+            db.execute("DELETE FROM results WHERE id = ?", (sid,))
+            db.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(sid, r["hour"], r["objective"], r["servers"], r["carbon"], r["latency"], r["servers_per_region"]) for r in rows],
+            )
+            db.execute("INSERT OR REPLACE INTO scenarios VALUES (?, ?, ?, ?)", (sid, json.dumps(scenario, sort_keys=True), self.hours, elapsed))
+
+    def run(self):
+        """Runs the scenarios that have not been run yet
+
+        Returns:
+            Number of scenarios run
+        """
+        pending = self.pending()
+        print(f"Sweep: {len(self.scenarios) - len(pending)} of {len(self.scenarios)} scenarios already done")
+        if not pending:
+            return 0
+
+        # Load the data files once, forked workers inherit the cache
+        config = self.config
+        for file_name in (config.CARBON_INTENSITY_FILENAME, config.REQUEST_DATA_FILENAME, config.LATENCY_FILENAME, config.TIME_OFFSET_FILENAME):
+            if config.DATASET_FORMAT == "npy":
+                Util.load_binary_table(file_name, config)
+            else:
+                Util.load_file_as_df(file_name, config)
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(min(self.processes, len(pending)), mp_context=context) as pool:
+            futures = {pool.submit(run_scenario, scenario, self.hours, config): scenario for scenario in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                scenario = futures[future]
+                self.save(scenario, *future.result())
+                print(f"Sweep: {done}/{len(pending)} {scenario}")
+        return len(pending)
+
+    def results(self):
+        """
+        Returns:
+            DataFrame with one row per scenario and hour, with a column per swept setting
+        """
+        with self.connect() as db:
+            scenarios = pd.read_sql_query("SELECT id, params FROM scenarios WHERE hours = ?", db, params=(self.hours,))
+            results = pd.read_sql_query("SELECT * FROM results", db)
+        params = pd.DataFrame([json.loads(p) for p in scenarios["params"]], index=scenarios["id"])
+        return results.join(params, on="id", how="inner")
+
+
+if __name__ == "__main__":
+    # python -m CAP.sweep grid.json [results.sqlite] [hours]
+    with open(sys.argv[1]) as f:
+        grid = json.load(f)
+    path = sys.argv[2] if len(sys.argv) > 2 else "sweep.sqlite"
+    hours = int(sys.argv[3]) if len(sys.argv) > 3 else 24
+    runner = SweepRunner(grid, path, hours)
+    runner.run()
+    print(runner.results().groupby("id").agg({"carbon": "sum", "latency": "mean", "servers": "mean"}))
@@ -0,0 +1,191 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import json
+import threading
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Phases of a scheduling call, in order: computing the inputs, building or updating the model,
+# starting the solver process and exchanging the model files (CBC only), solving, and
+# extracting and rounding the results
+PHASES = ("inputs", "build", "startup", "solve", "extract")
+
+
+class SolverTelemetry:
+    """
+    Ring buffer of the instrumentation of the last scheduling calls.
+
+    Every call of MilpScheduler.schedule_servers() and schedule_requests() records the size of
+    the model it solved, the wall time of each phase, the solver status, the MIP gap and the
+    number of branch and bound nodes. Only the last size calls are kept, the call counters
+    cover the whole run. The records can be dumped as JSON or exposed in the Prometheus text
+    format, optionally over HTTP, to catch solver regressions before they exceed the control
+    budget of an hour.
+    """
+
+    def __init__(self, size=168):
+        """
+
+        Args:
+            size: Number of calls kept
+        """
+        self.buffer = deque(maxlen=size)
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.server = None
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __repr__(self):
+        return f"SolverTelemetry(size={len(self)}/{self.buffer.maxlen}, calls={sum(self.calls.values())})"
+
+    def record(self, call, hour, scheduler, backend, status, phases, variables=None, constraints=None, gap=None, nodes=None, objective=None, fallback=False):
+        """Adds the record of a scheduling call, evicting the oldest one if the buffer is full
+
+        Args:
+            call: servers (provisioning) or requests (sub-hour re-routing)
+            hour: Hour of the call, fractional for the sub-hour steps
+            scheduler: carbon/latency
+            backend: Solver backend, or cache/greedy if no solver produced the schedule
+            status: Solver status
+            phases: Dictionary from phase name to wall time in seconds, see PHASES
+            variables: Number of variables of the model
+            constraints: Number of constraints of the model
+            gap: Relative MIP gap, if known
+            nodes: Number of branch and bound nodes, if known
+            objective: Objective value
+            fallback: Whether the greedy fallback produced the schedule
+        """
+        phases = {phase: float(phases.get(phase, 0.0)) for phase in PHASES}
+        entry = {
+            "call": call,
+            "hour": float(hour),
+            "scheduler": scheduler,
+            "backend": backend,
+            "status": status,
+            "variables": None if variables is None else int(variables),
+            "constraints": None if constraints is None else int(constraints),
+            "gap": None if gap is None else float(gap),
+            "nodes": None if nodes is None else int(nodes),
+            "objective": None if objective is None else float(objective),
+            "fallback": bool(fallback),
+            "phases": phases,
+            "total": sum(phases.values()),
+        }
+        with self.lock:
+            self.buffer.append(entry)
+            self.calls[call, status] += 1
+        return entry
+
+    def records(self, call=None):
+        """
+        Args:
+            call: Only return the records of this kind of call, servers or requests
+        Returns:
+            The records in the buffer, oldest first
+        """
+        with self.lock:
+            return [entry for entry in self.buffer if call is None or entry["call"] == call]
+
+    def to_json(self, path=None):
+        """Dumps the records in the buffer as JSON
+
+        Args:
+            path: File the records are written to, if given
+        Returns:
+            The JSON document
+        """
+        document = json.dumps({"calls": [{"call": call, "status": status, "count": count} for (call, status), count in sorted(self.calls.items())],
+                               "records": self.records()}, indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(document)
+        return document
+
+    def prometheus(self):
+        """
+        Returns:
+            The records in the Prometheus text exposition format: gauges of the last call of each
+            kind, a summary of the call durations in the buffer and the call counters
+        """
+        records = self.records()
+        with self.lock:
+            calls = sorted(self.calls.items())
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {'NaN' if value is None else value}")
+
+        last = {}
+        for entry in records:
+            last[entry["call"]] = entry
+        last = [last[call] for call in sorted(last)]
+        metric("cap_solver_phase_seconds", "gauge", "Wall time of each phase of the last scheduling call",
+               [({"call": e["call"], "phase": phase}, e["phases"][phase]) for e in last for phase in PHASES])
+        for field, description in (
+            ("variables", "Number of variables of the last model solved"),
+            ("constraints", "Number of constraints of the last model solved"),
+            ("nodes", "Branch and bound nodes of the last solve"),
+            ("gap", "Relative MIP gap of the last solve"),
+            ("objective", "Objective value of the last solve"),
+        ):
+            metric(f"cap_solver_{field}", "gauge", description, [({"call": e["call"]}, e[field]) for e in last])
+        metric("cap_solver_last_status", "gauge", "Status of the last scheduling call",
+               [({"call": e["call"], "status": e["status"], "backend": e["backend"]}, 1) for e in last])
+
+        samples = []
+        for call in sorted({entry["call"] for entry in records}):
+            totals = np.array([entry["total"] for entry in records if entry["call"] == call])
+            for quantile in (0.5, 0.95, 0.99):
+                samples.append(({"call": call, "quantile": quantile}, float(np.quantile(totals, quantile))))
+        metric("cap_solver_seconds", "summary", "Wall time of the scheduling calls in the buffer", samples)
+        for call in sorted({entry["call"] for entry in records}):
+            totals = [entry["total"] for entry in records if entry["call"] == call]
+            lines.append(f'cap_solver_seconds_sum{{call="{call}"}} {sum(totals)}')
+            lines.append(f'cap_solver_seconds_count{{call="{call}"}} {len(totals)}')
+        metric("cap_solver_calls_total", "counter", "Scheduling calls by status",
+               [({"call": call, "status": status}, count) for (call, status), count in calls])
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host=""):
+        """Serves the records over HTTP in a background thread: /metrics in the Prometheus format
+        and /json as JSON
+
+        Args:
+            port: Port to listen on, 0 picks a free one
+            host: Interface to listen on, all of them by default
+        Returns:
+            The HTTP server, stop it with server.shutdown()
+        """
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics"):
+                    body, content_type = telemetry.prometheus(), "text/plain; version=0.0.4"
+                elif self.path.startswith("/json"):
+                    body, content_type = telemetry.to_json(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Solver telemetry served on port {self.server.server_address[1]}")
+        return self.server
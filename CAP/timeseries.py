@@ -0,0 +1,73 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import numpy as np
+
+
+class TimeSeries:
+    """
+    One or more columns of values indexed by sorted UNIX timestamps.
+
+    Lookups use binary search instead of scanning the timestamps, and values can be read at
+    arbitrary times, e.g. at a start time between two rows or at the sub-hour steps of the
+    request scheduler, either holding the last known value or interpolating linearly between
+    the surrounding rows. Times before the first row take its value, times after the last
+    row take the last value.
+    """
+
+    def __init__(self, timestamps, values):
+        """
+
+        Args:
+            timestamps: Sorted timestamps of the rows, in seconds
+            values: values[t] is the row (or single value) at timestamps[t]
+        """
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.values = np.asarray(values)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __repr__(self):
+        return f"TimeSeries(rows={len(self)}, start={self.timestamps[0] if len(self) else None})"
+
+    def index_of(self, timestamp):
+        """Row at or before a timestamp
+
+        Returns:
+            Index of the last row whose timestamp is <= timestamp, -1 if there is none
+        """
+        return int(np.searchsorted(self.timestamps, timestamp, side="right")) - 1
+
+    def at(self, timestamps, method="hold"):
+        """Values at the given times
+
+        Args:
+            timestamps: A timestamp or an array of timestamps, in seconds
+            method: hold (value of the row at or before each time) or linear (interpolated)
+        Returns:
+            One row of values per timestamp
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        last = len(self.timestamps) - 1
+        left = np.clip(np.searchsorted(self.timestamps, timestamps, side="right") - 1, 0, last)
+        if method == "hold":
+            return self.values[left]
+        if method != "linear":
+            raise ValueError(f"Invalid resampling method: {method}")
+
+        right = np.minimum(left + 1, last)
+        span = self.timestamps[right] - self.timestamps[left]
+        weight = np.clip((timestamps - self.timestamps[left]) / np.where(span > 0, span, 1), 0, 1)
+        weight = weight.reshape(weight.shape + (1,) * (self.values.ndim - 1))
+        return (1 - weight) * self.values[left] + weight * self.values[right]
+
+    def resample(self, start, step, n, method="hold"):
+        """Values at n evenly spaced times
+
+        Args:
+            start: Timestamp of the first value, in seconds
+            step: Time between two values, in seconds
+            n: Number of values
+            method: hold or linear, see at()
+        """
+        return self.at(start + step * np.arange(n), method)
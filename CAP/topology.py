@@ -0,0 +1,188 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from .config import Config
+from .dataset_store import convert_dataset
+from .workload_generator import WorkloadGenerator
+
+# Mean radius of the earth in km
+EARTH_RADIUS = 6371
+
+
+def haversine_distances(latitudes, longitudes):
+    """Great-circle distances between all pairs of points, in one vectorized pass
+
+    Args:
+        latitudes: latitudes[i] is the latitude of point i in degrees
+        longitudes: longitudes[i] is the longitude of point i in degrees
+    Returns:
+        distances[i][j] is the distance from point i to j in km
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    dlat = lat[np.newaxis, :] - lat[:, np.newaxis]
+    dlon = lon[np.newaxis, :] - lon[:, np.newaxis]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, np.newaxis] * np.cos(lat)[np.newaxis, :] * np.sin(dlon / 2) ** 2
+    # Rounding can push a slightly above 1 for antipodal points
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def haversine_latency(distances):
+    """Latency of a distance, L=0.022*0.62*d+m [ms] with d in km
+
+    Args:
+        distances: A distance or an array of distances in km
+    Returns:
+        Latencies in ms, of the same shape
+    """
+    return 0.022 * 0.62 * np.asarray(distances, dtype=np.float64) + 4.862
+
+
+class TopologyGenerator:
+    """
+    Seeded generator of synthetic datasets of any number of regions.
+
+    The latency matrix is the haversine latency between the coordinates of the regions, with
+    optional random fluctuations. The carbon intensity of a region is a base intensity lowered
+    around local noon by its solar share, and its demand follows a diurnal pattern around a base
+    rate, both with hourly noise. The datasets are written in the csv format Util loads, so a run
+    selects one with the DATASET setting.
+    """
+
+    def __init__(self, latitudes, longitudes, names=None, offsets=None, seed=None):
+        """
+
+        Args:
+            latitudes: latitudes[i] is the latitude of region i in degrees
+            longitudes: longitudes[i] is the longitude of region i in degrees
+            names: Names of the regions, region-0000, region-0001... by default
+            offsets: offsets[i] is the time offset of region i from UTC in hours, derived from
+                the longitudes by default
+            seed: Seed or numpy Generator of the random draws
+        """
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        width = max(4, len(str(len(self.latitudes) - 1)))
+        self.names = pd.Index(names if names is not None else [f"region-{i:0{width}d}" for i in range(len(self.latitudes))])
+        self.offsets = np.asarray(offsets) if offsets is not None else np.rint(self.longitudes / 15).astype(np.int64)
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return f"TopologyGenerator(regions={len(self)})"
+
+    @classmethod
+    def random(cls, n_regions, seed=None, max_latitude=60):
+        """Generator of regions placed uniformly at random on the sphere
+
+        Args:
+            n_regions: Number of regions
+            seed: Seed or numpy Generator of the random draws
+            max_latitude: Regions are placed between -max_latitude and max_latitude degrees
+        """
+        rng = np.random.default_rng(seed)
+        # Uniform in the sine of the latitude, so the density per area is uniform
+        bound = np.sin(np.radians(max_latitude))
+        latitudes = np.degrees(np.arcsin(rng.uniform(-bound, bound, n_regions)))
+        longitudes = rng.uniform(-180, 180, n_regions)
+        return cls(latitudes, longitudes, seed=rng)
+
+    def latency(self, jitter=0.0):
+        """
+        Args:
+            jitter: Standard deviation of the random fluctuations in ms
+        Returns:
+            latency[i][j] is the latency from region i to j in ms
+        """
+        latency = haversine_latency(haversine_distances(self.latitudes, self.longitudes))
+        if jitter:
+            latency = np.maximum(latency + self.rng.normal(0, jitter, latency.shape), 1.0)
+        return latency
+
+    def carbon(self, timesteps, start_hour=0, low=50, high=700, max_solar=0.5, noise=0.05):
+        """
+        Args:
+            timesteps: Number of hours
+            start_hour: Hour of the day (UTC) of hour 0
+            low: Lowest base carbon intensity
+            high: Highest base carbon intensity
+            max_solar: Highest share of the intensity that solar power removes at local noon
+            noise: Standard deviation of the log-normal hourly noise
+        Returns:
+            carbon[t][i] is the carbon intensity of region i in hour t
+        """
+        size = len(self)
+        base = self.rng.uniform(low, high, size)
+        solar = self.rng.uniform(0, max_solar, size)
+        local_hour = (start_hour + np.arange(timesteps)[:, np.newaxis] + self.offsets) % 24
+        daylight = np.maximum(np.cos(2 * np.pi * (local_hour - 12) / 24), 0)
+        return base * (1 - solar * daylight) * self.rng.lognormal(0, noise, (timesteps, size))
+
+    def demand(self, timesteps, start_hour=0, median_rate=150, sigma=0.8):
+        """
+        Args:
+            timesteps: Number of hours
+            start_hour: Hour of the day (UTC) of hour 0
+            median_rate: Median base request rate of the regions
+            sigma: Standard deviation of the log of the base request rates
+        Returns:
+            demand[t][i] is the number of requests from region i in hour t
+        """
+        rates = median_rate * self.rng.lognormal(0, sigma, len(self))
+        diurnal = WorkloadGenerator(self.offsets, self.rng, start_hour).generate(rates, timesteps, "DIURNAL")
+        return self.rng.poisson(diurnal)
+
+    def write(self, dataset_dir, start_date, hours, jitter=0.0, config=None):
+        """Writes a dataset that can provision hours hours from start_date
+
+        The request and carbon files start a day before start_date, since the loader needs a
+        row before the start, and end a day after the last hour, which the forecasts read.
+
+        Args:
+            dataset_dir: Directory of the dataset, e.g. CAP/dataset/synthetic-1000
+            start_date: First day of the dataset that can be provisioned, see START_DATE
+            hours: Number of hours that can be provisioned
+            jitter: Standard deviation of the latency fluctuations in ms
+            config: Settings naming the data files, defaults to Config
+        """
+        config = config or Config
+        os.makedirs(dataset_dir, exist_ok=True)
+        start = datetime.fromisoformat(start_date).replace(tzinfo=timezone.utc)
+        start_timestamp = int(start.timestamp())
+        timestamps = start_timestamp + 3600 * np.arange(-24, hours + 25)
+        start_hour = start.hour
+        names = list(self.names)
+
+        pd.DataFrame([self.offsets], columns=names).to_csv(os.path.join(dataset_dir, config.TIME_OFFSET_FILENAME), index=False)
+        pd.DataFrame([self.latitudes, self.longitudes], columns=names).to_csv(os.path.join(dataset_dir, config.LOCATION_FILENAME), index=False)
+        pd.DataFrame(np.round(self.latency(jitter), 2), columns=names).to_csv(os.path.join(dataset_dir, config.LATENCY_FILENAME), index=False)
+
+        requests = pd.DataFrame(self.demand(len(timestamps), start_hour), columns=names)
+        requests.insert(0, "timestamp", timestamps)
+        requests.insert(1, "datetime", pd.to_datetime(timestamps, unit="s").strftime("%d-%m-%Y %H:%M"))
+        requests.to_csv(os.path.join(dataset_dir, config.REQUEST_DATA_FILENAME), index=False)
+
+        carbon = pd.DataFrame(np.rint(self.carbon(len(timestamps), start_hour)).astype(np.int64), columns=names)
+        carbon.insert(0, "timestamp", timestamps)
+        carbon.to_csv(os.path.join(dataset_dir, config.CARBON_INTENSITY_FILENAME))
+        print(f"Wrote {len(self)} regions and {len(timestamps)} hours to {dataset_dir}")
+
+
+if __name__ == "__main__":
+    # python -m CAP.topology <regions> [start date] [hours] [seed] [--npy], writes CAP/dataset/synthetic-<regions>
+    args = [arg for arg in sys.argv[1:] if arg != "--npy"]
+    n_regions = int(args[0])
+    start_date = args[1] if len(args) > 1 else Config.START_DATE
+    hours = int(args[2]) if len(args) > 2 else 24 * 7
+    seed = int(args[3]) if len(args) > 3 else 0
+    dataset_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset", f"synthetic-{n_regions}")
+    TopologyGenerator.random(n_regions, seed).write(dataset_dir, start_date, hours)
+    if "--npy" in sys.argv:
+        convert_dataset(dataset_dir)
@@ -1,34 +1,44 @@
 # Authors: Basundhara Chakrabarty, Shruti Jasoria
 
 import os
+import threading
 from datetime import datetime, timezone
 
+import numpy as np
 import pandas as pd
 from .config import Config
+from .dataset_store import BinaryTable, binary_prefix
 
 
 class Util:
-    def save_file(plot):
+    # Process-wide cache of the loaded data files: (dataset, file name) -> (modification time, DataFrame),
+    # shared by all CAP instances and threads
+    dataset_cache = {}
+    dataset_lock = threading.Lock()
+
+    def save_file(plot, config=None):
         """Save the data of a file by name specified of the arguments. Usefull for misc visualisations.
 
 
         Args:
             plot: Converts data from the plot object to dataframe
+            config: Settings of the run, defaults to Config
         """
+        config = config or Config
         df = plot.build_df()
         date_created = datetime.now().strftime("%Y-%m-%d")
         if not os.path.exists("saved"):
             os.makedirs("saved")
 
         fingerprint = [
-            "replay_" if Config.SCHEDULER == "replay" else str(Config.SCHEDULER) + "_",
-            str(Config.START_DATE) + "_",
+            "replay_" if config.SCHEDULER == "replay" else str(config.SCHEDULER) + "_",
+            str(config.START_DATE) + "_",
             "_timesteps_",
-            str(Config.TIMESTEPS),
+            str(config.TIMESTEPS),
             "_max_latency_",
-            str(Config.MAX_LATENCY),
+            str(config.MAX_LATENCY),
             "_max_servers_",
-            str(Config.MAX_SERVERS)
+            str(config.MAX_SERVERS)
         ]
         df.to_csv(f"saved/{date_created}_{''.join(fingerprint)}.csv", index=False)
 
@@ -57,8 +67,8 @@ class Util:
     #     print("______________________________________")
 
     @classmethod
-    def required_files(cls):
-        region_dir = cls.__region_dir()
+    def required_files(cls, config=None):
+        region_dir = cls.__region_dir(config)
         names = [
             "carbon_intensity.csv",
             "latency.csv",
@@ -71,47 +81,118 @@ class Util:
             print(f"\t{name}")
 
 
-    def __region_dir():
+    def __region_dir(config=None):
         scheduler_dir = os.path.dirname(os.path.abspath(__file__))
         data_dir = os.path.abspath(os.path.join(scheduler_dir, "../CAP/dataset"))
-        return os.path.join(data_dir, Config.DATASET)
+        return os.path.join(data_dir, (config or Config).DATASET)
 
     @classmethod
-    def load_file_as_df(cls, file_name):
+    def load_file_as_df(cls, file_name, config=None):
+        """Loads a data file of the dataset of the given settings.
+
+        Every file is only read once per process and shared by all callers, it is read again if
+        it changes on disk. Files with a timestamp column are sorted by it. The returned DataFrame
+        must not be modified in place.
+
+        Args:
+            file_name: Name of the file in the dataset directory
+            config: Settings of the run, defaults to Config
+        """
+        config = config or Config
         try:
-            region_dir = cls.__region_dir()
+            region_dir = cls.__region_dir(config)
             file_path = os.path.join(region_dir, file_name)
             #print("### File path", file_path)
-            return pd.read_csv(file_path)
+            key = (config.DATASET, file_name)
+            mtime = os.path.getmtime(file_path)
+            with cls.dataset_lock:
+                cached = cls.dataset_cache.get(key)
+                if cached is None or cached[0] != mtime:
+                    df = pd.read_csv(file_path)
+                    # Time-indexed files are kept sorted so their rows can be found by binary search
+                    if "timestamp" in df.columns and not df["timestamp"].is_monotonic_increasing:
+                        df = df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+                    cached = (mtime, df)
+                    cls.dataset_cache[key] = cached
+            return cached[1]
         except Exception as e:
             print(f"Failed to load file: {file_name}")
             print(e)
-            cls.required_files()
+            cls.required_files(config)
 
 
-    # Calculate the timestamp from conf.start_date and validate whether an entry for the timestamp is present in file_name. If not present, throw an assertion error
-    @classmethod
-    def validate_date_and_load_file(cls, file_name):
-        df_from_file = cls.load_file_as_df(file_name)
-        #start_date = datetime.fromisoformat(Config.START_DATE).replace(tzinfo=timezone.utc)
-        start_date= datetime.strptime(Config.START_DATE, '%Y-%m-%d')
-        start_date=start_date.replace(tzinfo=timezone.utc)
-        start_timestamp = int(start_date.timestamp())
-        start_index_in_file = df_from_file.index[df_from_file["timestamp"] == start_timestamp]
-        assert len(start_index_in_file) > 0, f"Date [{start_date}] does not exist in file: {file_name}"
-
-        start = start_index_in_file[0]
-        
+    @staticmethod
+    def start_timestamp(config=None):
+        """UNIX timestamp of START_DATE, which is a date or a time in UTC"""
+        start_date = datetime.fromisoformat((config or Config).START_DATE).replace(tzinfo=timezone.utc)
+        return int(start_date.timestamp())
+
+    @staticmethod
+    def start_window(timestamps, n_rows, file_name, config=None):
+        """Finds the rows covering the simulated interval by binary search on the sorted timestamps
+
+        If START_DATE is not on a row, the window starts at the row before it and has one
+        more row, so the values at the start time can be resampled, see RegionTable.load().
+
+        Args:
+            timestamps: Sorted timestamps of the rows of the file
+            n_rows: Number of rows of the file
+            file_name: Name of the file, for messages
+            config: Settings of the run, defaults to Config
+        Returns:
+            First row and the row after the last one
+        """
+        config = config or Config
+        start_timestamp = Util.start_timestamp(config)
+        start = int(np.searchsorted(timestamps, start_timestamp, side="right")) - 1
+        assert start >= 0, f"Date [{config.START_DATE}] does not exist in file: {file_name}"
+
         assert start > 0, start
-        end = start + Config.TIMESTEPS + 24
-        print("Start date provided:{0}, start timestamp:{1}, start index:{2}, end index:{3} file name:{4}".format(Config.START_DATE,start_timestamp,start,end,file_name))
-        assert end < len(df_from_file), f"The selected interval overflows in file: {file_name}"
+        end = start + config.TIMESTEPS + 24
+        if timestamps[start] != start_timestamp:
+            end += 1
+        print("Start date provided:{0}, start timestamp:{1}, start index:{2}, end index:{3} file name:{4}".format(config.START_DATE,start_timestamp,start,end,file_name))
+        assert end < n_rows, f"The selected interval overflows in file: {file_name}"
+        return start, end
 
+    # Calculate the timestamp from conf.start_date and find the rows of the interval in file_name. If the date is outside the file, throw an assertion error
+    @classmethod
+    def validate_date_and_load_file(cls, file_name, config=None):
+        df_from_file = cls.load_file_as_df(file_name, config)
+        start, end = cls.start_window(df_from_file["timestamp"].to_numpy(), len(df_from_file), file_name, config)
         return df_from_file, start, end
 
     @classmethod
-    def load_carbon_intensity_from_file(cls):
-        df, start, end = cls.validate_date_and_load_file(Config.CARBON_INTENSITY_FILENAME)
+    def load_binary_table(cls, file_name, config=None):
+        """Memory-maps the binary version of a data file, see dataset_store.convert_dataset().
+
+        Like the csv files, each table is opened once per process and re-opened if it changes on disk.
+
+        Args:
+            file_name: Name of the csv file in the dataset directory
+            config: Settings of the run, defaults to Config
+        """
+        config = config or Config
+        prefix = binary_prefix(cls.__region_dir(config), file_name)
+        key = (config.DATASET, file_name, "npy")
+        mtime = os.path.getmtime(f"{prefix}.values.npy")
+        with cls.dataset_lock:
+            cached = cls.dataset_cache.get(key)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, BinaryTable(prefix))
+                cls.dataset_cache[key] = cached
+        return cached[1]
+
+    @classmethod
+    def validate_date_and_load_binary(cls, file_name, config=None):
+        """Binary counterpart of validate_date_and_load_file(), the start row is found by binary search"""
+        table = cls.load_binary_table(file_name, config)
+        start, end = cls.start_window(table.timestamps, len(table), file_name, config)
+        return table, start, end
+
+    @classmethod
+    def load_carbon_intensity_from_file(cls, config=None):
+        df, start, end = cls.validate_date_and_load_file((config or Config).CARBON_INTENSITY_FILENAME, config)
         return df.iloc[start:end].reset_index(drop=True)
 
     def shuffle_requests(requests,rotate=1):
@@ -126,31 +207,59 @@ class Util:
         return requests
 
     @classmethod
-    def load_request_from_file(cls):
+    def load_request_from_file(cls, config=None):
         print("Loading requests")
-        df, start, end = cls.validate_date_and_load_file(Config.REQUEST_DATA_FILENAME)
+        df, start, end = cls.validate_date_and_load_file((config or Config).REQUEST_DATA_FILENAME, config)
         #df=cls.shuffle_requests(df,rotate=0)
         return df.iloc[start:end].reset_index(drop=True)
 
     @classmethod
-    def load_latency_from_file(cls):
-        latency_df=cls.load_file_as_df(Config.LATENCY_FILENAME)
+    def load_latency_from_file(cls, config=None):
+        latency_df=cls.load_file_as_df((config or Config).LATENCY_FILENAME, config)
         #print("Latency:",latency_df)
-        regions=cls.region_names()
+        regions=cls.region_names(config)
         #Renames the rows to map to each region, in the following way: 
         # {0: 'ap-southeast-2', 1: 'eu-central-1', 2: 'eu-west-3', 3: 'us-east-1', 4: 'us-east-2', 5: 'us-west-1'}
         new_rows={idx:region for idx,region in zip(range(len(regions)),regions)}
-        latency_df.rename(index=new_rows, inplace=True)
-        return latency_df
+        return latency_df.rename(index=new_rows)
+
+    @classmethod
+    def load_offset_from_file(cls, config=None):
+        return cls.load_file_as_df((config or Config).TIME_OFFSET_FILENAME, config)
+
+    @classmethod
+    def load_location_from_file(cls, config=None):
+        """Coordinates of the regions, which datasets may leave out
+
+        Args:
+            config: Settings of the run, defaults to Config
+        Returns:
+            locations[i] is the (latitude, longitude) of region i in degrees, or None if the
+            dataset has no location file
+        """
+        config = config or Config
+        region_names = cls.region_names(config)
+        if config.DATASET_FORMAT == "npy":
+            if not os.path.exists(f"{binary_prefix(cls.__region_dir(config), config.LOCATION_FILENAME)}.values.npy"):
+                return None
+            return np.array(cls.load_binary_table(config.LOCATION_FILENAME, config).select(0, 2, region_names)).T
+        if not os.path.exists(os.path.join(cls.__region_dir(config), config.LOCATION_FILENAME)):
+            return None
+        return cls.load_file_as_df(config.LOCATION_FILENAME, config)[region_names].to_numpy(dtype=np.float64).T
 
     @classmethod
-    def load_offset_from_file(cls):
-        return cls.load_file_as_df(Config.TIME_OFFSET_FILENAME)
+    def clear_dataset_cache(cls):
+        """Drops all cached data files, they are read from disk again on next use"""
+        with cls.dataset_lock:
+            cls.dataset_cache.clear()
 
     @classmethod
-    def region_names(cls):
+    def region_names(cls, config=None):
         """
         The region names are taken from the offset_wiki data file
         """
-        df = cls.load_offset_from_file()
+        config = config or Config
+        if config.DATASET_FORMAT == "npy":
+            return pd.Index(cls.load_binary_table(config.TIME_OFFSET_FILENAME, config).columns)
+        df = cls.load_offset_from_file(config)
         return df.columns
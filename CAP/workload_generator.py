@@ -0,0 +1,113 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import numpy as np
+
+DISTRIBUTIONS = ("EXPONENTIAL", "BIMODAL", "TRIMODAL", "DIURNAL")
+
+
+class WorkloadGenerator:
+    """
+    Seeded generator of synthetic workloads.
+
+    A workload is a timesteps x R matrix where workload[t][i] is the number of requests from
+    region i in timestep t. Every distribution draws the whole matrix in one vectorized call
+    from its own numpy Generator, so a seed reproduces a workload exactly. Long horizons can be
+    streamed in chunks; the chunks concatenate to the same matrix as a single call.
+    """
+
+    def __init__(self, offsets, seed=None, start_hour=0, amplitude=0.5, peak_hour=14):
+        """
+
+        Args:
+            offsets: offsets[i] is the time offset of region i from UTC in hours, see offset.csv
+            seed: Seed or numpy Generator of the random draws
+            start_hour: Hour of the day (UTC) of timestep 0, for the diurnal distribution
+            amplitude: Relative swing of the diurnal distribution around its mean
+            peak_hour: Local hour of the day at which the diurnal distribution peaks
+        """
+        self.offsets = np.asarray(offsets, dtype=np.float64)
+        self.rng = np.random.default_rng(seed)
+        self.start_hour = start_hour
+        self.amplitude = amplitude
+        self.peak_hour = peak_hour
+
+    def __repr__(self):
+        return f"WorkloadGenerator(regions={len(self.offsets)}, start_hour={self.start_hour})"
+
+    def factors(self, distribution_type, timesteps, start=0, stop=None):
+        """Multipliers of the request rates in timesteps [start, stop) of a horizon
+
+        The bimodal and trimodal distributions switch modes at fixed fractions of the whole
+        horizon, so a chunk of it needs the length of the horizon and its own position.
+
+        Args:
+            distribution_type: One of EXPONENTIAL, BIMODAL, TRIMODAL, DIURNAL
+            timesteps: Length of the whole horizon
+            start: First timestep
+            stop: Timestep after the last one, defaults to timesteps
+        Returns:
+            factors[t][i] for the timesteps of the chunk
+        """
+        stop = timesteps if stop is None else stop
+        t = np.arange(start, stop)[:, np.newaxis]
+        size = (stop - start, len(self.offsets))
+        if distribution_type == 'EXPONENTIAL':
+            # f(x) = e^(-x), the scale keeps the values close to 1 so the pods can handle the traffic
+            return self.rng.exponential(scale=0.5, size=size)
+        elif distribution_type == 'BIMODAL':
+            second = t >= timesteps // 2
+            return self.rng.normal(np.where(second, 1.1, 1), np.where(second, 0.06, 0.12), size=size)
+        elif distribution_type == 'TRIMODAL':
+            third = timesteps // 3
+            loc = np.where(t < third, 0.9, np.where(t < timesteps - third, 1, 1.1))
+            return self.rng.normal(loc, 0.07, size=size)
+        elif distribution_type == 'DIURNAL':
+            local_hour = (self.start_hour + t + self.offsets) % 24
+            return 1 + self.amplitude * np.cos(2 * np.pi * (local_hour - self.peak_hour) / 24)
+        raise Exception("distribution_type can take one of the values - " + ", ".join(DISTRIBUTIONS))
+
+    def scale(self, factors, requests, distribution_type):
+        """Turns factors into integer requests per region
+
+        As before, the random distributions are rounded up to whole multiples of the rates,
+        the diurnal one scales the rates smoothly.
+        """
+        if distribution_type == 'DIURNAL':
+            return np.rint(factors * requests).astype(np.int64)
+        return np.ceil(factors).astype(np.int64) * np.rint(requests).astype(np.int64)
+
+    def generate(self, requests, timesteps, distribution_type):
+        """
+        Args:
+            requests: requests[i] is the request rate of region i the workload is built around
+            timesteps: Number of timesteps
+            distribution_type: One of EXPONENTIAL, BIMODAL, TRIMODAL, DIURNAL
+        Returns:
+            workload[t][i] is the number of requests from region i in timestep t
+        """
+        requests = np.asarray(requests, dtype=np.float64)
+        return self.scale(self.factors(distribution_type, timesteps), requests, distribution_type)
+
+    def stream(self, requests, timesteps, distribution_type, chunk_size=24 * 7):
+        """Generates a workload chunk by chunk, for horizons too long to hold at once
+
+        Yields:
+            workload[t][i] for chunk_size timesteps at a time
+        """
+        requests = np.asarray(requests, dtype=np.float64)
+        for start in range(0, timesteps, chunk_size):
+            stop = min(start + chunk_size, timesteps)
+            factors = self.factors(distribution_type, timesteps, start, stop)
+            yield self.scale(factors, requests, distribution_type)
+
+    def exponential_trace(self, totals, timesteps):
+        """Redistributes the requests of each region over the timesteps with exponential weights
+
+        Args:
+            totals: totals[i] is the total number of requests of region i over all timesteps
+            timesteps: Number of timesteps
+        Returns:
+            trace[t][i], rounded, whose columns sum to about totals[i]
+        """
+        weights = self.rng.exponential(size=(timesteps, len(self.offsets)))
+        return np.round(weights * np.asarray(totals, dtype=np.float64) / weights.sum(axis=0))
@@ -0,0 +1,288 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+"""
+Benchmarks of the Carbon and Latency schedulers.
+
+Every case provisions a run of consecutive hours with MilpScheduler.schedule_servers() and
+reports the throughput in hours per second, the p50/p99 wall time of a call, the mean wall
+time of each solver phase (see CAP/telemetry.py) and the peak memory of the process. Cases
+run in fresh processes so their peak memory does not mix. The memory of the CBC subprocesses
+is not measured.
+
+The wiki cases replay the bundled trace for 24 hours, a week and every hour the request data
+covers (about 1,150 hours from the default start date; the carbon data spans a year but the
+request data only seven weeks). The synthetic cases replicate the six regions of the trace into
+larger topologies, perturbing the latencies, demand and carbon intensities of every replica.
+The model grows with the square of the number of regions, so the large topologies provision a
+few hours only and every call is capped by SOLVER_TIME_LIMIT; a case whose calls hit the cap
+reports the cap, and one that falls back to the greedy schedule shows it in its statuses.
+
+    python -m benchmarks.schedulers                         # run and diff against baseline.json
+    python -m benchmarks.schedulers --save                  # run and replace baseline.json
+    python -m benchmarks.schedulers --cases wiki-24h synthetic-50 --schedulers carbon
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from CAP.config import Settings
+from CAP.milp_scheduler import MilpScheduler
+from CAP.region import RegionTable
+from CAP.request import RequestBatch
+from CAP.server import ServerManager
+from CAP.util import Util
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Name, number of regions (None keeps the trace) and hours (None provisions every hour the trace covers)
+CASES = [
+    ("wiki-24h", None, 24),
+    ("wiki-168h", None, 168),
+    ("wiki-full", None, None),
+    ("synthetic-6", 6, 24),
+    ("synthetic-50", 50, 6),
+    ("synthetic-200", 200, 2),
+    ("synthetic-1000", 1000, 1),
+]
+
+# Results compared against the baseline, with True if higher is better
+METRICS = {
+    "hours_per_second": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "peak_rss_mb": False,
+}
+
+
+def available_hours(config):
+    """Number of hours from START_DATE that the request and carbon data both cover"""
+    start_timestamp = Util.start_timestamp(config)
+    hours = []
+    for file_name in (config.REQUEST_DATA_FILENAME, config.CARBON_INTENSITY_FILENAME):
+        timestamps = Util.load_file_as_df(file_name, config)["timestamp"].to_numpy()
+        start = int(np.searchsorted(timestamps, start_timestamp, side="right")) - 1
+        aligned = timestamps[start] == start_timestamp
+        # The loader reserves 24 rows after the interval and one more if the start is not on a row
+        hours.append(len(timestamps) - 1 - start - 24 - (0 if aligned else 1))
+    return min(hours)
+
+
+def synthetic_table(table, n_regions, seed=0):
+    """Replicates the regions of a table into a larger topology
+
+    Region k is a replica of region k mod R of the table. Replicas of the same region are close
+    to each other and keep the latencies of the original to the other regions, perturbed by a
+    log-normal factor. Every replica scales the demand and carbon intensity of its original by a
+    factor of its own, and its carbon intensities get hourly noise.
+
+    Args:
+        table: RegionTable to replicate
+        n_regions: Number of regions of the topology
+        seed: Seed of the perturbations
+    Returns:
+        RegionTable with n_regions regions
+    """
+    rng = np.random.default_rng(seed)
+    R = len(table)
+    base = np.arange(n_regions) % R
+    names = [name if k < R else f"{name}-{k // R}" for k, name in zip(range(n_regions), np.asarray(table.region_names)[base])]
+
+    latency = table.latency[np.ix_(base, base)] * rng.lognormal(0, 0.1, (n_regions, n_regions))
+    np.fill_diagonal(latency, np.diag(table.latency)[base])
+    same = (base[:, np.newaxis] == base[np.newaxis, :]) & ~np.eye(n_regions, dtype=bool)
+    latency[same] = rng.uniform(2, 10, same.sum())
+
+    demand = np.rint(table.demand[:, base] * rng.uniform(0.5, 1.5, n_regions)).astype(table.demand.dtype)
+    carbon = table.carbon[:, base] * rng.uniform(0.5, 1.5, n_regions) * rng.lognormal(0, 0.05, (table.carbon.shape[0], n_regions))
+    return RegionTable(pd.Index(names), demand, carbon, latency, table.offsets[base], table.timestamps, table.config)
+
+
+def run_case(scheduler, n_regions, hours, settings):
+    """Provisions the hours of a case and measures every scheduling call
+
+    Args:
+        scheduler: carbon/latency
+        n_regions: Number of synthetic regions, None replays the trace
+        hours: Number of hours, None provisions every hour the trace covers
+        settings: Dictionary of settings of the run
+    Returns:
+        Dictionary of results
+    """
+    config = Settings(**settings).replace(SCHEDULER=scheduler)
+    if hours is None:
+        hours = available_hours(config)
+    config = config.replace(TIMESTEPS=hours, TELEMETRY_SIZE=hours)
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        server_manager = ServerManager(config=config)
+        if n_regions is not None:
+            table = synthetic_table(server_manager.table, n_regions)
+            server_manager = ServerManager(table.regions(), config)
+        milp_scheduler = MilpScheduler(config)
+
+        times = np.empty(hours)
+        started = time.perf_counter()
+        for hour in range(hours):
+            batches = [RequestBatch(region.name, region.get_requests_per_interval(hour), region) for region in server_manager.regions]
+            call_started = time.perf_counter()
+            servers, _, _, _ = milp_scheduler.schedule_servers(batches, server_manager, hour)
+            times[hour] = time.perf_counter() - call_started
+            server_manager.move(servers)
+        elapsed = time.perf_counter() - started
+
+    records = milp_scheduler.telemetry.records("servers")
+    phases = pd.DataFrame([record["phases"] for record in records]).mean() * 1000
+    return {
+        "regions": len(server_manager.regions),
+        "hours": hours,
+        "variables": records[-1]["variables"],
+        "constraints": records[-1]["constraints"],
+        "hours_per_second": hours / elapsed,
+        "p50_ms": float(np.percentile(times, 50) * 1000),
+        "p99_ms": float(np.percentile(times, 99) * 1000),
+        "phases_ms": {phase: float(value) for phase, value in phases.items()},
+        "statuses": dict(Counter(f"{record['backend']}:{record['status']}" for record in records)),
+        # ru_maxrss is in KB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _run_case_in_child(connection, *args):
+    try:
+        connection.send(run_case(*args))
+    except Exception as e:
+        connection.send({"error": repr(e)})
+    connection.close()
+
+
+def run_isolated(*args):
+    """Runs a case in a fresh process, so its peak memory is its own. See run_case()"""
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_case_in_child, args=(sender, *args))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {"error": f"exit code {process.exitcode}"}
+    process.join()
+    return result
+
+
+def run(cases, schedulers, settings):
+    """
+    Returns:
+        Dictionary from case id (<case>/<scheduler>) to its results
+    """
+    results = {}
+    for name, n_regions, hours in cases:
+        for scheduler in schedulers:
+            case_id = f"{name}/{scheduler}"
+            print(f"Running {case_id}...", flush=True)
+            results[case_id] = run_isolated(scheduler, n_regions, hours, settings)
+            print(f"  {format_result(results[case_id])}", flush=True)
+    return results
+
+
+def format_result(result):
+    if "error" in result:
+        return f"failed: {result['error']}"
+    return (
+        f"{result['regions']} regions, {result['hours']} hours, {result['variables']} variables: "
+        f"{result['hours_per_second']:.1f} hours/s, p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+        f"peak {result['peak_rss_mb']:.0f} MB, {result['statuses']}"
+    )
+
+
+def compare(results, baseline, tolerance):
+    """Diffs results against a baseline
+
+    Args:
+        results: Results of this run, see run()
+        baseline: Results of the baseline run
+        tolerance: Relative change above which a metric counts as a regression
+    Returns:
+        DataFrame with the baseline and current value and the relative change of every metric,
+        and the number of regressions
+    """
+    rows = []
+    for case_id, result in results.items():
+        previous = baseline.get(case_id)
+        if previous is None or "error" in previous or "error" in result:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            change = (result[metric] - previous[metric]) / previous[metric] if previous[metric] else 0.0
+            worse = -change if higher_is_better else change
+            rows.append({
+                "case": case_id,
+                "metric": metric,
+                "baseline": previous[metric],
+                "current": result[metric],
+                "change": f"{change:+.1%}",
+                "regression": worse > tolerance,
+            })
+    diff = pd.DataFrame(rows)
+    return diff, int(diff["regression"].sum()) if len(diff) else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the Carbon and Latency schedulers")
+    parser.add_argument("--cases", nargs="+", choices=[name for name, _, _ in CASES], help="Cases to run, all by default")
+    parser.add_argument("--schedulers", nargs="+", default=["carbon", "latency"], choices=["carbon", "latency"])
+    parser.add_argument("--backend", default="cbc", help="MILP backend: cbc, highs or flow")
+    parser.add_argument("--time-limit", type=float, default=10, help="Time budget of a scheduling call in seconds")
+    parser.add_argument("--start-date", default="2022-08-12", help="First day of the trace to provision")
+    parser.add_argument("--baseline", default=BASELINE, help="Baseline file to diff against")
+    parser.add_argument("--save", action="store_true", help="Write the results to the baseline file instead of diffing")
+    parser.add_argument("--output", help="Also write the results to this file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Relative change reported as a regression")
+    args = parser.parse_args(argv)
+
+    cases = [case for case in CASES if args.cases is None or case[0] in args.cases]
+    # The solution cache would skip the solver on repeated hours, every call is measured instead
+    settings = {
+        "START_DATE": args.start_date,
+        "LOAD_BALANCER_REGION": "us-east-1",
+        "MILP_BACKEND": args.backend,
+        "VERBOSE_MILP": False,
+        "SOLVER_LOG_STATS": True,
+        "SOLUTION_CACHE_SIZE": 0,
+        "SOLVER_TIME_LIMIT": args.time_limit,
+    }
+    results = run(cases, args.schedulers, settings)
+    document = {"settings": settings, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save to create it")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["settings"] != settings:
+        print(f"Warning: the baseline was run with other settings: {baseline['settings']}")
+    diff, regressions = compare(results, baseline["results"], args.tolerance)
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(diff.to_string(index=False))
+    print(f"{regressions} regressions above {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,8 @@ import os
 import subprocess
 from CAP.config import Config
 from CAP.metrics import Metrics
+from CAP.recorder import ResultsRecorder
+from CAP.rounding import round_preserving_sums
 import matplotlib.pyplot as plt
 
 
@@ -41,6 +43,8 @@ request_update_interval = 10
 gobetween="192.168.245.71:3000"
 exponential_workload=False
 distribution_type='EXPONENTIAL'
+# Directory the metrics are saved to, one sub-directory per scheduler
+results_dir="/nfs/obelix/users2/sjasoria/kasper/dataframes"
 
 
 #Global variables that will be used throughout the simulation
@@ -51,11 +55,8 @@ metrics_obj=None
 server_deployments=dict()
 region_list=list()
 
-#Global variables to store metrics
-global_requests_to_df=None
-global_requests_from_df=None
-global_carbon_intensities=None
-global_latencies=None
+#Global variable to store metrics
+recorder=None
 
 def start_gobetween():
     """
@@ -101,9 +102,9 @@ def calculate_weights(requests):
     """
     LOGGER.info(f"Calculating regionwise weights from : {requests}")
     np_weights=np.sum(np.array(requests).astype(float),axis=0)
-    # Compute the weighted average
+    # Compute the weighted average, rounded so that the weights add up to 100
     sum_weights=np.sum(np_weights)
-    weights = ((np_weights * 100) / sum_weights).astype(int)
+    weights = round_preserving_sums((np_weights * 100) / sum_weights, 100)
     serialized_weight_array = pickle.dumps(weights)
     with open(config_file, 'wb') as f:
         f.write(serialized_weight_array)
@@ -118,7 +119,7 @@ def _initialize(hours=_hours,scheduler=_scheduler,load_balancer_region=_load_bal
         scheduler: Scheduler to be used for the simulation
         load_balancer_region: Region where the load balancer will be deployed
     """
-    global cap_obj,metrics_obj,deploy_obj,region_list,workload_obj,global_requests_to_df,global_requests_from_df,global_carbon_intensities,global_latencies
+    global cap_obj,metrics_obj,deploy_obj,region_list,workload_obj,recorder
     LOGGER.info(f"[INFO] Initializing the variables for the simulation")
     cap_obj = CAP(hours,start_date=start_date,load_balancer_region=load_balancer_region,exponential_workload=True)
     cap_obj.set_scheduler(scheduler)
@@ -132,11 +133,8 @@ def _initialize(hours=_hours,scheduler=_scheduler,load_balancer_region=_load_bal
     
     #create_setup()
 
-    #Set metrics up with default values
-    global_requests_to_df = pd.DataFrame(columns=region_list)
-    global_requests_from_df=pd.DataFrame(columns=region_list)
-    global_carbon_intensities=pd.DataFrame(columns=region_list)
-    global_latencies=pd.DataFrame(columns=region_list)
+    #Set metrics up, memory-mapped in the results directory so finished hours survive an interrupted run
+    recorder = ResultsRecorder(hours, region_list, os.path.join(results_dir, scheduler))
     return
 
 def _run():
@@ -145,14 +143,11 @@ def _run():
     """
     # Start the load balancer traefik
     LOGGER.info(f"[INFO] Starting the load balancer Traefik for every region")
-    global _hours,request_update_interval, cap_obj,deploy_obj,region_list,workload_obj,exponential_workload,global_requests_to_df,global_requests_from_df,global_carbon_intensities,global_latencies
+    global _hours,request_update_interval, cap_obj,deploy_obj,region_list,workload_obj,exponential_workload,recorder
 
 
     deploy_obj.start_traefik()
     prometheus_process=deploy_obj.start_prometheus()
-    
-    # Helper variable to store the carbon intensity of the current hour, to be stacked and used for plotting
-    hourly_carbon_intensities=pd.DataFrame(columns=region_list)
 
     LOGGER.info(f"---------------------RUNNING FOR A TOTAL OF :{_hours} HOURS--------------------------------")
     LOGGER.info(f"---------------------RUNNING THE REQUEST SCHEDULER :{request_update_interval} times/hour---------------------")
@@ -207,7 +202,13 @@ def _run():
             if exponential_workload and _scheduler!='replay':
                 batches = cap_obj.build_workload_batches(timestep)
             else:
-                batches = cap_obj.build_batches(hour, request_update_interval=request_update_interval)
+                batches = cap_obj.build_batches(hour, request_update_interval=request_update_interval, fraction=timestep/timesteps)
+
+            # Re-route the requests of this step through the servers provisioned for the hour
+            if _scheduler!='replay':
+                step_requests = cap_obj.schedule_requests(hour, batches, fraction=timestep/timesteps)
+                step_weights = calculate_weights(step_requests)
+                deploy_obj.update_traefik_weights({region:step_weights[i] for i,region in enumerate(region_list)})
 
             # Reset the prometheus metrics stats before sending requests
             metrics_obj.reset_promestheus_stats()
@@ -230,15 +231,6 @@ def _run():
         avg_requests_from = total_requests_from/timesteps
         avg_request_service_time = total_request_service_time/timesteps
 
-        # Store the regionwise avg requests to that region in the current hour in a global df
-        global_requests_to_df= global_requests_to_df.append(avg_requests_to,ignore_index=True)
-
-        # Store the regionwise avg requests from that region in the current hour in a global df
-        global_requests_from_df= global_requests_from_df.append(avg_requests_from,ignore_index=True)
-
-        # Append the carbon intensity of the current hour to the helper variable
-        hourly_carbon_intensities=hourly_carbon_intensities.append(pd.Series(carbon_intensities, index=hourly_carbon_intensities.columns),ignore_index=True)
-
         print("Before adding latency matrix:",avg_request_service_time)
         # Store the regionwise avg_request_service_time for a region for the current hour in a global df
         avg_request_service_time=avg_request_service_time+latencies_matrix
@@ -247,46 +239,44 @@ def _run():
         curr_latencies= avg_request_service_time.sum(axis=0)*np.sum(requests,axis=1)
         print("curr_latencies",curr_latencies)
 
-        global_latencies=global_latencies.append(curr_latencies,ignore_index=True)
-        #global_latencies=global_latencies.append(avg_request_service_time,ignore_index=True)
+        # Store the regionwise avg requests to and from each region, its carbon intensity and latency in the current hour
+        recorder.record(hour, avg_requests_to, avg_requests_from, carbon_intensities, curr_latencies)
 
-        print(global_requests_to_df)
-        print(hourly_carbon_intensities)
-        print(global_latencies)
+        print(recorder.frame("requests_to"))
+        print(recorder.frame("carbon_intensities"))
+        print(recorder.frame("latencies"))
     
     # End the load balancer traefik
     LOGGER.info(f"[INFO] Ending the load balancer Traefik for every region")
     deploy_obj.stop_traefik()
     deploy_obj.stop_prometheus(prometheus_process)
 
-    # Calculate the carbon intensity incurred by the requests executed in each region
-    global_carbon_intensities=hourly_carbon_intensities*global_requests_to_df
-    print(global_carbon_intensities)
+    # The carbon intensity incurred by the requests executed in each region
+    print(recorder.frame("carbon"))
 
     return
 
 def _print_and_save_metrics():
     """
-    Prints the metrics collected during the simulation and saves them as csv 
+    Prints the metrics collected during the simulation and saves them as csv, next to the
+    .npy buffers of the recorder which ResultsRecorder.load() reads back
     """
     LOGGER.info(f"---------------------GLOBAL REQUESTS FROM DATAFRAME---------------------")
-    LOGGER.info(global_requests_from_df)
-    global_requests_from_df.to_csv(f'/nfs/obelix/users2/sjasoria/kasper/dataframes/{_scheduler}/global_requests_from_df.csv',index=False)
+    LOGGER.info(recorder.frame("requests_from"))
     LOGGER.info(f"---------------------GLOBAL REQUESTS TO DATAFRAME---------------------")
-    LOGGER.info(global_requests_to_df)
-    global_requests_to_df.to_csv(f'/nfs/obelix/users2/sjasoria/kasper/dataframes/{_scheduler}/global_requests_to_df.csv',index=False)
+    LOGGER.info(recorder.frame("requests_to"))
     LOGGER.info(f"---------------------GLOBAL CARBON INTENSITIES---------------------")
-    LOGGER.info(global_carbon_intensities)
-    global_carbon_intensities.to_csv(f'/nfs/obelix/users2/sjasoria/kasper/dataframes/{_scheduler}/global_carbon_intensities.csv',index=False)
+    LOGGER.info(recorder.frame("carbon"))
     LOGGER.info(f"---------------------GLOBAL LATENCIES---------------------")
-    LOGGER.info(global_latencies)
-    global_latencies.to_csv(f'/nfs/obelix/users2/sjasoria/kasper/dataframes/{_scheduler}/global_latencies.csv',index=False)
+    LOGGER.info(recorder.frame("latencies"))
+    recorder.save(os.path.join(results_dir, _scheduler))
     return
 
 def _plot():
     """
     Plots the data collected during the simulation
     """
+    global_carbon_intensities = recorder.frame("carbon")
     colors = ['blue', 'red', 'green', 'cyan', 'magenta', 'yellow']
     for i, col in enumerate(global_carbon_intensities.columns):
         plt.plot(global_carbon_intensities.index, global_carbon_intensities[col], color=colors[i], label=col)
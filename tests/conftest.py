@@ -0,0 +1,24 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import contextlib
+import os
+
+import numpy as np
+import pytest
+
+from CAP.config import Settings
+from CAP.server import ServerManager
+
+
+@pytest.fixture(scope="session")
+def wiki_hour():
+    """Inputs of the schedulers for the first hour of the bundled wiki trace
+
+    Returns:
+        Settings of the run, carbon intensities, latencies, capacities and request rates
+    """
+    config = Settings(VERBOSE_MILP=False, SOLUTION_CACHE_SIZE=0)
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        table = ServerManager(config=config).table
+    capacities = np.full(len(table), config.SERVER_CAPACITY, dtype=np.float64)
+    return config, table.carbon[0], table.latency, capacities, table.demand[0].astype(np.int64)
@@ -0,0 +1,65 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import contextlib
+import os
+
+import pytest
+
+from CAP.CAP import CAP
+from CAP.config import Config, Settings
+
+
+def test_settings_cannot_be_changed():
+    settings = Settings(SERVER_CAPACITY=20)
+
+    with pytest.raises(AttributeError):
+        settings.SERVER_CAPACITY = 30
+    with pytest.raises(AttributeError):
+        settings.NEW_SETTING = 1
+    with pytest.raises(AttributeError):
+        del settings.SERVER_CAPACITY
+    with pytest.raises(AttributeError):
+        Settings(NEW_SETTING=1)
+    assert settings.SERVER_CAPACITY == 20
+
+
+def test_replace_returns_new_settings():
+    settings = Settings(SERVER_CAPACITY=20)
+    replaced = settings.replace(SCHEDULER="latency")
+
+    assert replaced is not settings
+    assert (replaced.SCHEDULER, replaced.SERVER_CAPACITY) == ("latency", 20)
+    assert settings.SCHEDULER == Config.SCHEDULER
+    assert replaced != settings
+    assert settings.replace() == settings
+    assert hash(settings.replace()) == hash(settings)
+    with pytest.raises(AttributeError):
+        settings.replace(NEW_SETTING=1)
+    # Config stays the defaults
+    assert Config.SERVER_CAPACITY == Settings().SERVER_CAPACITY
+
+
+def test_cap_instances_do_not_share_settings():
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        carbon = CAP(2, config=Settings(SCHEDULER="carbon", VERBOSE_MILP=False, SOLUTION_CACHE_SIZE=0))
+        latency = CAP(2, config=Settings(SCHEDULER="latency", VERBOSE_MILP=False, SOLUTION_CACHE_SIZE=0))
+        carbon.provision(0)
+        latency.provision(0)
+
+    for cap in (carbon, latency):
+        assert cap.scheduler.config is cap.config
+        assert cap.server_manager.config is cap.config
+        assert cap.server_manager.table.config is cap.config
+    assert carbon.scheduler is not latency.scheduler
+    assert carbon.server_manager is not latency.server_manager
+    # Each scheduler built only the models of its own settings
+    assert {key[3] for key in carbon.scheduler.models} == {"carbon"}
+    assert {key[3] for key in latency.scheduler.models} == {"latency"}
+
+    scheduler = latency.scheduler
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        carbon.configure(MAX_LATENCY=carbon.config.MAX_LATENCY + 50)
+    assert carbon.config.MAX_LATENCY == latency.config.MAX_LATENCY + 50
+    assert carbon.server_manager.table.config is carbon.config
+    assert latency.scheduler is scheduler
+    assert latency.server_manager.table.config is latency.config
@@ -0,0 +1,52 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import numpy as np
+import pytest
+
+from CAP.flow_model import FlowModel
+from CAP.milp_scheduler import PersistentModel, feasible_routes
+
+
+@pytest.mark.parametrize("scheduler", ["carbon", "latency"])
+def test_flow_matches_cbc_on_wiki_hour(wiki_hour, scheduler):
+    config, carbon_intensities, latencies, capacities, request_rates = wiki_hour
+    routes = feasible_routes(latencies, config.MAX_LATENCY if scheduler == "carbon" else None)
+    flow = FlowModel(scheduler, len(request_rates), routes, config)
+    cbc = PersistentModel(scheduler, len(request_rates), routes, config)
+
+    servers, requests, flow_obj = flow.schedule_servers(carbon_intensities, latencies, capacities, request_rates)
+    _, _, cbc_obj = cbc.schedule_servers(carbon_intensities, latencies, capacities, request_rates)
+
+    assert cbc.status == "optimal"
+    # The flow search is a heuristic over the same objective, it cannot beat the MILP optimum
+    assert flow_obj >= cbc_obj - 1e-9
+    assert flow_obj <= cbc_obj * (1 + config.FLOW_MAX_GAP)
+    assert flow.lower_bound <= cbc_obj + 1e-9
+    np.testing.assert_array_equal(requests.sum(axis=1), request_rates)
+    assert np.all(requests.sum(axis=0) <= servers * capacities)
+
+
+def test_flow_iteration_cap_keeps_first_schedule(wiki_hour):
+    config, carbon_intensities, latencies, capacities, request_rates = wiki_hour
+    routes = feasible_routes(latencies, config.MAX_LATENCY)
+    capped = FlowModel("carbon", len(request_rates), routes, config.replace(FLOW_MAX_ITERATIONS=0))
+    searched = FlowModel("carbon", len(request_rates), routes, config)
+
+    _, requests, capped_obj = capped.schedule_servers(carbon_intensities, latencies, capacities, request_rates)
+    _, _, searched_obj = searched.schedule_servers(carbon_intensities, latencies, capacities, request_rates)
+
+    # Only the relaxation and the rounded-up routing are solved
+    assert capped.stats["lp_solves"] == 2
+    assert capped_obj >= searched_obj
+    np.testing.assert_array_equal(requests.sum(axis=1), request_rates)
+
+
+@pytest.mark.parametrize("scheduler", ["carbon", "latency"])
+def test_flow_gap_is_never_negative(wiki_hour, scheduler):
+    config, carbon_intensities, latencies, capacities, request_rates = wiki_hour
+    routes = feasible_routes(latencies, config.MAX_LATENCY if scheduler == "carbon" else None)
+    flow = FlowModel(scheduler, len(request_rates), routes, config)
+
+    for hour_rates in (request_rates, request_rates * 2, np.maximum(request_rates // 3, 1)):
+        flow.schedule_servers(carbon_intensities, latencies, capacities, hour_rates)
+        assert flow.gap >= 0.0
@@ -0,0 +1,55 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import numpy as np
+import pytest
+
+from CAP.config import Settings
+from CAP.matrix_model import HorizonModel, MatrixModel
+from CAP.milp_scheduler import feasible_routes
+
+# Three regions that can all reach each other, region 0 is clean in the first hour and
+# region 1 in the second one
+LATENCIES = np.array([[1.0, 10.0, 10.0], [10.0, 1.0, 10.0], [10.0, 10.0, 1.0]])
+CARBON = np.array([[100.0, 500.0, 500.0], [500.0, 100.0, 500.0]])
+REQUESTS = np.array([[10, 10, 10], [10, 10, 10]])
+CAPACITIES = np.full(3, 10.0)
+# All servers run in region 2 when the horizon is solved
+PREVIOUS = np.array([0, 0, 3])
+
+
+def horizon_model(penalty):
+    config = Settings(VERBOSE_MILP=False, SERVER_CHURN_PENALTY=penalty, MAX_LATENCY=1000)
+    routes = feasible_routes(LATENCIES, config.MAX_LATENCY)
+    return HorizonModel("carbon", 3, routes, 2, config), config, routes
+
+
+def test_horizon_commits_first_hour():
+    horizon, config, routes = horizon_model(0.0)
+    servers, requests, obj = horizon.schedule_servers(CARBON, LATENCIES, CAPACITIES, REQUESTS, PREVIOUS)
+    hour_servers, hour_requests, hour_obj = MatrixModel("carbon", 3, routes, config).schedule_servers(
+        CARBON[0], LATENCIES, CAPACITIES, REQUESTS[0]
+    )
+
+    assert horizon.status == "optimal"
+    # Without churn the hours are independent, the first one is returned and the objective
+    # covers both of them
+    np.testing.assert_array_equal(servers, hour_servers)
+    np.testing.assert_array_equal(requests, hour_requests)
+    np.testing.assert_array_equal(servers, [3, 0, 0])
+    assert obj == pytest.approx(2 * hour_obj)
+
+
+def test_churn_penalty_keeps_running_servers():
+    free, _, _ = horizon_model(0.0)
+    penalized, _, _ = horizon_model(100.0)
+
+    free_servers, _, free_obj = free.schedule_servers(CARBON, LATENCIES, CAPACITIES, REQUESTS, PREVIOUS)
+    servers, requests, obj = penalized.schedule_servers(CARBON, LATENCIES, CAPACITIES, REQUESTS, PREVIOUS)
+
+    assert penalized.status == "optimal"
+    assert np.abs(servers - PREVIOUS).sum() < np.abs(free_servers - PREVIOUS).sum()
+    # The servers of region 2 are kept rather than stopped
+    assert servers[2] == PREVIOUS[2]
+    assert obj > free_obj
+    np.testing.assert_array_equal(requests.sum(axis=1), REQUESTS[0])
+    assert np.all(requests.sum(axis=0) <= servers * CAPACITIES)
@@ -0,0 +1,75 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import contextlib
+import os
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.schedulers import synthetic_table
+from CAP.config import Settings
+from CAP.milp_scheduler import Greedy, MilpScheduler
+from CAP.request import RequestBatch
+from CAP.server import ServerManager
+
+
+@pytest.mark.parametrize("scheduler", ["carbon", "latency"])
+@pytest.mark.parametrize("persistent", [True, False])
+def test_large_topology_meets_time_limit(scheduler, persistent):
+    config = Settings(SCHEDULER=scheduler, PERSISTENT_MILP=persistent, VERBOSE_MILP=False, SOLUTION_CACHE_SIZE=0)
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        table = synthetic_table(ServerManager(config=config).table, 500)
+        server_manager = ServerManager(table.regions(), config)
+        milp_scheduler = MilpScheduler(config)
+        batches = [RequestBatch(region.name, region.get_requests_per_interval(0), region) for region in server_manager.regions]
+
+        started = time.perf_counter()
+        servers, requests, _, _ = milp_scheduler.schedule_servers(batches, server_manager, 0, time_limit=1.0)
+        elapsed = time.perf_counter() - started
+
+    # Building the CBC model alone would take longer than the budget, the servers are placed greedily
+    assert elapsed < 1.0
+    assert milp_scheduler.last_solve["status"] == "greedy"
+    np.testing.assert_array_equal(requests.sum(axis=1), [batch.load for batch in batches])
+
+
+@pytest.mark.parametrize("scheduler", ["carbon", "latency"])
+def test_requests_beyond_running_servers_are_dropped(scheduler):
+    config = Settings(SCHEDULER=scheduler, VERBOSE_MILP=False, SOLUTION_CACHE_SIZE=0)
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        server_manager = ServerManager(config=config)
+        milp_scheduler = MilpScheduler(config)
+        batches = [RequestBatch(region.name, region.get_requests_per_interval(0), region) for region in server_manager.regions]
+        request_rates = np.array([batch.load for batch in batches])
+        capacities = np.asarray(milp_scheduler.compute_capacities(server_manager, 0, request_rates=request_rates))
+        # One server per region cannot absorb the demand of the hour
+        servers = np.ones(len(batches), dtype=int)
+        requests, carbon_intensities, latencies = milp_scheduler.schedule_requests(batches, server_manager, 0, servers=servers)
+        greedy_requests, greedy_dropped = Greedy.schedule_requests(
+            carbon_intensities, latencies, capacities, request_rates, servers, scheduler, config
+        )
+
+    dropped = milp_scheduler.last_route["dropped"]
+    assert milp_scheduler.last_route["status"] == "optimal"
+    # Every server is filled and only what does not fit is dropped
+    assert dropped.sum() == request_rates.sum() - (servers * capacities).sum()
+    np.testing.assert_array_equal(requests.sum(axis=1) + dropped, request_rates)
+    np.testing.assert_array_equal(requests.sum(axis=0), servers * capacities)
+    # The greedy fallback drops as much, at the origins it could not route
+    assert greedy_dropped.sum() == dropped.sum()
+    np.testing.assert_array_equal(greedy_requests.sum(axis=1) + greedy_dropped, request_rates)
+    assert np.all(greedy_requests.sum(axis=0) <= servers * capacities)
+
+
+def test_nothing_is_dropped_with_enough_servers():
+    config = Settings(VERBOSE_MILP=False, SOLUTION_CACHE_SIZE=0)
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        server_manager = ServerManager(config=config)
+        milp_scheduler = MilpScheduler(config)
+        batches = [RequestBatch(region.name, region.get_requests_per_interval(0), region) for region in server_manager.regions]
+        servers, _, _, _ = milp_scheduler.schedule_servers(batches, server_manager, 0)
+        requests, _, _ = milp_scheduler.schedule_requests(batches, server_manager, 0, servers=servers)
+
+    assert milp_scheduler.last_route["dropped"].sum() == 0
+    np.testing.assert_array_equal(requests.sum(axis=1), [batch.load for batch in batches])
@@ -0,0 +1,70 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import contextlib
+import math
+import os
+
+import numpy as np
+import pytest
+
+from CAP.config import Settings
+from CAP.milp_scheduler import MilpScheduler
+from CAP.queueing import capacity_table, erlang_c, max_utilization, response_time
+from CAP.server import ServerManager
+
+
+def erlang_c_formula(servers, load):
+    """Erlang C from its textbook closed form"""
+    queued = load ** servers / math.factorial(servers) * servers / (servers - load)
+    return queued / (sum(load ** k / math.factorial(k) for k in range(servers)) + queued)
+
+
+def test_erlang_c_known_values():
+    # Two servers offered one Erlang wait a third of the time
+    assert erlang_c(2, 1.0) == pytest.approx(1 / 3)
+    # A single server is busy, and a request waits, with probability equal to the utilization
+    assert erlang_c(1, 0.7) == pytest.approx(0.7)
+    # Ten servers offered eight Erlangs, the textbook call center example
+    assert erlang_c(10, 8.0) == pytest.approx(0.4092, abs=1e-4)
+
+
+@pytest.mark.parametrize("servers", [1, 3, 10, 40])
+def test_erlang_c_matches_closed_form(servers):
+    loads = np.linspace(0.05, 0.95, 10) * servers
+    expected = [erlang_c_formula(servers, load) for load in loads]
+
+    np.testing.assert_allclose(erlang_c(servers, loads), expected, rtol=1e-9)
+
+
+def test_response_time_of_mm1():
+    # M/M/1 with service rate 10 and utilization 0.5: 1 / (mu - lambda)
+    assert response_time(1, 10.0, 0.5) == pytest.approx(0.2)
+
+
+def test_max_utilization_meets_budget():
+    budgets = np.array([0.11, 0.2, 1.0])
+
+    utilization = max_utilization(4, 10.0, budgets)
+
+    assert np.all(response_time(4, 10.0, utilization) <= budgets + 1e-9)
+    assert np.all(np.diff(utilization) > 0)
+    # An idle server takes 0.1 s, a budget below it keeps the minimum utilization
+    assert max_utilization(4, 10.0, 0.05) == pytest.approx(0.01)
+
+
+def test_capacities_follow_scheduled_requests():
+    config = Settings(CAPACITY_MODEL="erlang", TARGET_RESPONSE_TIME=150, VERBOSE_MILP=False)
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        server_manager = ServerManager(config=config)
+        scheduler = MilpScheduler(config)
+        table = server_manager.table
+        from_table = scheduler.compute_capacities(server_manager, 0, request_rates=table.demand[0])
+        # All requests come from the region furthest from the others
+        far = np.argmax(np.nanmean(table.latency, axis=1))
+        skewed = np.zeros(len(table), dtype=np.int64)
+        skewed[far] = table.demand[0].sum()
+        from_requests = scheduler.compute_capacities(server_manager, 0, request_rates=skewed)
+
+    np.testing.assert_allclose(from_table, capacity_table(table, config.MAX_LATENCY, config)[0])
+    np.testing.assert_allclose(from_requests, capacity_table(table, config.MAX_LATENCY, config, skewed[np.newaxis, :])[0])
+    assert not np.allclose(from_requests, from_table)
@@ -0,0 +1,53 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from CAP.recorder import CSV_FILES, ResultsRecorder
+
+REGIONS = ["us-east-1", "eu-west-1", "ap-southeast-2"]
+
+
+def record_hours(recorder, hours):
+    rng = np.random.default_rng(0)
+    for hour in range(hours):
+        recorder.record(hour, rng.integers(0, 100, 3), rng.integers(0, 100, 3), rng.uniform(50, 500, 3), rng.uniform(5, 200, 3))
+
+
+def test_save_and_load_round_trip(tmp_path):
+    recorder = ResultsRecorder(5, REGIONS)
+    record_hours(recorder, 3)
+
+    recorder.save(str(tmp_path))
+    loaded = ResultsRecorder.load(str(tmp_path))
+
+    assert len(loaded) == 3
+    assert list(loaded.region_names) == REGIONS
+    for name in ("requests_to", "requests_from", "carbon_intensities", "latencies", "carbon"):
+        pd.testing.assert_frame_equal(loaded.frame(name), recorder.frame(name))
+    for file_name in CSV_FILES.values():
+        csv = pd.read_csv(os.path.join(tmp_path, file_name))
+        assert list(csv.columns) == REGIONS and len(csv) == 3
+
+
+def test_memory_mapped_buffers_survive_the_recorder(tmp_path):
+    recorder = ResultsRecorder(5, REGIONS, str(tmp_path))
+    record_hours(recorder, 2)
+    expected = recorder.frame("carbon")
+    del recorder
+
+    loaded = ResultsRecorder.load(str(tmp_path))
+
+    assert len(loaded) == 2
+    pd.testing.assert_frame_equal(loaded.frame("carbon"), expected)
+
+
+def test_series_are_aligned_by_region():
+    recorder = ResultsRecorder(1, REGIONS)
+    latencies = pd.Series([3.0, 1.0, 2.0], index=["ap-southeast-2", "us-east-1", "eu-west-1"])
+
+    recorder.record(0, [1, 2, 3], [1, 2, 3], [10.0, 20.0, 30.0], latencies)
+
+    np.testing.assert_array_equal(recorder.frame("latencies").iloc[0], [1.0, 2.0, 3.0])
@@ -0,0 +1,58 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import numpy as np
+from scipy import sparse
+
+from CAP.config import Settings
+from CAP.rounding import round_preserving_sums, round_requests
+
+
+def test_round_preserving_sums_keeps_row_totals():
+    rng = np.random.default_rng(0)
+    values = rng.dirichlet(np.ones(7), size=20) * rng.integers(1, 500, size=(20, 1))
+    totals = np.rint(values.sum(axis=1))
+
+    rounded = round_preserving_sums(values, totals)
+
+    assert rounded.dtype.kind == "i"
+    np.testing.assert_array_equal(rounded.sum(axis=1), totals)
+    assert np.all(np.abs(rounded - values) < 1)
+
+
+def test_round_preserving_sums_hands_units_to_largest_remainders():
+    np.testing.assert_array_equal(round_preserving_sums([0.4, 0.35, 0.25], 1), [1, 0, 0])
+    np.testing.assert_array_equal(round_preserving_sums([[1.5, 1.5, 0.0]], [3]), [[2, 1, 0]])
+
+
+def test_round_requests_adds_servers_for_rounded_flows():
+    config = Settings(MAX_SERVERS_PER_REGION=10, MAX_SERVERS=100)
+    requests = np.array([[9.5, 0.5], [9.5, 0.5]])
+
+    servers, rounded = round_requests(requests, [10, 10], [2, 1], [10, 10], config=config)
+
+    np.testing.assert_array_equal(rounded.sum(axis=1), [10, 10])
+    assert np.all(rounded.sum(axis=0) <= servers * 10)
+
+
+def test_round_requests_respects_region_cap():
+    config = Settings(MAX_SERVERS_PER_REGION=2, MAX_SERVERS=100)
+    # Region 0 is full and rounding sends it one request more, region 2 is out of reach of origin 0
+    requests = np.array([[10.5, 9.5, 0.0], [9.5, 0.0, 0.5]])
+    routes = sparse.csr_matrix(np.array([[1, 1, 0], [1, 1, 1]], dtype=bool))
+
+    servers, rounded = round_requests(requests, [20, 10], [2, 1, 1], [10, 10, 10], routes, config)
+
+    assert servers.max() <= 2
+    np.testing.assert_array_equal(rounded.sum(axis=1), [20, 10])
+    assert np.all(rounded.sum(axis=0) <= servers * 10)
+    assert rounded[0, 2] == 0
+
+
+def test_round_requests_respects_server_pool():
+    config = Settings(MAX_SERVERS_PER_REGION=10, MAX_SERVERS=3)
+    requests = np.array([[10.5, 9.5, 0.0], [9.5, 0.0, 0.5]])
+
+    servers, rounded = round_requests(requests, [20, 10], [2, 1, 0], [10, 10, 10], config=config)
+
+    assert servers.sum() == 3
+    np.testing.assert_array_equal(rounded.sum(axis=1), [20, 10])
@@ -0,0 +1,26 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import contextlib
+import os
+
+import numpy as np
+
+from CAP.config import Settings
+from CAP.server import ServerManager
+
+
+def test_region_loads_match_fleet_loads():
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        server_manager = ServerManager(config=Settings())
+    server_manager.counts = np.array([3, 0, 2, 1, 0, 4])
+    server_manager.capacities = np.full(6, 10.0)
+    server_manager.utilization = np.array([15.0, 0.0, 3.0, 10.0, 0.0, 0.0])
+    requests = np.array([12, 5, 30, 4, 0, 25])
+
+    fleet = server_manager.build_fleet_loads(requests)
+    region, _ = server_manager.server_regions()
+
+    for i in range(6):
+        np.testing.assert_array_equal(server_manager.build_server_loads(i, requests[i]), fleet[region == i])
+    # Region 0 has 15 of 30 used: the second server takes 5 and the third the rest of the 12
+    np.testing.assert_array_equal(fleet[region == 0], [0, 5, 7])
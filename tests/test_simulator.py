@@ -0,0 +1,48 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import numpy as np
+import pytest
+
+from CAP.simulator import Simulator
+
+
+def lindley(server, arrival, service):
+    """Waiting times of FIFO queues from the Lindley recursion, one request at a time"""
+    wait = np.zeros(len(server))
+    for k in range(1, len(server)):
+        if server[k] == server[k - 1]:
+            wait[k] = max(0.0, wait[k - 1] + service[k - 1] - (arrival[k] - arrival[k - 1]))
+    return wait
+
+
+def test_waiting_times_of_a_single_queue():
+    arrival = np.array([0.0, 1.0, 1.5, 5.0])
+    service = np.array([2.0, 1.0, 1.0, 1.0])
+
+    wait = Simulator.waiting_times(np.zeros(4, dtype=int), arrival, service)
+
+    np.testing.assert_allclose(wait, [0.0, 1.0, 1.5, 0.0])
+
+
+def test_waiting_times_match_lindley_recursion():
+    rng = np.random.default_rng(0)
+    server = np.sort(rng.integers(0, 5, 500))
+    arrival = np.concatenate([np.sort(rng.uniform(0, 50, (server == s).sum())) for s in range(5)])
+    service = rng.exponential(0.12, len(server))
+
+    np.testing.assert_allclose(Simulator.waiting_times(server, arrival, service), lindley(server, arrival, service), atol=1e-9)
+
+
+def test_waiting_times_without_requests():
+    assert len(Simulator.waiting_times(np.zeros(0, dtype=int), np.zeros(0), np.zeros(0))) == 0
+
+
+def test_mm1_response_time():
+    # M/M/1 with arrival rate 5 and service rate 10: the response time is exponential with mean 0.2 s
+    simulator = Simulator([[0.0]], capacity=10, duration=20000, seed=0)
+
+    result = simulator.simulate_hour([1], [[5.0]])
+
+    assert result["dropped"] == 0
+    assert result["p50"] == pytest.approx(0.2 * np.log(2) * 1000, rel=0.05)
+    assert result["p99"] == pytest.approx(0.2 * np.log(100) * 1000, rel=0.05)
@@ -0,0 +1,108 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import numpy as np
+import pytest
+
+from CAP.config import Settings
+from CAP.matrix_model import objective_value
+from CAP.milp_scheduler import PersistentModel, feasible_routes
+from CAP.solution_cache import SolutionCache
+
+CARBON = [100.0, 200.0]
+LATENCIES = [[5.0, 50.0], [50.0, 5.0]]
+CAPACITIES = [10.0, 10.0]
+
+
+def cache_with_solution(config=None, path=None):
+    cache = SolutionCache(4, path, config or Settings())
+    key = cache.key(CARBON, LATENCIES, CAPACITIES, [20, 10])
+    cache.put(key, [3, 0], [[20, 0], [10, 0]], 1.0)
+    return cache, key
+
+
+def test_hit_returns_stored_solution():
+    cache, key = cache_with_solution()
+
+    servers, requests, obj_val = cache.get(key, [20, 10], CAPACITIES)
+
+    np.testing.assert_array_equal(servers, [3, 0])
+    np.testing.assert_array_equal(requests, [[20, 0], [10, 0]])
+    assert obj_val == 1.0
+    assert cache.stats()["hits"] == 1
+
+
+def test_unknown_key_misses():
+    cache, _ = cache_with_solution()
+
+    assert cache.get(cache.key(CARBON, LATENCIES, CAPACITIES, [21, 10]), [21, 10], CAPACITIES) is None
+    assert cache.stats() == {"hits": 0, "misses": 1, "hit_rate": 0.0, "size": 1}
+
+
+def test_hit_is_rescaled_to_request_rates():
+    config = Settings()
+    cache, key = cache_with_solution(config)
+
+    servers, requests, obj_val = cache.get(key, [24, 11], CAPACITIES, CARBON, LATENCIES)
+
+    np.testing.assert_array_equal(requests.sum(axis=1), [24, 11])
+    np.testing.assert_array_equal(servers, [4, 0])
+    assert obj_val == pytest.approx(objective_value(config.SCHEDULER, servers, requests, CARBON, LATENCIES, [24, 11], config))
+    assert obj_val != 1.0
+
+
+def test_rescaled_hit_without_objective_inputs_misses():
+    cache, key = cache_with_solution()
+
+    assert cache.get(key, [24, 11], CAPACITIES) is None
+    assert cache.get(key, [20, 10], CAPACITIES) is not None
+
+
+def test_rescaled_hit_over_region_cap_misses():
+    cache, key = cache_with_solution(Settings(MAX_SERVERS_PER_REGION=3))
+
+    assert cache.get(key, [24, 11], CAPACITIES, CARBON, LATENCIES) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_hit_without_requests_of_a_region_misses():
+    cache = SolutionCache(4, None, Settings())
+    key = cache.key(CARBON, LATENCIES, CAPACITIES, [20, 0])
+    cache.put(key, [2, 0], [[20, 0], [0, 0]], 1.0)
+
+    assert cache.get(key, [20, 1], CAPACITIES, CARBON, LATENCIES) is None
+
+
+@pytest.mark.parametrize("setting", [
+    {"MILP_BACKEND": "flow"}, {"INTEGER_ROUTING": False}, {"SOLVER_GAP": 0.1}, {"MAX_SERVERS": 10},
+])
+def test_key_depends_on_solver_settings(setting):
+    key = SolutionCache(4, None, Settings()).key(CARBON, LATENCIES, CAPACITIES, [20, 10])
+
+    assert SolutionCache(4, None, Settings(**setting)).key(CARBON, LATENCIES, CAPACITIES, [20, 10]) != key
+
+
+def test_objective_value_matches_cbc(wiki_hour):
+    config, carbon_intensities, latencies, capacities, request_rates = wiki_hour
+    for scheduler in ("carbon", "latency"):
+        routes = feasible_routes(latencies, config.MAX_LATENCY if scheduler == "carbon" else None)
+        model = PersistentModel(scheduler, len(request_rates), routes, config)
+
+        servers, requests, obj_val = model.schedule_servers(carbon_intensities, latencies, capacities, request_rates)
+
+        assert objective_value(scheduler, servers, requests, carbon_intensities, latencies, request_rates, config) == pytest.approx(obj_val)
+
+
+def test_caches_sharing_a_file_merge_on_save(tmp_path):
+    path = str(tmp_path / "cache.pickle")
+    first, first_key = cache_with_solution(path=path)
+    second = SolutionCache(4, path, Settings())
+    second_key = second.key(CARBON, LATENCIES, CAPACITIES, [5, 5])
+    second.put(second_key, [1, 0], [[5, 0], [5, 0]], 2.0)
+
+    first.close()
+    second.save()
+
+    loaded = SolutionCache(4, path, Settings())
+    assert len(loaded) == 2
+    assert loaded.get(first_key, [20, 10], CAPACITIES) is not None
+    assert loaded.get(second_key, [5, 5], CAPACITIES) is not None
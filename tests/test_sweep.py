@@ -0,0 +1,38 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import sqlite3
+
+from CAP.config import Settings
+from CAP.sweep import SweepRunner, expand_grid, scenario_id
+
+
+def test_scenario_id_covers_base_settings():
+    scenario = {"SCHEDULER": "carbon"}
+
+    assert scenario_id(scenario, Settings()) == scenario_id(scenario)
+    assert scenario_id(scenario, Settings(SERVER_CAPACITY=20)) != scenario_id(scenario)
+    # A scenario that sets a base setting to its default runs the same settings
+    assert scenario_id({"SCHEDULER": "carbon", "MAX_LATENCY": Settings().MAX_LATENCY}) == scenario_id(scenario)
+
+
+def test_expand_grid():
+    assert expand_grid({"SCHEDULER": ["carbon", "latency"], "MAX_LATENCY": [100]}) == [
+        {"MAX_LATENCY": 100, "SCHEDULER": "carbon"},
+        {"MAX_LATENCY": 100, "SCHEDULER": "latency"},
+    ]
+
+
+def test_sweep_resumes_only_with_same_base_settings(tmp_path):
+    path = str(tmp_path / "sweep.sqlite")
+    grid = {"SCHEDULER": ["carbon", "latency"]}
+    config = Settings(VERBOSE_MILP=False)
+
+    runner = SweepRunner(grid, path, hours=2, processes=1, config=config)
+    assert runner.run() == 2
+    assert SweepRunner(grid, path, hours=2, processes=1, config=config).pending() == []
+    assert len(SweepRunner(grid, path, hours=2, processes=1, config=config.replace(SERVER_CAPACITY=20)).pending()) == 2
+
+    with sqlite3.connect(path) as db:
+        elapsed = [row[0] for row in db.execute("SELECT elapsed FROM scenarios")]
+    assert all(value > 0 for value in elapsed)
+    assert len(runner.results()) == 4
@@ -0,0 +1,54 @@
+# Authors: Basundhara Chakrabarty, Shruti Jasoria
+
+import numpy as np
+import pytest
+
+from CAP.region import RegionTable
+from CAP.timeseries import TimeSeries
+
+# Two regions sampled every hour
+TIMESTAMPS = np.array([0, 3600, 7200])
+VALUES = np.array([[10.0, 100.0], [20.0, 300.0], [40.0, 200.0]])
+
+
+def test_hold_takes_row_at_or_before():
+    series = TimeSeries(TIMESTAMPS, VALUES)
+
+    np.testing.assert_array_equal(series.at(0), VALUES[0])
+    np.testing.assert_array_equal(series.at(3599), VALUES[0])
+    np.testing.assert_array_equal(series.at(3600), VALUES[1])
+    np.testing.assert_array_equal(series.at([1800, 5400]), VALUES[[0, 1]])
+    assert series.index_of(5400) == 1
+    assert series.index_of(-1) == -1
+
+
+def test_linear_interpolates_between_rows():
+    series = TimeSeries(TIMESTAMPS, VALUES)
+
+    np.testing.assert_allclose(series.at(1800, "linear"), [15.0, 200.0])
+    np.testing.assert_allclose(series.at([3600, 6300], "linear"), [[20.0, 300.0], [35.0, 225.0]])
+    # A single column keeps its shape
+    np.testing.assert_allclose(TimeSeries(TIMESTAMPS, VALUES[:, 0]).at([900, 4500], "linear"), [12.5, 25.0])
+
+
+@pytest.mark.parametrize("method", ["hold", "linear"])
+def test_times_outside_rows_take_edge_values(method):
+    series = TimeSeries(TIMESTAMPS, VALUES)
+
+    np.testing.assert_allclose(series.at(-3600, method), VALUES[0])
+    np.testing.assert_allclose(series.at(10800, method), VALUES[-1])
+
+
+def test_resample():
+    series = TimeSeries(TIMESTAMPS, VALUES)
+
+    np.testing.assert_array_equal(series.resample(1800, 3600, 3), VALUES)
+    np.testing.assert_allclose(series.resample(1800, 3600, 3, "linear"), [[15.0, 200.0], [30.0, 250.0], [40.0, 200.0]])
+    with pytest.raises(ValueError):
+        series.at(1800, "cubic")
+
+
+def test_window_is_resampled_only_off_the_hour():
+    np.testing.assert_array_equal(RegionTable.resample_window(TIMESTAMPS, VALUES, 0, 2, "linear"), VALUES[:2])
+    np.testing.assert_allclose(RegionTable.resample_window(TIMESTAMPS, VALUES, 1800, 2, "linear"), [[15.0, 200.0], [30.0, 250.0]])
+    np.testing.assert_array_equal(RegionTable.resample_window(TIMESTAMPS, VALUES, 1800, 2), VALUES[:2])